@@ -1,4 +1,27 @@
+"""归档目录工具：在归档目录下创建当天的日期文件夹，并在桌面上创建指向它的快捷方式
+
+不带参数运行时弹出窗口选择一个归档目录；--batch 不显示窗口，一次处理所有（或 --only 指定的）归档目录；
+--index 增量更新日期文件夹的全文索引，--search 在索引中搜索文件名和内容；
+--pack 把超过指定天数的日期文件夹打包为 zip，--extract 从压缩包中解压单个文件；
+--dedup 用硬链接替换内容相同的文件，--report 统计空间占用；
+参数中给出文件或文件夹（也可以拖放到脚本上）时，把它们复制到当天的文件夹；
+--mirror 把归档目录增量镜像到另一个位置：
+
+    python archive.py
+    python archive.py --batch
+    python archive.py --batch --only 民宿项目,民宿财务
+    python archive.py --index
+    python archive.py --search "发票 2024" --since 2024-03-01
+    python archive.py --pack 90
+    python archive.py --extract 2024-03-05/合同.pdf --to .
+    python archive.py --dedup --dry-run
+    python archive.py --report --only 民宿财务
+    python archive.py --only 民宿项目 DCIM photo.jpg
+    python archive.py --mirror F:\\backup
+"""
 import os
+import argparse
+import contextlib
 import datetime
 import subprocess
 import sys
@@ -6,10 +29,13 @@ import platform
 import tkinter as tk
 from tkinter import ttk, messagebox
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def load_archive_config():
+# 索引、打包、去重等功能模块在用到时才导入，只创建文件夹和快捷方式时不需要加载它们
+
+def load_archive_config(config_file='archive_config.json'):
     """加载归档目录配置"""
-    config_file = 'archive_config.json'
     try:
         with open(config_file, 'r', encoding='utf-8') as f:
             return json.load(f)
@@ -51,54 +77,150 @@ def create_folder(folder_path):
     print(f"文件夹已存在: {folder_path}")
     return False
 
-def create_shortcut(target_path, shortcut_path, shortcut_prefix, today_str):
-    """创建快捷方式，支持Windows和Linux系统"""
+# 快捷方式的扩展名
+SHORTCUT_EXT = '.lnk' if platform.system() == 'Windows' else '.desktop'
+
+def quote_powershell(value):
+    """PowerShell 单引号字符串"""
+    return "'" + value.replace("'", "''") + "'"
+
+def write_shortcuts(shortcuts):
+    """批量创建快捷方式，shortcuts 为 [(目标文件夹, 快捷方式路径, 名称)]，返回 {快捷方式路径: 错误信息}
+
+    Windows 上所有快捷方式共用一个 WScript.Shell 对象；没有 pywin32 时合并为一次 PowerShell 调用，
+    而不是每个快捷方式启动一个进程。
+    """
+    errors = {}
+    if not shortcuts:
+        return errors
     if platform.system() == 'Windows':
         try:
             # 尝试使用pywin32
             import win32com.client
             shell = win32com.client.Dispatch("WScript.Shell")
-            shortcut = shell.CreateShortCut(shortcut_path)
-            shortcut.TargetPath = target_path
-            shortcut.Save()
-        except Exception as e:
-            # 备选方案：使用PowerShell创建快捷方式
-            ps_command = f'''
-            $WshShell = New-Object -comObject WScript.Shell
-            $Shortcut = $WshShell.CreateShortcut("{shortcut_path}")
-            $Shortcut.TargetPath = "{target_path}"
-            $Shortcut.Save()
-            '''
-            subprocess.run(["powershell", "-Command", ps_command], check=True)
-    else:  # 为Linux或macOS创建.desktop文件
+        except Exception:
+            shell = None
+        if shell is not None:
+            for target_path, shortcut_path, _ in shortcuts:
+                try:
+                    shortcut = shell.CreateShortCut(shortcut_path)
+                    shortcut.TargetPath = target_path
+                    shortcut.Save()
+                except Exception as e:
+                    errors[shortcut_path] = str(e)
+            return errors
+        
+        # 备选方案：一次PowerShell调用创建全部快捷方式，失败的快捷方式逐行输出
+        lines = ['$WshShell = New-Object -comObject WScript.Shell']
+        for target_path, shortcut_path, _ in shortcuts:
+            lines.append(
+                f'try {{ $Shortcut = $WshShell.CreateShortcut({quote_powershell(shortcut_path)}); '
+                f'$Shortcut.TargetPath = {quote_powershell(target_path)}; $Shortcut.Save() }} '
+                f'catch {{ Write-Output ({quote_powershell(shortcut_path)} + "`t" + $_.Exception.Message) }}')
+        try:
+            completed = subprocess.run(["powershell", "-NoProfile", "-Command", "\n".join(lines)],
+                                       capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            return {shortcut_path: str(e) for _, shortcut_path, _ in shortcuts}
+        for line in completed.stdout.splitlines():
+            shortcut_path, sep, message = line.partition("\t")
+            if sep:
+                errors[shortcut_path] = message
+        return errors
+    
+    # 为Linux或macOS创建.desktop文件
+    for target_path, shortcut_path, name in shortcuts:
         desktop_entry = f"""[Desktop Entry]
-Name={shortcut_prefix} {today_str}
+Name={name}
 Type=Directory
 Path={target_path}
 Icon=folder
 """
-        with open(shortcut_path, 'w') as f:
-            f.write(desktop_entry)
-        os.chmod(shortcut_path, 0o755)  # 确保可执行
-
-def delete_old_shortcuts(desktop_path, today_str, shortcut_prefix):
-    """删除桌面上除了今天之外的所有archive快捷方式"""
-    for item in os.listdir(desktop_path):
-        item_path = os.path.join(desktop_path, item)
-        # Windows快捷方式检查
-        if platform.system() == 'Windows':
-            if item.endswith('.lnk') and item.startswith(f'{shortcut_prefix} '):
-                date_str = item[len(shortcut_prefix)+1:-4]  # 提取日期部分
-                if date_str != today_str:
-                    os.remove(item_path)
-                    print(f"已删除旧快捷方式: {item_path}")
-        # Linux/macOS快捷方式检查
+        try:
+            with open(shortcut_path, 'w') as f:
+                f.write(desktop_entry)
+            os.chmod(shortcut_path, 0o755)  # 确保可执行
+        except OSError as e:
+            errors[shortcut_path] = str(e)
+    return errors
+
+def create_shortcut(target_path, shortcut_path, shortcut_prefix, today_str):
+    """创建快捷方式，支持Windows和Linux系统"""
+    errors = write_shortcuts([(target_path, shortcut_path, f'{shortcut_prefix} {today_str}')])
+    if errors:
+        raise OSError(f"创建快捷方式失败: {errors[shortcut_path]}")
+
+def get_shortcut_name(shortcut_prefix, today_str):
+    """快捷方式的文件名"""
+    return f'{shortcut_prefix} {today_str}{SHORTCUT_EXT}'
+
+def scan_desktop(desktop_path):
+    """用 os.scandir 读取一次桌面，返回 {快捷方式前缀: {日期: 快捷方式路径}}"""
+    index = {}
+    try:
+        with os.scandir(desktop_path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(SHORTCUT_EXT):
+                    continue
+                # 文件名为 "前缀 日期.扩展名"，前缀中可以有空格
+                prefix, sep, date_str = entry.name[:-len(SHORTCUT_EXT)].rpartition(' ')
+                if sep:
+                    index.setdefault(prefix, {})[date_str] = entry.path
+    except FileNotFoundError:
+        pass
+    return index
+
+def plan_shortcuts(archive_configs, today_str, desktop_path, index):
+    """根据桌面索引计算所有归档目录需要创建和删除的快捷方式
+
+    返回 (创建列表, 删除列表)，创建列表元素为 (前缀, (目标文件夹, 快捷方式路径, 名称))，
+    删除列表元素为 (前缀, 快捷方式路径)。
+    """
+    creations = []
+    deletions = []
+    seen = set()
+    for config in archive_configs:
+        prefix = config["shortcut_prefix"]
+        if prefix in seen:
+            continue
+        seen.add(prefix)
+        existing = index.get(prefix, {})
+        if today_str not in existing:
+            creations.append((prefix, (os.path.join(config["archive_dir"], today_str),
+                                       os.path.join(desktop_path, get_shortcut_name(prefix, today_str)),
+                                       f'{prefix} {today_str}')))
+        deletions.extend((prefix, path) for date_str, path in existing.items() if date_str != today_str)
+    return creations, deletions
+
+def reconcile_desktop(archive_configs, today_str, desktop_path=None):
+    """整理桌面快捷方式：补建今天缺少的快捷方式，删除其他日期的快捷方式（只删除配置中前缀的）
+
+    桌面只读取一次，创建和删除一次性完成。返回 {前缀: {"created": 路径或 None, "deleted": [路径], "error": 错误信息}}。
+    """
+    desktop_path = desktop_path or get_desktop_path()
+    creations, deletions = plan_shortcuts(archive_configs, today_str, desktop_path, scan_desktop(desktop_path))
+    report = {config["shortcut_prefix"]: {"created": None, "deleted": [], "error": None}
+              for config in archive_configs}
+    
+    errors = write_shortcuts([shortcut for _, shortcut in creations])
+    for prefix, (_, shortcut_path, _) in creations:
+        if shortcut_path in errors:
+            report[prefix]["error"] = errors[shortcut_path]
         else:
-            if item.endswith('.desktop') and item.startswith(f'{shortcut_prefix} '):
-                date_str = item[len(shortcut_prefix)+1:-8]  # 提取日期部分
-                if date_str != today_str:
-                    os.remove(item_path)
-                    print(f"已删除旧快捷方式: {item_path}")
+            report[prefix]["created"] = shortcut_path
+            print(f"快捷方式已创建: {shortcut_path}")
+    
+    for prefix, path in deletions:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            report[prefix]["error"] = str(e)
+            continue
+        report[prefix]["deleted"].append(path)
+        print(f"已删除旧快捷方式: {path}")
+    return report
 
 def open_folder(folder_path):
     """打开指定文件夹"""
@@ -109,8 +231,107 @@ def open_folder(folder_path):
     else:  # Linux
         subprocess.run(['xdg-open', folder_path])
 
-def select_archive_dir(archive_configs):
-    """显示选择窗口并返回选中的归档目录配置"""
+def format_size(size):
+    """文件大小格式化"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def show_search_window(root, archive_configs, index_path):
+    """搜索窗口：在归档索引中搜索文件名和内容，双击结果打开所在文件夹"""
+    from archiveIndex import ArchiveIndex
+    index = ArchiveIndex(index_path)
+    window = tk.Toplevel(root)
+    window.title("搜索归档文件")
+    window.geometry("760x460")
+    
+    search_frame = ttk.Frame(window)
+    search_frame.pack(fill=tk.X, padx=10, pady=10)
+    search_var = tk.StringVar()
+    entry = ttk.Entry(search_frame, textvariable=search_var)
+    entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+    status_var = tk.StringVar(value="输入文件名或内容中的文字搜索")
+    
+    columns = ("date", "name", "size", "snippet")
+    tree = ttk.Treeview(window, columns=columns, show="headings")
+    for column, text, width in zip(columns, ("日期", "文件", "大小", "内容"), (90, 260, 80, 300)):
+        tree.heading(column, text=text)
+        tree.column(column, width=width, stretch=column in ("name", "snippet"))
+    tree.pack(fill=tk.BOTH, expand=True, padx=10)
+    ttk.Label(window, textvariable=status_var).pack(fill=tk.X, padx=10, pady=5)
+    paths = {}
+    pending = {}
+    
+    def search(event=None):
+        pending.pop("after", None)
+        text = search_var.get().strip()
+        tree.delete(*tree.get_children())
+        paths.clear()
+        if not text:
+            return
+        results = index.search(text, limit=500)
+        for result in results:
+            item = tree.insert("", tk.END, values=(
+                result["date"], os.path.basename(result["path"]), format_size(result["size"]),
+                " ".join((result["snippet"] or "").split())))
+            paths[item] = result["path"]
+        status_var.set(f"找到 {len(results)} 个文件" + ("（只显示前 500 个）" if len(results) >= 500 else ""))
+    
+    def on_key(event=None):
+        # 停止输入 300 毫秒后再搜索
+        if "after" in pending:
+            window.after_cancel(pending["after"])
+        pending["after"] = window.after(300, search)
+    
+    def on_open(event=None):
+        selection = tree.selection()
+        if selection and selection[0] in paths:
+            open_folder(os.path.dirname(paths[selection[0]]))
+    
+    def update_index():
+        update_button.config(state=tk.DISABLED)
+        status_var.set("正在更新索引...")
+        done = {}
+        
+        def worker():
+            try:
+                done["stats"] = index.update([config["archive_dir"] for config in archive_configs])
+            except Exception as e:
+                done["error"] = e
+        
+        def poll():
+            if thread.is_alive():
+                window.after(200, poll)
+                return
+            update_button.config(state=tk.NORMAL)
+            if "error" in done:
+                status_var.set(f"更新索引出错: {done['error']}")
+                return
+            stats = done["stats"]
+            status_var.set(f"索引已更新：{stats['folders']} 个日期文件夹，重新扫描 {stats['scanned']} 个，"
+                           f"跳过 {stats['skipped']} 个，删除 {stats['removed']} 个")
+            search()
+        
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        poll()
+    
+    def on_close():
+        index.close()
+        window.destroy()
+    
+    ttk.Button(search_frame, text="搜索", command=search).pack(side=tk.LEFT, padx=5)
+    update_button = ttk.Button(search_frame, text="更新索引", command=update_index)
+    update_button.pack(side=tk.LEFT)
+    entry.bind('<Return>', search)
+    entry.bind('<KeyRelease>', on_key)
+    tree.bind('<Double-1>', on_open)
+    window.protocol("WM_DELETE_WINDOW", on_close)
+    entry.focus_set()
+
+def select_archive_dir(archive_configs, index_path=None):
+    """显示选择窗口并返回选中的归档目录配置，提供 index_path 时可以打开搜索窗口"""
     root = tk.Tk()
     root.title("选择归档目录")
     root.geometry("400x300")
@@ -168,6 +389,12 @@ def select_archive_dir(archive_configs):
     cancel_button = ttk.Button(button_frame, text="取消", command=on_cancel)
     cancel_button.pack(side=tk.LEFT, padx=10)
     
+    # 创建搜索按钮
+    if index_path:
+        search_button = ttk.Button(button_frame, text="搜索文件",
+                                   command=lambda: show_search_window(root, archive_configs, index_path))
+        search_button.pack(side=tk.LEFT, padx=10)
+    
     # 居中显示窗口
     root.update_idletasks()
     x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
@@ -179,57 +406,299 @@ def select_archive_dir(archive_configs):
     
     return selected_config if selected_config else None
 
-if __name__ == "__main__":
+def create_today_folder(config, today_str):
+    """创建一个归档目录当天的文件夹，返回结果字典"""
+    today_folder = os.path.join(config["archive_dir"], today_str)
+    result = {
+        "display_name": config["display_name"],
+        "folder": today_folder,
+        "folder_created": False,
+        "shortcut": None,
+        "shortcut_created": False,
+        "deleted": [],
+        "error": None,
+    }
+    try:
+        result["folder_created"] = create_folder(today_folder)
+    except OSError as e:
+        result["error"] = str(e)
+    return result
+
+def select_configs(archive_configs, names):
+    """按显示名称或快捷方式前缀选出要处理的配置，names 为 None 时返回全部，有未知名称时抛出 ValueError"""
+    if names is None:
+        return list(archive_configs)
+    selected = []
+    for name in names:
+        matches = [config for config in archive_configs
+                   if name in (config["display_name"], config["shortcut_prefix"])]
+        if not matches:
+            raise ValueError(f"未找到归档目录配置: {name}")
+        selected.extend(config for config in matches if config not in selected)
+    return selected
+
+def run_batch(archive_configs, workers=None, today_str=None):
+    """不显示窗口，并发处理多个归档目录，返回结果汇总
+
+    先并发创建各归档目录当天的文件夹，再一次性整理桌面快捷方式。处理过程中的提示信息输出到标准错误。
+    """
+    today_str = today_str or datetime.datetime.now().strftime('%Y-%m-%d')
+    desktop_path = get_desktop_path()
+    
+    with contextlib.redirect_stdout(sys.stderr):
+        # 文件夹可能在网络共享上，并发创建
+        with ThreadPoolExecutor(max_workers=workers or min(32, len(archive_configs) or 1)) as executor:
+            results = list(executor.map(lambda config: create_today_folder(config, today_str), archive_configs))
+        
+        # 文件夹创建失败的归档目录不改动它的快捷方式
+        ready = [config for config, result in zip(archive_configs, results) if not result["error"]]
+        report = reconcile_desktop(ready, today_str, desktop_path)
+    
+    for config, result in zip(archive_configs, results):
+        shortcuts = report.get(config["shortcut_prefix"])
+        if result["error"] or shortcuts is None:
+            continue
+        result["shortcut"] = os.path.join(desktop_path, get_shortcut_name(config["shortcut_prefix"], today_str))
+        result["shortcut_created"] = shortcuts["created"] is not None
+        result["deleted"] = shortcuts["deleted"]
+        result["error"] = shortcuts["error"]
+    
+    failed = sum(1 for result in results if result["error"])
+    return {
+        "date": today_str,
+        "desktop": desktop_path,
+        "total": len(results),
+        "failed": failed,
+        "results": results,
+    }
+
+def run_interactive(archive_configs, index_path=None):
+    """弹出窗口选择一个归档目录，处理后打开当天的文件夹"""
+    # 显示选择窗口
+    selected_config = select_archive_dir(archive_configs, index_path)
+    
+    # 如果用户取消选择，则退出
+    if not selected_config:
+        print("用户取消操作")
+        return 0
+    
+    # 获取选中的配置信息
+    selected_archive_dir = selected_config["archive_dir"]
+    shortcut_prefix = selected_config["shortcut_prefix"]
+    display_name = selected_config["display_name"]
+    
+    # 获取今天的日期
+    today = datetime.datetime.now()
+    today_str = today.strftime('%Y-%m-%d')
+
+    # 创建文件夹
+    today_folder = os.path.join(selected_archive_dir, today_str)
+    create_folder(today_folder)
+
+    # 创建今天的快捷方式，删除旧快捷方式（只删除同名前缀的）
+    report = reconcile_desktop([selected_config], today_str)
+    if report[shortcut_prefix]["error"]:
+        print(f"整理快捷方式出错: {report[shortcut_prefix]['error']}")
+
+    # 打开文件夹
+    open_folder(today_folder)
+    return 0
+
+def build_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(prog="archive", description="创建当天的归档文件夹和桌面快捷方式")
+    parser.add_argument("paths", nargs="*", help="要导入当天文件夹的文件或文件夹（可以拖放到脚本上）")
+    parser.add_argument("--config", default="archive_config.json", help="配置文件路径，默认 archive_config.json")
+    parser.add_argument("--batch", action="store_true",
+                        help="不显示选择窗口，处理所有归档目录，结果以 JSON 输出到标准输出")
+    parser.add_argument("--only", help="只处理指定的归档目录（显示名称或快捷方式前缀），多个用逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="并发创建文件夹的线程数，默认每个归档目录一个线程")
+    parser.add_argument("--index-db", default="archive_index.db", help="归档索引数据库路径，默认 archive_index.db")
+    parser.add_argument("--index", action="store_true", help="增量更新归档索引，统计结果以 JSON 输出")
+    parser.add_argument("--search", metavar="TEXT", help="在归档索引中搜索文件名和内容，空格分隔的词之间为“并且”")
+    parser.add_argument("--since", help="只搜索此日期（YYYY-MM-DD）之后的日期文件夹")
+    parser.add_argument("--until", help="只搜索此日期（YYYY-MM-DD）之前的日期文件夹")
+    parser.add_argument("--limit", type=int, default=100, help="最多显示的搜索结果数，默认 100")
+    parser.add_argument("--pack", type=int, metavar="DAYS",
+                        help="把早于 DAYS 天前的日期文件夹打包到归档目录的 bundles 文件夹，校验后删除原文件夹")
+    parser.add_argument("--compression", default="deflate", help="打包的压缩算法：deflate（默认）或 lzma")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="与 --pack 一起使用时只列出将要打包的文件夹，与 --dedup 一起使用时只记录重复文件")
+    parser.add_argument("--extract", metavar="DATE/PATH", help="从压缩包中解压单个文件，例如 2024-03-05/合同.pdf")
+    parser.add_argument("--to", default=".", help="--extract 的解压目录，默认当前目录")
+    parser.add_argument("--dedup", action="store_true", help="查找内容相同的文件并替换为硬链接，统计结果以 JSON 输出")
+    parser.add_argument("--hash-db", default="archive_hashes.db", help="文件哈希缓存数据库路径，默认 archive_hashes.db")
+    parser.add_argument("--report", action="store_true",
+                        help="统计按日、按月、按年的空间占用和最大的文件夹，结果以 JSON 输出")
+    parser.add_argument("--top", type=int, default=20, help="--report 列出的最大日期文件夹或顶层文件夹数，默认 20")
+    parser.add_argument("--report-db", default="archive_report.db", help="目录大小缓存数据库路径，默认 archive_report.db")
+    parser.add_argument("--no-verify", action="store_true", help="导入文件时不校验复制后的内容")
+    parser.add_argument("--mirror", nargs="?", const="", metavar="DEST",
+                        help="把每个归档目录增量镜像到 DEST 下以显示名称命名的文件夹；"
+                             "不写 DEST 时使用配置中的 mirror_dir")
+    parser.add_argument("--mirror-hash", action="store_true", help="镜像时校验 SHA-256 并记入清单")
+    parser.add_argument("--mirror-delete", action="store_true", help="删除镜像中源目录已经没有的文件")
+    return parser
+
+def run_index(archive_configs, index_path, workers=None):
+    """增量更新归档索引，返回统计字典"""
+    from archiveIndex import ArchiveIndex
+    index = ArchiveIndex(index_path)
+    try:
+        return index.update([config["archive_dir"] for config in archive_configs], workers=workers or 8)
+    finally:
+        index.close()
+
+def run_pack(archive_configs, days, compression, workers=None, dry_run=False):
+    """打包超过保留天数的日期文件夹，返回结果汇总"""
+    from archiveBundle import COMPRESSIONS, pack_aged_folders
+    if days < 1:
+        raise ValueError("保留天数至少为 1 天")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"不支持的压缩算法: {compression}（可选 {', '.join(sorted(COMPRESSIONS))}）")
+    results = pack_aged_folders([config["archive_dir"] for config in archive_configs], days,
+                                compression, workers, dry_run=dry_run)
+    summary = {"days": days, "dry_run": dry_run, "total": len(results), "results": results}
+    if not dry_run:
+        summary["failed"] = sum(1 for result in results if result["error"])
+        summary["size"] = sum(result["size"] for result in results)
+        summary["bundle_size"] = sum(result["bundle_size"] for result in results)
+    return summary
+
+def run_extract(archive_configs, member, dest_dir):
+    """在各归档目录的压缩包中查找并解压单个文件，返回解压后的路径"""
+    from archiveBundle import extract_file
+    errors = []
+    for config in archive_configs:
+        try:
+            return extract_file(config["archive_dir"], member, dest_dir)
+        except FileNotFoundError as e:
+            errors.append(str(e))
+    raise FileNotFoundError(f"没有找到 {member}: " + "; ".join(errors))
+
+def run_ingest(archive_configs, names, paths, workers=None, verify=True):
+    """把文件和文件夹导入一个归档目录当天的文件夹，返回统计字典
+
+    用 --only 指定归档目录；只配置了一个归档目录时直接使用，否则弹出选择窗口，取消时返回 None。
+    """
+    if names is not None:
+        selected = select_configs(archive_configs, names)
+        if len(selected) != 1:
+            raise ValueError("导入文件时只能指定一个归档目录")
+        config = selected[0]
+    elif len(archive_configs) == 1:
+        config = archive_configs[0]
+    else:
+        config = select_archive_dir(archive_configs)
+        if not config:
+            return None
+    
+    from archiveIngest import ingest
+    today_folder = os.path.join(config["archive_dir"], datetime.datetime.now().strftime('%Y-%m-%d'))
+    with contextlib.redirect_stdout(sys.stderr):
+        create_folder(today_folder)
+    return ingest(paths, today_folder, workers=workers or 8, verify=verify)
+
+def run_mirror(archive_configs, dest, workers=None, use_hash=False, delete=False):
+    """把各归档目录增量镜像到 dest（或配置中的 mirror_dir），返回结果汇总"""
+    from archiveMirror import mirror_tree
+    results = []
+    for config in archive_configs:
+        if dest:
+            mirror_dir = os.path.join(dest, config["display_name"])
+        elif config.get("mirror_dir"):
+            mirror_dir = config["mirror_dir"]
+        else:
+            results.append({"source": config["archive_dir"], "dest": None, "errors": ["未指定镜像位置"]})
+            continue
+        try:
+            results.append(mirror_tree(config["archive_dir"], mirror_dir, workers or 8, use_hash, delete))
+        except OSError as e:
+            results.append({"source": config["archive_dir"], "dest": mirror_dir, "errors": [str(e)]})
+    return {"results": results, "failed": sum(1 for result in results if result["errors"])}
+
+def run_search(archive_configs, index_path, text, since=None, until=None, limit=100):
+    """在归档索引中搜索并打印结果，返回结果数"""
+    from archiveIndex import ArchiveIndex
+    index = ArchiveIndex(index_path)
+    try:
+        results = index.search(text, since=since, until=until, limit=limit,
+                               archive_dirs=[config["archive_dir"] for config in archive_configs])
+    finally:
+        index.close()
+    for result in results:
+        print(f"{result['date']}  {format_size(result['size']):>9}  {result['path']}")
+        if result["snippet"]:
+            print(f"    {' '.join(result['snippet'].split())}")
+    return len(results)
+
+def main(argv=None):
+    """命令行入口"""
+    args = build_parser().parse_args(argv)
     try:
         # 加载归档目录配置
-        archive_configs = load_archive_config()
+        archive_configs = load_archive_config(args.config)
         
         # 检查是否有配置的归档目录
         if archive_configs is None:
             # 配置文件刚创建，退出程序
-            sys.exit(0)
+            return 0
             
         if not archive_configs:
             print("错误: 未配置任何归档目录")
-            sys.exit(1)
-        
-        # 显示选择窗口
-        selected_config = select_archive_dir(archive_configs)
-        
-        # 如果用户取消选择，则退出
-        if not selected_config:
-            print("用户取消操作")
-            sys.exit(0)
+            return 1
         
-        # 获取选中的配置信息
-        selected_archive_dir = selected_config["archive_dir"]
-        shortcut_prefix = selected_config["shortcut_prefix"]
-        display_name = selected_config["display_name"]
+        names = [name.strip() for name in args.only.split(",") if name.strip()] if args.only else None
+        if args.index:
+            stats = run_index(select_configs(archive_configs, names), args.index_db, args.workers)
+            print(json.dumps(stats, ensure_ascii=False))
+            return 0
+        if args.paths:
+            stats = run_ingest(archive_configs, names, args.paths, args.workers, not args.no_verify)
+            if stats is None:
+                print("用户取消操作")
+                return 0
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+            return 1 if stats["errors"] else 0
+        if args.mirror is not None:
+            summary = run_mirror(select_configs(archive_configs, names), args.mirror, args.workers,
+                                 args.mirror_hash, args.mirror_delete)
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+            return 1 if summary["failed"] else 0
+        if args.pack is not None:
+            summary = run_pack(select_configs(archive_configs, names), args.pack, args.compression,
+                               args.workers, args.dry_run)
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+            return 1 if summary.get("failed") else 0
+        if args.dedup:
+            from archiveDedup import deduplicate
+            stats = deduplicate([config["archive_dir"] for config in select_configs(archive_configs, names)],
+                                args.hash_db, workers=args.workers or 8, dry_run=args.dry_run)
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+            return 1 if stats["errors"] else 0
+        if args.report:
+            from archiveReport import storage_report
+            report = storage_report(select_configs(archive_configs, names), args.report_db,
+                                    workers=args.workers or 8, top=args.top)
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            return 0
+        if args.extract:
+            print(f"已解压: {run_extract(select_configs(archive_configs, names), args.extract, args.to)}")
+            return 0
+        if args.search:
+            found = run_search(select_configs(archive_configs, names), args.index_db, args.search,
+                               args.since, args.until, args.limit)
+            return 0 if found else 1
+        if not args.batch:
+            return run_interactive(archive_configs, args.index_db)
         
-        # 获取今天的日期
-        today = datetime.datetime.now()
-        today_str = today.strftime('%Y-%m-%d')
-
-        # 设置路径
-        today_folder = os.path.join(selected_archive_dir, today_str)
-        desktop_path = get_desktop_path()
-        shortcut_name = f'{shortcut_prefix} {today_str}.lnk' if platform.system() == 'Windows' else f'{shortcut_prefix} {today_str}.desktop'
-        shortcut_path = os.path.join(desktop_path, shortcut_name)
-
-        # 创建文件夹
-        folder_created = create_folder(today_folder)
-
-        # 创建快捷方式
-        if folder_created:
-            create_shortcut(today_folder, shortcut_path, shortcut_prefix, today_str)
-            print(f"快捷方式已创建: {shortcut_path}")
-
-        # 删除旧快捷方式（只删除同名前缀的）
-        delete_old_shortcuts(desktop_path, today_str, shortcut_prefix)
-
-        # 打开文件夹
-        open_folder(today_folder)
+        summary = run_batch(select_configs(archive_configs, names), args.workers)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 1 if summary["failed"] else 0
 
     except Exception as e:
         print(f"发生错误: {e}")
-        sys.exit(1)
\ No newline at end of file
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""归档打包：把超过保留天数的日期文件夹压缩为 zip 包，校验后删除原文件夹
+
+每个归档目录的压缩包保存在其下的 bundles 文件夹中（bundles/2024-03-05.zip），
+旁边的清单文件（2024-03-05.manifest.json）记录每个文件的大小、修改时间和 CRC，
+可以只解压其中一个文件，并恢复原来的修改时间。
+"""
+import datetime
+import json
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from archiveIndex import is_date_folder
+
+BUNDLE_DIR = 'bundles'
+MANIFEST_SUFFIX = '.manifest.json'
+COMPRESSIONS = {
+    'deflate': zipfile.ZIP_DEFLATED,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+
+def bundle_paths(archive_dir, date_str):
+    """日期文件夹对应的 (压缩包路径, 清单路径)"""
+    bundle_dir = os.path.join(archive_dir, BUNDLE_DIR)
+    return (os.path.join(bundle_dir, f'{date_str}.zip'),
+            os.path.join(bundle_dir, f'{date_str}{MANIFEST_SUFFIX}'))
+
+
+def find_aged_folders(archive_dir, days, today=None):
+    """找出日期早于 today - days 天的日期文件夹，返回 [(日期, 路径)]，按日期排序"""
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=days)).isoformat()
+    folders = []
+    with os.scandir(archive_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and is_date_folder(entry.name) and entry.name < cutoff:
+                folders.append((entry.name, entry.path))
+    return sorted(folders)
+
+
+def list_files(folder):
+    """列出文件夹中的文件和空目录，返回 [(相对路径, 完整路径, stat 或 None)]，目录的相对路径以 / 结尾"""
+    items = []
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            children = list(entries)
+        if not children and directory != folder:
+            items.append((os.path.relpath(directory, folder).replace(os.sep, '/') + '/', directory, None))
+        for entry in children:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            else:
+                items.append((os.path.relpath(entry.path, folder).replace(os.sep, '/'), entry.path,
+                              entry.stat(follow_symlinks=False)))
+    return sorted(items)
+
+
+def pack_folder(folder, archive_dir, compression='deflate', remove=True):
+    """把一个日期文件夹打包为 zip，校验通过后删除原文件夹，返回结果字典（在进程池中运行）
+
+    文件逐个以数据块写入压缩包，内存占用与文件大小无关。先写入临时文件，校验通过、
+    并且文件夹在打包期间没有变化（新增、删除、大小或修改时间改变）时才改名，之后再写入清单。
+    原文件夹仍然存在时说明上次没有完成，已有的压缩包会被重新生成。
+    """
+    date_str = os.path.basename(folder)
+    bundle_path, manifest_path = bundle_paths(archive_dir, date_str)
+    result = {"folder": folder, "bundle": bundle_path, "files": 0, "size": 0,
+              "bundle_size": 0, "removed": False, "error": None}
+    partial_path = bundle_path + '.partial'
+    try:
+        os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+        items = list_files(folder)
+        entries = []
+        with zipfile.ZipFile(partial_path, 'w', COMPRESSIONS[compression], strict_timestamps=False) as bundle:
+            for name, path, stat in items:
+                if stat is None:
+                    bundle.writestr(name, b'')
+                    continue
+                bundle.write(path, name)
+                info = bundle.getinfo(name)
+                entries.append({"name": name, "size": stat.st_size, "mtime": stat.st_mtime,
+                                "crc": info.CRC, "compressed_size": info.compress_size})
+
+        # 校验：成员和大小与原文件一致，CRC 正确
+        with zipfile.ZipFile(partial_path) as bundle:
+            sizes = {info.filename: info.file_size for info in bundle.infolist()}
+            for entry in entries:
+                if sizes.get(entry["name"]) != entry["size"]:
+                    raise ValueError(f"校验失败，文件大小不一致: {entry['name']}")
+            bad = bundle.testzip()
+            if bad is not None:
+                raise ValueError(f"校验失败，CRC 错误: {bad}")
+
+        # 打包期间文件夹有变化时压缩包已经过时，丢弃它，下次再打包
+        current = {name: (stat.st_size, stat.st_mtime) for name, _, stat in list_files(folder) if stat}
+        packed = {entry["name"]: (entry["size"], entry["mtime"]) for entry in entries}
+        if current != packed:
+            raise ValueError("打包期间文件夹有变化，保留原文件夹，下次重新打包")
+
+        # 清单在压缩包改名成功后再写入，清单存在即表示压缩包完整
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        os.replace(partial_path, bundle_path)
+        manifest = {
+            "folder": folder,
+            "date": date_str,
+            "created": time.time(),
+            "compression": compression,
+            "dirs": [name for name, _, stat in items if stat is None],
+            "files": entries,
+        }
+        with open(manifest_path + '.partial', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(manifest_path + '.partial', manifest_path)
+        result["files"] = len(entries)
+        result["size"] = sum(entry["size"] for entry in entries)
+        result["bundle_size"] = os.path.getsize(bundle_path)
+
+        if remove:
+            # 写清单期间有变化时保留原文件夹，下次打包会重新生成压缩包
+            current = {name: (stat.st_size, stat.st_mtime) for name, _, stat in list_files(folder) if stat}
+            if current != packed:
+                raise ValueError("打包期间文件夹有变化，保留原文件夹，下次重新打包")
+            shutil.rmtree(folder)
+            result["removed"] = True
+    except Exception as e:
+        result["error"] = str(e)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return result
+
+
+def pack_aged_folders(archive_dirs, days, compression='deflate', workers=None, today=None, dry_run=False):
+    """把各归档目录中超过 days 天的日期文件夹打包，压缩在进程池中并发进行，返回结果列表
+
+    每个日期文件夹是进程池中的一个任务。dry_run 为真时只返回将要打包的文件夹。
+    """
+    tasks = []
+    for archive_dir in archive_dirs:
+        archive_dir = os.path.abspath(archive_dir)
+        for _, folder in find_aged_folders(archive_dir, days, today):
+            tasks.append((folder, archive_dir))
+    if dry_run or not tasks:
+        # 只列出将要打包的文件夹
+        return [{"folder": folder, "bundle": bundle_paths(archive_dir, os.path.basename(folder))[0]}
+                for folder, archive_dir in tasks]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(pack_folder, folder, archive_dir, compression) for folder, archive_dir in tasks]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda result: result["folder"])
+
+
+def load_manifest(manifest_path):
+    """读取压缩包清单"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def extract_file(archive_dir, member, dest_dir):
+    """从压缩包中只解压一个文件，member 为 日期/相对路径，返回解压后的路径
+
+    先通过清单确认文件存在，再按 zip 的中央目录直接定位该成员，不解压其他文件。
+    """
+    date_str, _, name = member.replace('\\', '/').partition('/')
+    bundle_path, manifest_path = bundle_paths(os.path.abspath(archive_dir), date_str)
+    manifest = load_manifest(manifest_path)
+    entry = next((entry for entry in manifest["files"] if entry["name"] == name), None)
+    if entry is None:
+        raise FileNotFoundError(f"压缩包中没有此文件: {member}")
+
+    target = os.path.join(dest_dir, *name.split('/'))
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    with zipfile.ZipFile(bundle_path) as bundle, bundle.open(name) as source, open(target, 'wb') as f:
+        shutil.copyfileobj(source, f, 1024 * 1024)
+    os.utime(target, (entry["mtime"], entry["mtime"]))
+    return target
@@ -0,0 +1,249 @@
+"""归档去重：找出各归档目录中内容相同的文件，用硬链接替换重复的副本
+
+大小唯一的文件不可能有重复，不计算哈希；大小相同的文件先比较开头一块数据的哈希，
+仍相同时再分块计算完整哈希。两种哈希都按 (路径, 大小, 修改时间) 保存在 SQLite 中，
+文件没有变化时下次直接使用。
+
+注意：硬链接的文件共用同一份数据和修改时间，修改其中一个会同时改变其他副本。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from archiveIndex import is_date_folder
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    head TEXT NOT NULL,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS duplicates (
+    path TEXT PRIMARY KEY,
+    canonical TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    linked INTEGER NOT NULL,
+    seen REAL NOT NULL
+);
+"""
+
+CHUNK_SIZE = 1024 * 1024  # 计算哈希时每次读取的字节数
+HEAD_SIZE = 64 * 1024  # 预筛选时读取的开头字节数
+
+
+def hash_file(path, limit=None):
+    """分块计算文件的 SHA-256，limit 为只读取的开头字节数"""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def scan_files(archive_dirs, workers=8):
+    """并发扫描各归档目录的日期文件夹，返回 [(路径, stat)]（只包括普通文件）"""
+    folders = []
+    for archive_dir in archive_dirs:
+        try:
+            with os.scandir(archive_dir) as entries:
+                folders.extend(entry.path for entry in entries
+                               if entry.is_dir(follow_symlinks=False) and is_date_folder(entry.name))
+        except OSError:
+            continue
+
+    def walk(folder):
+        files = []
+        pending = [folder]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append((entry.path, entry.stat(follow_symlinks=False)))
+            except OSError:
+                continue
+        return files
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [item for files in executor.map(walk, folders) for item in files]
+
+
+class HashCache:
+    """按 (路径, 大小, 修改时间) 缓存文件哈希，并记录找到的重复文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def lookup(self, items):
+        """items 为 [(路径, stat)]，返回仍然有效的缓存 {路径: [开头哈希, 完整哈希或 None]}"""
+        cached = {}
+        with self._lock:
+            for path, stat in items:
+                row = self._db.execute("SELECT size, mtime, head, hash FROM hashes WHERE path = ?",
+                                       (path,)).fetchone()
+                if row and row[:2] == (stat.st_size, stat.st_mtime):
+                    cached[path] = [row[2], row[3]]
+        return cached
+
+    def store(self, records):
+        """保存 [(路径, 大小, 修改时间, 开头哈希, 完整哈希或 None)]"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime, head, hash) VALUES (?, ?, ?, ?, ?)", records)
+
+    def record_duplicates(self, records):
+        """保存 [(路径, 原文件, 大小, 哈希, 是否已链接)]"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO duplicates (path, canonical, size, hash, linked, seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [record + (now,) for record in records])
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def link_duplicate(canonical, duplicate, expected):
+    """用指向 canonical 的硬链接替换 duplicate，expected 为计算哈希时两者的 (大小, 修改时间)
+
+    先在同一目录下创建临时链接再改名替换，中途失败不会丢失文件。文件在计算哈希后有变化时不替换。
+    """
+    for path, (size, mtime) in zip((canonical, duplicate), expected):
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) != (size, mtime):
+            raise ValueError(f"文件在计算哈希后有变化: {path}")
+    temp_path = f"{duplicate}.dedup-{os.getpid()}"
+    os.link(canonical, temp_path)
+    try:
+        os.replace(temp_path, duplicate)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+def deduplicate(archive_dirs, cache_path, workers=8, dry_run=False):
+    """查找重复文件并用硬链接替换，返回统计字典
+
+    dry_run 为真时只把重复文件记录到缓存数据库的 duplicates 表，不修改文件。
+    不在同一个文件系统上的重复文件无法硬链接，同样只记录。
+    """
+    files = scan_files(archive_dirs, workers)
+    stats = {"files": len(files), "candidates": 0, "hashed": 0, "cached": 0,
+             "duplicates": 0, "linked": 0, "reclaimed": 0, "errors": []}
+
+    # 按大小分组，只有大小相同的文件才需要进一步比较
+    by_size = {}
+    for path, stat in files:
+        if stat.st_size:
+            by_size.setdefault(stat.st_size, []).append(path)
+
+    # 大小相同的文件重新 stat 取得设备号和 inode：Windows 上 DirEntry.stat() 的 st_ino、st_dev 总是 0。
+    # 同一个 inode 的多个硬链接只算一个文件
+    def full_stat(path):
+        try:
+            return path, os.stat(path)
+        except OSError:
+            return path, None
+
+    groups = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for paths in by_size.values():
+            if len(paths) < 2:
+                continue
+            inodes = {}
+            for path, stat in executor.map(full_stat, paths):
+                if stat is not None:
+                    inodes.setdefault((stat.st_dev, stat.st_ino), (path, stat))
+            if len(inodes) > 1:
+                groups.append(list(inodes.values()))
+    candidates = [item for group in groups for item in group]
+    stats["candidates"] = len(candidates)
+
+    cache = HashCache(cache_path)
+    try:
+        hashes = cache.lookup(candidates)
+        stats["cached"] = len(hashes)
+        changed = set()  # 新计算了哈希的文件
+        hashed = set()  # 新计算了完整哈希的文件
+
+        def compute(item, full):
+            # 不超过 HEAD_SIZE 的文件，开头哈希就是完整哈希
+            path, stat = item
+            entry = hashes.setdefault(path, [None, None])
+            try:
+                if entry[0] is None:
+                    entry[0] = hash_file(path, HEAD_SIZE)
+                    changed.add(path)
+                if entry[1] is None and (full or stat.st_size <= HEAD_SIZE):
+                    entry[1] = entry[0] if stat.st_size <= HEAD_SIZE else hash_file(path)
+                    changed.add(path)
+                    hashed.add(path)
+            except OSError as e:
+                stats["errors"].append(f"{path}: {e}")
+                hashes.pop(path, None)
+            return item
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 第一步：开头哈希（大多数不同的文件在这里就能区分）
+            list(executor.map(lambda item: compute(item, False), candidates))
+            # 第二步：大小和开头哈希都相同的文件才计算完整哈希
+            by_head = {}
+            for path, stat in candidates:
+                if path in hashes:
+                    by_head.setdefault((stat.st_size, hashes[path][0]), []).append((path, stat))
+            to_hash = [item for items in by_head.values() if len(items) > 1 for item in items]
+            list(executor.map(lambda item: compute(item, True), to_hash))
+
+        stats["hashed"] = len(hashed)
+        cache.store([(path, stat.st_size, stat.st_mtime, *hashes[path])
+                     for path, stat in candidates if path in changed and path in hashes])
+        digests = {}
+        for path, stat in to_hash:
+            if path in hashes:
+                digests.setdefault(hashes[path][1], []).append((path, stat))
+
+        duplicates = []
+        for digest, items in digests.items():
+            if len(items) < 2:
+                continue
+            # 保留修改时间最早的文件，其余替换为指向它的硬链接
+            items.sort(key=lambda item: (item[1].st_mtime, item[0]))
+            canonical, canonical_stat = items[0]
+            for path, stat in items[1:]:
+                stats["duplicates"] += 1
+                linked = False
+                if not dry_run and stat.st_dev == canonical_stat.st_dev:
+                    try:
+                        link_duplicate(canonical, path, ((canonical_stat.st_size, canonical_stat.st_mtime),
+                                                         (stat.st_size, stat.st_mtime)))
+                        linked = True
+                        stats["linked"] += 1
+                        stats["reclaimed"] += stat.st_size
+                    except (OSError, ValueError) as e:
+                        stats["errors"].append(f"{path}: {e}")
+                duplicates.append((path, canonical, stat.st_size, digest, int(linked)))
+        cache.record_duplicates(duplicates)
+        if dry_run:
+            stats["reclaimable"] = sum(size for _, _, size, _, _ in duplicates)
+    finally:
+        cache.close()
+    return stats
@@ -0,0 +1,314 @@
+"""归档索引：把各归档目录下日期文件夹中的文件名、大小、修改时间和文本内容增量写入 SQLite 全文索引
+
+每个日期文件夹记录其中所有目录的修改时间，再次更新时只 stat 这些目录（不列目录），
+修改时间全部没变的日期文件夹直接跳过。在目录中新增、删除、重命名文件都会改变目录的修改时间；
+原地改写文件内容不会，这类文件要等所在文件夹有其他变化时才会重新索引。
+
+全文索引使用 FTS5 的 trigram 分词器（SQLite 3.34 起支持）。当前的 SQLite 不支持时不建全文索引，
+搜索改为逐行匹配，结果相同但速度较慢；换用支持的 SQLite 后第一次打开会重建全文索引。
+"""
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    archive_dir TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_folder ON dirs (folder);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+    name, text, content='files', content_rowid='id', tokenize='trigram'
+);
+"""
+FTS_VERSION = 1  # 全文索引与 files 表同步时数据库的 user_version
+
+# 直接按文本读取的扩展名
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.csv', '.tsv', '.json', '.xml', '.html', '.htm', '.log', '.ini', '.cfg',
+    '.yaml', '.yml', '.py', '.js', '.sql', '.sh', '.bat',
+}
+# Office 文档（zip 包）中保存文本的部分
+OFFICE_PARTS = {
+    '.docx': re.compile(r'word/(document|header\d*|footer\d*)\.xml'),
+    '.xlsx': re.compile(r'xl/sharedStrings\.xml'),
+    '.pptx': re.compile(r'ppt/slides/slide\d+\.xml'),
+}
+MAX_TEXT = 256 * 1024  # 每个文件最多索引的文本字符数
+MAX_READ = 4 * 1024 * 1024  # 每个文件最多读取的字节数
+XML_TAG = re.compile(r'<[^>]+>')
+DATE_FOLDER = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def is_date_folder(name):
+    """是否为 create_folder 创建的 YYYY-MM-DD 文件夹"""
+    if not DATE_FOLDER.fullmatch(name):
+        return False
+    try:
+        datetime.date.fromisoformat(name)
+    except ValueError:
+        return False
+    return True
+
+
+def trigram_supported():
+    """当前的 SQLite 是否支持 FTS5 和 trigram 分词器"""
+    db = sqlite3.connect(':memory:')
+    try:
+        db.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        db.close()
+
+
+def decode_text(data):
+    """按 UTF-8、GBK 的顺序解码，都失败时忽略无法解码的字节"""
+    for encoding in ('utf-8-sig', 'gbk'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='ignore')
+
+
+def extract_text(path):
+    """提取文件的文本内容，不支持的格式或读取失败时返回 None"""
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension in TEXT_EXTENSIONS:
+            with open(path, 'rb') as f:
+                return decode_text(f.read(MAX_READ))[:MAX_TEXT]
+        if extension in OFFICE_PARTS:
+            parts = []
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if OFFICE_PARTS[extension].fullmatch(name):
+                        with archive.open(name) as f:
+                            parts.append(XML_TAG.sub(' ', decode_text(f.read(MAX_READ))))
+            return ' '.join(' '.join(parts).split())[:MAX_TEXT]
+        if extension == '.pdf' and pypdf is not None:
+            reader = pypdf.PdfReader(path)
+            parts = []
+            length = 0
+            for page in reader.pages:
+                text = page.extract_text() or ''
+                parts.append(text)
+                length += len(text)
+                if length >= MAX_TEXT:
+                    break
+            return '\n'.join(parts)[:MAX_TEXT]
+    except Exception:
+        return None
+    return None
+
+
+def scan_folder(folder):
+    """扫描一个日期文件夹，返回 (目录修改时间 {路径: mtime}, 文件列表 [(路径, 相对路径, 大小, mtime, 文本)])"""
+    dirs = {}
+    files = []
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        try:
+            # 先记录修改时间再列目录，扫描期间的改动会在下次更新时发现
+            dirs[directory] = os.stat(directory).st_mtime
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, os.path.relpath(entry.path, folder),
+                                      stat.st_size, stat.st_mtime, extract_text(entry.path)))
+        except OSError:
+            continue
+    return dirs, files
+
+
+def folder_changed(folder, known_dirs):
+    """已索引的日期文件夹是否有变化：任何一个目录的修改时间改变或目录消失"""
+    for path, mtime in known_dirs.items():
+        try:
+            if os.stat(path).st_mtime != mtime:
+                return True
+        except OSError:
+            return True
+    return not known_dirs
+
+
+class ArchiveIndex:
+    """归档目录的全文索引（可以在多个线程中使用）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self.fts = trigram_supported()
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if not self.fts:
+            # 不维护全文索引，标记为未同步，以后用支持的 SQLite 打开时重建
+            if version == FTS_VERSION:
+                self._db.execute("PRAGMA user_version = 0")
+        elif version != FTS_VERSION:
+            with self._db:
+                self._db.executescript(FTS_SCHEMA)
+                self._db.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+            self._db.execute(f"PRAGMA user_version = {FTS_VERSION}")
+
+    def update(self, archive_dirs, workers=8):
+        """增量更新索引，返回统计字典
+
+        只重新扫描有变化的日期文件夹；已经不存在的日期文件夹从索引中删除。
+        无法访问的归档目录（例如网络共享断开）保留原有索引。
+        """
+        on_disk = {}
+        listed = set()
+        for archive_dir in archive_dirs:
+            archive_dir = os.path.abspath(archive_dir)
+            try:
+                with os.scandir(archive_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and is_date_folder(entry.name):
+                            on_disk[entry.path] = (archive_dir, entry.name)
+            except OSError:
+                continue
+            listed.add(archive_dir)
+
+        with self._lock:
+            known = {}
+            for path, folder, mtime in self._db.execute("SELECT path, folder, mtime FROM dirs"):
+                known.setdefault(folder, {})[path] = mtime
+            indexed = dict(self._db.execute("SELECT path, archive_dir FROM folders"))
+
+        def check(folder):
+            # 检查和扫描都放在线程池中，网络共享上的 stat 可以并发
+            if folder in indexed and not folder_changed(folder, known.get(folder, {})):
+                return folder, None
+            return folder, scan_folder(folder)
+
+        stats = {"folders": len(on_disk), "scanned": 0, "skipped": 0, "removed": 0, "files": 0}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for folder, scanned in executor.map(check, on_disk):
+                if scanned is None:
+                    stats["skipped"] += 1
+                    continue
+                archive_dir, date = on_disk[folder]
+                self._replace_folder(folder, archive_dir, date, *scanned)
+                stats["scanned"] += 1
+                stats["files"] += len(scanned[1])
+
+        for folder, archive_dir in indexed.items():
+            if archive_dir in listed and folder not in on_disk:
+                self._remove_folder(folder)
+                stats["removed"] += 1
+        return stats
+
+    def _delete_files(self, folder):
+        """删除一个日期文件夹的文件记录（外部内容的全文索引需要用旧内容删除）"""
+        if self.fts:
+            self._db.executemany(
+                "INSERT INTO files_fts (files_fts, rowid, name, text) VALUES ('delete', ?, ?, ?)",
+                self._db.execute("SELECT id, name, text FROM files WHERE folder = ?", (folder,)).fetchall())
+        self._db.execute("DELETE FROM files WHERE folder = ?", (folder,))
+        self._db.execute("DELETE FROM dirs WHERE folder = ?", (folder,))
+
+    def _replace_folder(self, folder, archive_dir, date, dirs, files):
+        with self._lock, self._db:
+            self._delete_files(folder)
+            self._db.execute("INSERT OR REPLACE INTO folders (path, archive_dir, date) VALUES (?, ?, ?)",
+                             (folder, archive_dir, date))
+            self._db.executemany("INSERT INTO dirs (path, folder, mtime) VALUES (?, ?, ?)",
+                                 [(path, folder, mtime) for path, mtime in dirs.items()])
+            for path, name, size, mtime, text in files:
+                cursor = self._db.execute(
+                    "INSERT INTO files (folder, path, name, size, mtime, text) VALUES (?, ?, ?, ?, ?, ?)",
+                    (folder, path, name, size, mtime, text))
+                if self.fts:
+                    self._db.execute("INSERT INTO files_fts (rowid, name, text) VALUES (?, ?, ?)",
+                                     (cursor.lastrowid, name, text))
+
+    def _remove_folder(self, folder):
+        with self._lock, self._db:
+            self._delete_files(folder)
+            self._db.execute("DELETE FROM folders WHERE path = ?", (folder,))
+
+    def search(self, text, since=None, until=None, archive_dirs=None, limit=100):
+        """搜索文件名和内容，空格分隔的词之间为"并且"，返回字典列表（按相关度排序）
+
+        三个字以上的词使用全文索引；更短的词（例如两个字的中文词）和不支持全文索引时的所有词逐行匹配。
+        since 和 until 为 YYYY-MM-DD，限定日期文件夹的范围；archive_dirs 限定归档目录。
+        """
+        terms = text.split()
+        indexed = [term for term in terms if self.fts and len(term) >= 3]
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in indexed)
+        conditions = []
+        params = []
+        if match:
+            conditions.append("files_fts MATCH ?")
+            params.append(match)
+        for term in terms:
+            if term not in indexed:
+                conditions.append("(files.name LIKE ? ESCAPE '\\' OR files.text LIKE ? ESCAPE '\\')")
+                pattern = '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+                params.extend((pattern, pattern))
+        if since:
+            conditions.append("folders.date >= ?")
+            params.append(since)
+        if until:
+            conditions.append("folders.date <= ?")
+            params.append(until)
+        if archive_dirs:
+            conditions.append(f"folders.archive_dir IN ({', '.join('?' * len(archive_dirs))})")
+            params.extend(os.path.abspath(archive_dir) for archive_dir in archive_dirs)
+        if not conditions:
+            return []
+
+        if match:
+            sql = ("SELECT files.path, files.size, files.mtime, folders.date, "
+                   "snippet(files_fts, 1, '[', ']', '…', 12) "
+                   "FROM files_fts JOIN files ON files.id = files_fts.rowid "
+                   "JOIN folders ON folders.path = files.folder "
+                   f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ?")
+        else:
+            sql = ("SELECT files.path, files.size, files.mtime, folders.date, NULL "
+                   "FROM files JOIN folders ON folders.path = files.folder "
+                   f"WHERE {' AND '.join(conditions)} ORDER BY folders.date DESC LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{"path": path, "size": size, "mtime": mtime, "date": date, "snippet": snippet}
+                for path, size, mtime, date, snippet in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
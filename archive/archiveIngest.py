@@ -0,0 +1,214 @@
+"""导入文件：把文件和文件夹并发复制到当天的归档文件夹，校验内容并统计速度
+
+复制时优先使用内核的零拷贝接口（Linux 上的 copy_file_range，其次 sendfile），不可用时分块读写。
+目标文件夹只列一次，重名的文件在内存中分配新名称（"名称 (1).扩展名"），
+再用 O_EXCL 创建目标文件占用名称，不需要逐个检查文件是否存在。
+"""
+import errno
+import hashlib
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from stat import S_ISDIR, S_ISREG
+
+CHUNK_SIZE = 1024 * 1024  # 分块复制和计算哈希时每次读取的字节数
+# 这些错误表示零拷贝接口不适用于当前文件（例如跨文件系统），改用其他方式
+FALLBACK_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def copy_data(source_fd, target_fd, size):
+    """把 source_fd 的 size 字节复制到 target_fd，返回使用的方式，复制的字节数不一致时抛出 OSError
+
+    零拷贝接口一个字节都没有复制就返回 0 或报错时（某些文件系统不支持），改用下一种方式。
+    """
+    if hasattr(os, 'copy_file_range'):
+        copied = 0
+        try:
+            while copied < size:
+                count = os.copy_file_range(source_fd, target_fd, size - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as e:
+            if copied or e.errno not in FALLBACK_ERRORS:
+                raise
+        else:
+            if copied == size:
+                return 'copy_file_range'
+            if copied:
+                raise OSError(errno.EIO, f"复制不完整: {copied}/{size} 字节")
+    if hasattr(os, 'sendfile') and platform.system() == 'Linux':
+        copied = 0
+        try:
+            while copied < size:
+                count = os.sendfile(target_fd, source_fd, copied, size - copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError as e:
+            if copied or e.errno not in FALLBACK_ERRORS:
+                raise
+        else:
+            if copied == size:
+                return 'sendfile'
+            if copied:
+                raise OSError(errno.EIO, f"复制不完整: {copied}/{size} 字节")
+    os.lseek(source_fd, 0, os.SEEK_SET)
+    os.lseek(target_fd, 0, os.SEEK_SET)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    copied = 0
+    with open(source_fd, 'rb', buffering=0, closefd=False) as source:
+        while True:
+            count = source.readinto(buffer)
+            if not count:
+                break
+            written = 0
+            while written < count:
+                written += os.write(target_fd, view[written:count])
+            copied += count
+    if copied != size:
+        raise OSError(errno.EIO, f"复制期间源文件有变化: {copied}/{size} 字节")
+    return 'read/write'
+
+
+def file_digest(path):
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class NameAllocator:
+    """在内存中为目标文件夹分配不重名的文件名（可以在多个线程中使用）"""
+
+    def __init__(self, existing):
+        self._fold = str.lower if platform.system() == 'Windows' else str  # Windows 文件名不区分大小写
+        self._taken = {self._fold(name) for name in existing}
+        self._lock = threading.Lock()
+
+    def allocate(self, name):
+        """返回未被占用的名称并占用它"""
+        stem, extension = os.path.splitext(name)
+        candidate = name
+        number = 0
+        with self._lock:
+            while self._fold(candidate) in self._taken:
+                number += 1
+                candidate = f"{stem} ({number}){extension}"
+            self._taken.add(self._fold(candidate))
+        return candidate
+
+
+def plan_ingest(paths, dest_dir):
+    """展开要导入的文件和文件夹，返回 ([(源文件, 目标路径, 大小)], 重命名的列表, 跳过的路径, 错误列表)
+
+    只有直接放入 dest_dir 的顶层文件和文件夹可能重名；文件夹内的文件放在新分配的文件夹中，不会冲突。
+    直接指定的符号链接按其指向的文件或文件夹导入；文件夹中的符号链接和其他特殊文件不跟随、不复制，
+    记入跳过的路径（链接成环时也不会无限遍历）。不存在或无法读取的路径记入错误列表，其余路径照常导入。
+    """
+    try:
+        existing = os.listdir(dest_dir)
+    except FileNotFoundError:
+        existing = []
+    names = NameAllocator(existing)
+    files = []
+    renamed = []
+    skipped = []
+    errors = []
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            errors.append(f"{path}: {e}")
+            continue
+        if not (S_ISDIR(stat.st_mode) or S_ISREG(stat.st_mode)):
+            skipped.append(path)
+            continue
+        name = os.path.basename(path.rstrip('\\/'))
+        target_name = names.allocate(name)
+        if target_name != name:
+            renamed.append((path, target_name))
+        target = os.path.join(dest_dir, target_name)
+        if not S_ISDIR(stat.st_mode):
+            files.append((path, target, stat.st_size))
+            continue
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append((entry.path, os.path.join(target, os.path.relpath(entry.path, path)),
+                                          entry.stat(follow_symlinks=False).st_size))
+                        else:
+                            skipped.append(entry.path)
+            except OSError as e:
+                errors.append(f"{directory}: {e}")
+    return files, renamed, skipped, errors
+
+
+def copy_file(source, target, verify=True):
+    """复制一个文件并保留修改时间，verify 为真时比较两边的 SHA-256，返回使用的复制方式"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    source_fd = os.open(source, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        stat = os.fstat(source_fd)
+        # O_EXCL：目标已存在时失败，不会覆盖其他程序同时写入的文件
+        target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o644)
+        # 之后任何一步失败都删除目标文件，不在当天的文件夹中留下不完整的文件
+        try:
+            try:
+                method = copy_data(source_fd, target_fd, stat.st_size)
+            finally:
+                os.close(target_fd)
+            os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            if verify and file_digest(source) != file_digest(target):
+                raise ValueError(f"校验失败，复制后的内容不一致: {target}")
+        except BaseException:
+            os.remove(target)
+            raise
+    finally:
+        os.close(source_fd)
+    return method
+
+
+def ingest(paths, dest_dir, workers=8, verify=True):
+    """把文件和文件夹并发复制到 dest_dir，返回统计字典"""
+    start = time.perf_counter()
+    files, renamed, skipped, errors = plan_ingest(paths, dest_dir)
+    stats = {"dest": dest_dir, "files": len(files), "copied": 0, "bytes": 0, "seconds": 0.0,
+             "mb_per_second": 0.0, "methods": {}, "renamed": [f"{source} -> {name}" for source, name in renamed],
+             "skipped": skipped, "errors": errors}
+
+    def copy(task):
+        source, target, size = task
+        try:
+            return task, copy_file(source, target, verify), None
+        except Exception as e:
+            return task, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (source, target, size), method, error in executor.map(copy, files):
+            if error:
+                stats["errors"].append(f"{source}: {error}")
+                continue
+            stats["copied"] += 1
+            stats["bytes"] += size
+            stats["methods"][method] = stats["methods"].get(method, 0) + 1
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    if stats["seconds"]:
+        stats["mb_per_second"] = round(stats["bytes"] / 1024 / 1024 / stats["seconds"], 1)
+    return stats
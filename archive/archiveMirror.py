@@ -0,0 +1,201 @@
+"""归档镜像：把归档目录增量复制到另一个位置（U 盘或其他挂载点）
+
+镜像目录中的清单（.mirror_manifest.db）记录每个已复制文件的大小、修改时间和可选的 SHA-256，
+每次只复制新增或有变化的文件。文件先写入临时文件再改名，每复制一批文件提交一次清单，
+中断后重新运行会跳过已经完成的文件；中断时留下的临时文件在 delete 为真时清理。
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from archiveIngest import copy_data, file_digest
+
+MANIFEST_NAME = '.mirror_manifest.db'
+PARTIAL_SUFFIX = '.mirror-partial'
+COMMIT_EVERY = 200  # 每复制多少个文件提交一次清单
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT
+);
+"""
+
+
+def scan_tree(root, workers=8):
+    """并发扫描 root 下的所有文件，返回 {相对路径: (大小, 修改时间 ns)}，相对路径使用 /"""
+    def walk(directory):
+        found = {}
+        pending = [directory]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        relative = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                        found[relative] = (stat.st_size, stat.st_mtime_ns)
+        return found
+
+    files = {}
+    directories = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    # 每个顶层文件夹（日期文件夹）是线程池中的一个任务
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for found in executor.map(walk, directories):
+            files.update(found)
+    return files
+
+
+def remove_partials(dest_root):
+    """删除镜像目录中中断时留下的临时文件，返回 (删除的数量, 错误列表)"""
+    removed = 0
+    errors = []
+    for directory, _, names in os.walk(dest_root):
+        for name in names:
+            if name.endswith(PARTIAL_SUFFIX):
+                try:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+                except OSError as e:
+                    errors.append(f"{name}: {e}")
+    return removed, errors
+
+
+def mirror_file(source, target, use_hash=False):
+    """复制一个文件（先写入临时文件再改名），保留修改时间，返回 SHA-256（use_hash 为假时为 None）"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + PARTIAL_SUFFIX
+    source_fd = os.open(source, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        stat = os.fstat(source_fd)
+        target_fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        # 之后任何一步失败都删除临时文件，不在镜像目录中留下不完整的文件
+        try:
+            try:
+                copy_data(source_fd, target_fd, stat.st_size)
+            finally:
+                os.close(target_fd)
+            os.utime(partial, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            digest = None
+            if use_hash:
+                digest = file_digest(source)
+                if file_digest(partial) != digest:
+                    raise ValueError(f"校验失败，复制后的内容不一致: {target}")
+            os.replace(partial, target)
+        except BaseException:
+            os.remove(partial)
+            raise
+    finally:
+        os.close(source_fd)
+    return digest
+
+
+def mirror_tree(source_root, dest_root, workers=8, use_hash=False, delete=False):
+    """把 source_root 增量镜像到 dest_root，返回统计字典
+
+    大小和修改时间与清单和镜像文件都一致的文件直接跳过，镜像文件缺失或被改动时重新复制。
+    use_hash 为真时复制后校验 SHA-256 并记入清单，只有修改时间变化、内容没变的文件不再复制。delete 为真时删除镜像中源目录已经没有的文件，
+    以及之前中断时留下的临时文件。
+    同时进行的复制任务不超过 workers 的 4 倍，内存占用与文件数量无关。
+    """
+    start = time.perf_counter()
+    os.makedirs(dest_root, exist_ok=True)
+    db = sqlite3.connect(os.path.join(dest_root, MANIFEST_NAME))
+    db.executescript(SCHEMA)
+    stats = {"source": source_root, "dest": dest_root, "files": 0, "copied": 0, "unchanged": 0,
+             "touched": 0, "deleted": 0, "partials": 0, "bytes": 0, "seconds": 0.0, "errors": []}
+    try:
+        manifest = {path: (size, mtime_ns, digest)
+                    for path, size, mtime_ns, digest in db.execute("SELECT path, size, mtime_ns, hash FROM files")}
+        files = scan_tree(source_root, workers)
+        stats["files"] = len(files)
+
+        def sync(relative):
+            # 返回 (相对路径, 动作, 哈希, 错误)
+            size, mtime_ns = files[relative]
+            source = os.path.join(source_root, *relative.split('/'))
+            target = os.path.join(dest_root, *relative.split('/'))
+            try:
+                known = manifest.get(relative)
+                if known and known[:2] == (size, mtime_ns):
+                    # 清单一致时还要确认镜像文件仍在且没有被改动，否则重新复制
+                    try:
+                        stat = os.stat(target)
+                        if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                            return relative, "unchanged", None, None
+                    except FileNotFoundError:
+                        pass
+                if use_hash and known and known[0] == size and known[2]:
+                    # 只有修改时间变化：内容相同时只更新镜像文件的修改时间
+                    digest = file_digest(source)
+                    if digest == known[2]:
+                        try:
+                            os.utime(target, ns=(mtime_ns, mtime_ns))
+                            return relative, "touched", digest, None
+                        except FileNotFoundError:
+                            pass  # 镜像文件已被删除，重新复制
+                return relative, "copied", mirror_file(source, target, use_hash), None
+            except Exception as e:
+                return relative, None, None, str(e)
+
+        pending = set()
+        done = 0
+
+        def collect(futures):
+            nonlocal done
+            for future in futures:
+                relative, action, digest, error = future.result()
+                if error:
+                    stats["errors"].append(f"{relative}: {error}")
+                    continue
+                if action == "unchanged":
+                    stats["unchanged"] += 1
+                    continue
+                size, mtime_ns = files[relative]
+                db.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                           (relative, size, mtime_ns, digest))
+                stats[action] += 1
+                if action == "copied":
+                    stats["bytes"] += size
+                done += 1
+                if done % COMMIT_EVERY == 0:
+                    db.commit()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for relative in files:
+                if len(pending) >= workers * 4:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending.add(executor.submit(sync, relative))
+            collect(wait(pending)[0])
+        db.commit()
+
+        if delete:
+            for relative in manifest.keys() - files.keys():
+                try:
+                    os.remove(os.path.join(dest_root, *relative.split('/')))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    stats["errors"].append(f"{relative}: {e}")
+                    continue
+                db.execute("DELETE FROM files WHERE path = ?", (relative,))
+                stats["deleted"] += 1
+            db.commit()
+            stats["partials"], errors = remove_partials(dest_root)
+            stats["errors"].extend(errors)
+    finally:
+        db.close()
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
@@ -0,0 +1,169 @@
+"""归档空间报告：统计各归档目录按日、按月、按年的大小和文件数，以及最大的日期文件夹和顶层文件夹
+
+每个目录缓存自身文件的大小、文件数和子目录列表，以目录的修改时间为键。再次统计时每个目录只 stat 一次，
+修改时间没变的目录不再列目录，直接使用缓存。在目录中新增、删除、重命名文件都会改变目录的修改时间；
+原地改写文件内容（大小变化）不会，这类变化要等目录有其他改动时才会反映出来。
+"""
+import heapq
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from archiveIndex import is_date_folder
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    children TEXT NOT NULL
+);
+"""
+
+
+class DirectoryWalker:
+    """按目录修改时间缓存的目录大小统计"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._db = sqlite3.connect(cache_path)
+        self._db.executescript(SCHEMA)
+        # 路径 -> (mtime, 自身文件大小, 自身文件数, 子目录列表)
+        self._cache = {path: (mtime, size, files, json.loads(children))
+                       for path, mtime, size, files, children in self._db.execute("SELECT * FROM dirs")}
+        self._updated = {}
+        self._visited = set()
+        self.listed = 0  # 本次实际列出的目录数
+
+    def walk(self, root):
+        """统计 root 下的所有目录，返回 {目录: (子树大小, 子树文件数)}，在线程中调用"""
+        totals = {}
+        updated = {}
+        listed = 0
+
+        def visit(directory):
+            nonlocal listed
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                return 0, 0
+            cached = self._cache.get(directory)
+            if cached and cached[0] == mtime:
+                _, size, files, children = cached
+            else:
+                size = files = 0
+                children = []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                children.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                size += entry.stat(follow_symlinks=False).st_size
+                                files += 1
+                except OSError:
+                    return 0, 0
+                updated[directory] = (mtime, size, files, children)
+                listed += 1
+            for child in children:
+                child_size, child_files = visit(child)
+                size += child_size
+                files += child_files
+            totals[directory] = (size, files)
+            return size, files
+
+        visit(root)
+        return totals, updated, listed
+
+    def merge(self, totals, updated, listed):
+        """合并线程的结果（在主线程中调用）"""
+        self._visited.update(totals)
+        self._updated.update(updated)
+        self.listed += listed
+
+    def save(self, roots):
+        """把本次重新列出的目录写入缓存，并删除 roots 下本次没有访问到（已经不存在）的目录"""
+        prefixes = tuple(os.path.join(root, '') for root in roots)
+        gone = [(path,) for path in self._cache
+                if path.startswith(prefixes) and path not in self._visited]
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO dirs (path, mtime, size, files, children) VALUES (?, ?, ?, ?, ?)",
+                [(path, mtime, size, files, json.dumps(children, ensure_ascii=False))
+                 for path, (mtime, size, files, children) in self._updated.items()])
+            self._db.executemany("DELETE FROM dirs WHERE path = ?", gone)
+
+    def close(self):
+        self._db.close()
+
+
+def storage_report(archive_configs, cache_path, workers=8, top=20):
+    """统计各归档目录的空间占用，返回报告字典
+
+    每个日期文件夹（以及归档目录下的其他文件夹）是线程池中的一个任务。
+    top 为列出的最大文件夹数，只比较归档目录下的顶层文件夹，不包括其中的子文件夹。
+    """
+    if top < 1:
+        raise ValueError("列出的最大文件夹数至少为 1")
+    walker = DirectoryWalker(cache_path)
+    try:
+        tasks = []
+        configs = []
+        roots = []
+        for config in archive_configs:
+            archive_dir = os.path.abspath(config["archive_dir"])
+            report = {"display_name": config["display_name"], "archive_dir": archive_dir,
+                      "size": 0, "files": 0, "days": {}, "months": {}, "years": {}, "other": {"size": 0, "files": 0}}
+            configs.append(report)
+            try:
+                with os.scandir(archive_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            tasks.append((report, entry.path, entry.name))
+                        elif entry.is_file(follow_symlinks=False):
+                            report["other"]["size"] += entry.stat(follow_symlinks=False).st_size
+                            report["other"]["files"] += 1
+            except OSError as e:
+                report["error"] = str(e)
+                continue
+            roots.append(archive_dir)
+
+        largest = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (report, path, name), (totals, updated, listed) in zip(
+                    tasks, executor.map(lambda task: walker.walk(task[1]), tasks)):
+                walker.merge(totals, updated, listed)
+                size, files = totals.get(path, (0, 0))
+                if is_date_folder(name):
+                    for key, bucket in (("days", name), ("months", name[:7]), ("years", name[:4])):
+                        summary = report[key].setdefault(bucket, {"size": 0, "files": 0})
+                        summary["size"] += size
+                        summary["files"] += files
+                else:
+                    report["other"]["size"] += size
+                    report["other"]["files"] += files
+                # 只保留最大的 top 个文件夹
+                item = (size, files, path)
+                if len(largest) < top:
+                    heapq.heappush(largest, item)
+                elif item > largest[0]:
+                    heapq.heapreplace(largest, item)
+
+        for report in configs:
+            for key in ("days", "months", "years"):
+                report[key] = dict(sorted(report[key].items()))
+            report["size"] = sum(day["size"] for day in report["days"].values()) + report["other"]["size"]
+            report["files"] = sum(day["files"] for day in report["days"].values()) + report["other"]["files"]
+        walker.save(roots)
+        return {
+            "configs": configs,
+            "size": sum(report["size"] for report in configs),
+            "files": sum(report["files"] for report in configs),
+            "largest": [{"path": path, "size": size, "files": files}
+                        for size, files, path in sorted(largest, reverse=True)],
+            "listed_dirs": walker.listed,
+        }
+    finally:
+        walker.close()
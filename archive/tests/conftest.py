@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模块之间按文件名直接导入（from archiveIndex import ...），测试时把 archive 目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import archive
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """把用户目录指向临时目录，桌面为其中的 Desktop 文件夹"""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path / "home"))
+    desktop = tmp_path / "home" / "Desktop"
+    desktop.mkdir(parents=True)
+    return desktop
+
+
+def make_configs(root):
+    return [
+        {"archive_dir": str(root / "民宿项目记录"), "shortcut_prefix": "民宿项目", "display_name": "民宿项目记录"},
+        {"archive_dir": str(root / "民宿财务记录"), "shortcut_prefix": "民宿财务", "display_name": "民宿财务记录"},
+    ]
+
+
+def test_select_configs_by_display_name_or_prefix(tmp_path):
+    configs = make_configs(tmp_path)
+    assert archive.select_configs(configs, None) == configs
+    assert archive.select_configs(configs, ["民宿财务", "民宿财务记录"]) == [configs[1]]
+    with pytest.raises(ValueError):
+        archive.select_configs(configs, ["不存在"])
+
+
+def test_run_batch_creates_folders_and_reports_failures(tmp_path, home):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("不是文件夹")
+    configs = make_configs(tmp_path) + [
+        {"archive_dir": str(blocker / "子目录"), "shortcut_prefix": "坏", "display_name": "无法创建"}]
+
+    summary = archive.run_batch(configs, today_str="2024-06-01")
+
+    assert (summary["total"], summary["failed"]) == (3, 1)
+    good, _, bad = summary["results"]
+    assert good["folder_created"] and good["shortcut_created"]
+    assert (tmp_path / "民宿项目记录" / "2024-06-01").is_dir()
+    assert (home / archive.get_shortcut_name("民宿项目", "2024-06-01")).exists()
+    assert bad["error"] and not (home / archive.get_shortcut_name("坏", "2024-06-01")).exists()
+
+    # 再次运行时文件夹和快捷方式都已存在
+    again = archive.run_batch(configs[:2], today_str="2024-06-01")
+    assert not any(result["folder_created"] or result["shortcut_created"] for result in again["results"])
+
+
+def test_main_batch_prints_json_summary(tmp_path, home, capsys):
+    config_path = tmp_path / "archive_config.json"
+    config_path.write_text(json.dumps(make_configs(tmp_path), ensure_ascii=False), encoding="utf-8")
+
+    assert archive.main(["--batch", "--config", str(config_path), "--only", "民宿财务"]) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert [result["display_name"] for result in summary["results"]] == ["民宿财务记录"]
+
+
+def test_scan_desktop_splits_prefix_and_date(home):
+    ext = archive.SHORTCUT_EXT
+    for name in (f"民宿 项目 2024-05-31{ext}", f"民宿财务 2024-05-30{ext}", "笔记.txt"):
+        (home / name).write_text("")
+    index = archive.scan_desktop(str(home))
+    assert index == {"民宿 项目": {"2024-05-31": str(home / f"民宿 项目 2024-05-31{ext}")},
+                     "民宿财务": {"2024-05-30": str(home / f"民宿财务 2024-05-30{ext}")}}
+    assert archive.scan_desktop(str(home / "missing")) == {}
+
+
+def test_reconcile_desktop_creates_today_and_removes_old(tmp_path, home):
+    ext = archive.SHORTCUT_EXT
+    configs = make_configs(tmp_path)
+    old = [home / f"民宿项目 2024-05-30{ext}", home / f"民宿项目 2024-05-31{ext}"]
+    unrelated = home / f"其他 2024-05-30{ext}"
+    for path in old + [unrelated]:
+        path.write_text("")
+    (home / f"民宿财务 2024-06-01{ext}").write_text("")
+
+    report = archive.reconcile_desktop(configs, "2024-06-01", str(home))
+
+    assert report["民宿项目"]["created"] == str(home / f"民宿项目 2024-06-01{ext}")
+    assert sorted(report["民宿项目"]["deleted"]) == sorted(str(path) for path in old)
+    assert report["民宿财务"] == {"created": None, "deleted": [], "error": None}
+    assert unrelated.exists() and not any(path.exists() for path in old)
+
+    # 桌面已经整理好时不再改动
+    report = archive.reconcile_desktop(configs, "2024-06-01", str(home))
+    assert all(item == {"created": None, "deleted": [], "error": None} for item in report.values())
+
+
+def test_plan_shortcuts_handles_shared_prefix_once(tmp_path):
+    configs = make_configs(tmp_path)
+    configs.append(dict(configs[0], display_name="重复前缀"))
+    creations, deletions = archive.plan_shortcuts(configs, "2024-06-01", "/desktop", {})
+    assert [prefix for prefix, _ in creations] == ["民宿项目", "民宿财务"]
+    assert deletions == []
@@ -0,0 +1,104 @@
+import datetime
+import os
+import zipfile
+
+import archiveBundle
+from archiveBundle import bundle_paths, extract_file, load_manifest, pack_aged_folders, pack_folder
+
+TODAY = datetime.date(2024, 6, 1)
+
+
+def make_folder(archive_dir, date_str):
+    folder = archive_dir / date_str
+    (folder / "sub").mkdir(parents=True)
+    (folder / "empty").mkdir()
+    (folder / "invoice.txt").write_text("发票 1200", encoding="utf-8")
+    (folder / "sub" / "photo.jpg").write_bytes(os.urandom(100_000))
+    os.utime(folder / "invoice.txt", (1_000_000_000, 1_000_000_000))
+    return folder
+
+
+def test_pack_verify_and_extract_round_trip(tmp_path):
+    archive_dir = tmp_path / "archive"
+    folder = make_folder(archive_dir, "2024-01-01")
+    photo = (folder / "sub" / "photo.jpg").read_bytes()
+    make_folder(archive_dir, "2024-05-30")  # 未超过保留天数
+
+    results = pack_aged_folders([str(archive_dir)], 30, today=TODAY, workers=1)
+
+    assert [result["folder"] for result in results] == [str(folder)]
+    assert results[0]["error"] is None and results[0]["removed"]
+    assert not folder.exists() and (archive_dir / "2024-05-30").exists()
+    bundle_path, manifest_path = bundle_paths(str(archive_dir), "2024-01-01")
+    with zipfile.ZipFile(bundle_path) as bundle:
+        assert bundle.testzip() is None
+        assert "empty/" in bundle.namelist()
+    manifest = load_manifest(manifest_path)
+    assert sorted(entry["name"] for entry in manifest["files"]) == ["invoice.txt", "sub/photo.jpg"]
+
+    target = extract_file(str(archive_dir), "2024-01-01/sub/photo.jpg", str(tmp_path / "out"))
+    assert open(target, "rb").read() == photo
+    target = extract_file(str(archive_dir), "2024-01-01/invoice.txt", str(tmp_path / "out"))
+    assert open(target, encoding="utf-8").read() == "发票 1200"
+    assert os.stat(target).st_mtime == 1_000_000_000
+    assert not os.path.exists(tmp_path / "out" / "empty")
+
+
+def test_extract_missing_member(tmp_path):
+    archive_dir = tmp_path / "archive"
+    make_folder(archive_dir, "2024-01-01")
+    pack_folder(str(archive_dir / "2024-01-01"), str(archive_dir))
+    try:
+        extract_file(str(archive_dir), "2024-01-01/nope.txt", str(tmp_path))
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError("expected FileNotFoundError")
+
+
+def test_folder_changed_while_packing_is_kept_and_repacked_later(tmp_path, monkeypatch):
+    archive_dir = tmp_path / "archive"
+    folder = make_folder(archive_dir, "2024-01-01")
+    bundle_path, manifest_path = bundle_paths(str(archive_dir), "2024-01-01")
+    testzip = zipfile.ZipFile.testzip
+
+    def testzip_and_add_file(self):
+        # 模拟打包期间有新文件放入文件夹
+        (folder / "late.txt").write_text("late")
+        return testzip(self)
+
+    monkeypatch.setattr(zipfile.ZipFile, "testzip", testzip_and_add_file)
+    result = pack_folder(str(folder), str(archive_dir))
+    monkeypatch.undo()
+
+    assert result["error"] and not result["removed"]
+    assert folder.exists()
+    assert not os.path.exists(bundle_path) and not os.path.exists(manifest_path)
+    assert not os.path.exists(bundle_path + ".partial")
+
+    result = pack_folder(str(folder), str(archive_dir))
+    assert result["error"] is None and result["removed"]
+    names = [entry["name"] for entry in load_manifest(manifest_path)["files"]]
+    assert "late.txt" in names
+
+
+def test_existing_bundle_is_rebuilt_while_folder_remains(tmp_path):
+    archive_dir = tmp_path / "archive"
+    folder = make_folder(archive_dir, "2024-01-01")
+    assert pack_folder(str(folder), str(archive_dir), remove=False)["error"] is None
+    (folder / "new.txt").write_text("new")
+
+    result = pack_folder(str(folder), str(archive_dir))
+
+    assert result["error"] is None and result["removed"]
+    target = extract_file(str(archive_dir), "2024-01-01/new.txt", str(tmp_path / "out"))
+    assert open(target).read() == "new"
+
+
+def test_dry_run_lists_folders_only(tmp_path):
+    archive_dir = tmp_path / "archive"
+    folder = make_folder(archive_dir, "2024-01-01")
+    results = pack_aged_folders([str(archive_dir)], 30, today=TODAY, dry_run=True)
+    assert results == [{"folder": str(folder), "bundle": bundle_paths(str(archive_dir), "2024-01-01")[0]}]
+    assert folder.exists()
+    assert archiveBundle.BUNDLE_DIR not in os.listdir(archive_dir)
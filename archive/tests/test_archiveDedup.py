@@ -0,0 +1,73 @@
+import os
+
+import archiveDedup
+from archiveDedup import deduplicate
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_identical_files_are_hardlinked(tmp_path):
+    archive_dir = tmp_path / "archive"
+    data = os.urandom(200 * 1024)
+    first = write(archive_dir / "2024-01-01" / "invoice.pdf", data)
+    second = write(archive_dir / "2024-01-02" / "sub" / "invoice copy.pdf", data)
+    other = write(archive_dir / "2024-01-02" / "other.pdf", data[:-1] + b"x")
+
+    stats = deduplicate([str(archive_dir)], str(tmp_path / "hashes.db"))
+
+    assert stats["duplicates"] == 1 and stats["linked"] == 1
+    assert stats["reclaimed"] == len(data)
+    assert os.path.samefile(first, second)
+    assert not os.path.samefile(first, other)
+    assert second.read_bytes() == data
+
+
+def test_dry_run_only_records(tmp_path):
+    archive_dir = tmp_path / "archive"
+    first = write(archive_dir / "2024-01-01" / "a.txt", b"same content")
+    second = write(archive_dir / "2024-01-02" / "b.txt", b"same content")
+
+    stats = deduplicate([str(archive_dir)], str(tmp_path / "hashes.db"), dry_run=True)
+
+    assert stats["duplicates"] == 1 and stats["linked"] == 0
+    assert stats["reclaimable"] == len(b"same content")
+    assert not os.path.samefile(first, second)
+
+
+def test_links_when_scan_stats_have_no_inode(tmp_path, monkeypatch):
+    # Windows 上 DirEntry.stat() 的 st_ino 和 st_dev 总是 0
+    archive_dir = tmp_path / "archive"
+    first = write(archive_dir / "2024-01-01" / "a.bin", b"x" * 5000)
+    second = write(archive_dir / "2024-01-02" / "b.bin", b"x" * 5000)
+    scan_files = archiveDedup.scan_files
+
+    def scan_without_inodes(archive_dirs, workers=8):
+        files = []
+        for path, stat in scan_files(archive_dirs, workers):
+            values = list(stat)
+            values[1] = values[2] = 0  # st_ino, st_dev
+            files.append((path, os.stat_result(values)))
+        return files
+
+    monkeypatch.setattr(archiveDedup, "scan_files", scan_without_inodes)
+    stats = deduplicate([str(archive_dir)], str(tmp_path / "hashes.db"))
+
+    assert stats["linked"] == 1
+    assert os.path.samefile(first, second)
+
+
+def test_second_run_uses_hash_cache(tmp_path):
+    archive_dir = tmp_path / "archive"
+    write(archive_dir / "2024-01-01" / "a.bin", b"a" * 100_000)
+    write(archive_dir / "2024-01-02" / "b.bin", b"a" * 99_999 + b"b")
+    cache = str(tmp_path / "hashes.db")
+
+    first = deduplicate([str(archive_dir)], cache)
+    second = deduplicate([str(archive_dir)], cache)
+
+    assert first["hashed"] == 2 and first["duplicates"] == 0
+    assert second["hashed"] == 0 and second["cached"] == 2
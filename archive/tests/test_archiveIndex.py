@@ -0,0 +1,61 @@
+import os
+
+import archiveIndex
+from archiveIndex import ArchiveIndex
+
+
+def make_archive(root):
+    (root / "2024-03-05").mkdir(parents=True)
+    (root / "2024-03-05" / "合同.txt").write_text("民宿装修合同 总价 12000 元", encoding="utf-8")
+    (root / "2024-04-01" / "票据").mkdir(parents=True)
+    (root / "2024-04-01" / "票据" / "发票.txt").write_text("增值税发票 金额 300", encoding="utf-8")
+    (root / "其他").mkdir()
+    return root
+
+
+def search_names(index, text, **kwargs):
+    return sorted(os.path.basename(result["path"]) for result in index.search(text, **kwargs))
+
+
+def test_update_and_search(tmp_path):
+    archive = make_archive(tmp_path / "archive")
+    index = ArchiveIndex(str(tmp_path / "index.db"))
+    stats = index.update([str(archive)])
+    assert (stats["folders"], stats["scanned"], stats["files"]) == (2, 2, 2)
+
+    assert search_names(index, "装修合同") == ["合同.txt"]
+    assert search_names(index, "发票") == ["发票.txt"]
+    assert search_names(index, "金额 300", since="2024-04-01") == ["发票.txt"]
+    assert search_names(index, "合同", until="2024-03-31") == ["合同.txt"]
+
+    assert index.update([str(archive)])["skipped"] == 2
+    index.close()
+
+
+def test_search_without_trigram_support(tmp_path, monkeypatch):
+    archive = make_archive(tmp_path / "archive")
+    monkeypatch.setattr(archiveIndex, "trigram_supported", lambda: False)
+    index = ArchiveIndex(str(tmp_path / "index.db"))
+    assert not index.fts
+    index.update([str(archive)])
+    assert search_names(index, "装修合同") == ["合同.txt"]
+    assert search_names(index, "增值税 300") == ["发票.txt"]
+    index.close()
+
+    # 换用支持 trigram 的 SQLite 后重建全文索引
+    monkeypatch.undo()
+    index = ArchiveIndex(str(tmp_path / "index.db"))
+    assert index.fts
+    assert search_names(index, "装修合同") == ["合同.txt"]
+    index.close()
+
+
+def test_removed_folders_leave_the_index(tmp_path):
+    archive = make_archive(tmp_path / "archive")
+    index = ArchiveIndex(str(tmp_path / "index.db"))
+    index.update([str(archive)])
+    (archive / "2024-03-05" / "合同.txt").unlink()
+    (archive / "2024-03-05").rmdir()
+    assert index.update([str(archive)])["removed"] == 1
+    assert search_names(index, "装修合同") == []
+    index.close()
@@ -0,0 +1,134 @@
+import errno
+import os
+
+import pytest
+
+import archiveIngest
+from archiveIngest import NameAllocator, copy_data, copy_file, ingest
+
+
+def test_collisions_get_explorer_style_names(tmp_path):
+    dest = tmp_path / "2024-06-01"
+    dest.mkdir()
+    (dest / "photo.jpg").write_bytes(b"old")
+    (dest / "DCIM").mkdir()
+    source = tmp_path / "src"
+    (source / "DCIM" / "100").mkdir(parents=True)
+    (source / "DCIM" / "100" / "IMG_1.jpg").write_bytes(b"img")
+    (source / "photo.jpg").write_bytes(b"new")
+
+    stats = ingest([str(source / "photo.jpg"), str(source / "photo.jpg"), str(source / "DCIM")], str(dest))
+
+    assert stats["copied"] == 3 and not stats["errors"]
+    assert (dest / "photo.jpg").read_bytes() == b"old"
+    assert (dest / "photo (1).jpg").read_bytes() == b"new"
+    assert (dest / "photo (2).jpg").read_bytes() == b"new"
+    assert (dest / "DCIM (1)" / "100" / "IMG_1.jpg").read_bytes() == b"img"
+    assert len(stats["renamed"]) == 3
+
+
+def test_name_allocator_numbers_after_existing_names():
+    names = NameAllocator(["a.txt", "a (1).txt"])
+    assert names.allocate("a.txt") == "a (2).txt"
+    assert names.allocate("b.txt") == "b.txt"
+    assert names.allocate("b.txt") == "b (1).txt"
+
+
+def test_copy_preserves_content_and_mtime(tmp_path):
+    source = tmp_path / "big.bin"
+    data = os.urandom(3 * 1024 * 1024 + 7)
+    source.write_bytes(data)
+    os.utime(source, (1_000_000_000, 1_000_000_000))
+    target = tmp_path / "out" / "big.bin"
+
+    copy_file(str(source), str(target))
+
+    assert target.read_bytes() == data
+    assert os.stat(target).st_mtime == 1_000_000_000
+
+
+def test_failed_copy_leaves_no_partial_target(tmp_path, monkeypatch):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(os.urandom(1000))
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    def failing_copy(source_fd, target_fd, size):
+        os.write(target_fd, b"x" * 100)
+        raise OSError(errno.EIO, "I/O error")
+
+    monkeypatch.setattr(archiveIngest, "copy_data", failing_copy)
+    stats = ingest([str(source)], str(dest))
+    assert stats["copied"] == 0 and len(stats["errors"]) == 1
+    assert os.listdir(dest) == []
+
+    monkeypatch.undo()
+    stats = ingest([str(source)], str(dest))
+    assert stats["copied"] == 1 and not stats["renamed"]
+    assert (dest / "photo.jpg").read_bytes() == source.read_bytes()
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="需要 copy_file_range")
+def test_short_copy_is_an_error(tmp_path, monkeypatch):
+    source = tmp_path / "a.bin"
+    source.write_bytes(b"a" * 1000)
+    calls = []
+
+    def short_copy_file_range(source_fd, target_fd, count):
+        calls.append(count)
+        if len(calls) > 1:
+            return 0
+        os.write(target_fd, os.read(source_fd, 10))
+        return 10
+
+    monkeypatch.setattr(os, "copy_file_range", short_copy_file_range)
+    with pytest.raises(OSError):
+        copy_file(str(source), str(tmp_path / "b.bin"), verify=False)
+    assert not (tmp_path / "b.bin").exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="需要 copy_file_range")
+def test_zero_copy_returning_nothing_falls_back(tmp_path, monkeypatch):
+    source = tmp_path / "a.bin"
+    source.write_bytes(b"abc" * 1000)
+    monkeypatch.setattr(os, "copy_file_range", lambda source_fd, target_fd, count: 0)
+    with open(source, "rb") as f, open(tmp_path / "b.bin", "wb") as out:
+        method = copy_data(f.fileno(), out.fileno(), 3000)
+    assert method != "copy_file_range"
+    assert (tmp_path / "b.bin").read_bytes() == b"abc" * 1000
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="需要符号链接")
+def test_links_inside_folders_are_skipped(tmp_path):
+    source = tmp_path / "src" / "photos"
+    (source / "2024").mkdir(parents=True)
+    (source / "2024" / "a.jpg").write_bytes(b"a")
+    outside = tmp_path / "outside.jpg"
+    outside.write_bytes(b"outside")
+    try:
+        # 指向上级文件夹的链接形成环，跟随时会无限遍历
+        os.symlink(source, source / "2024" / "loop", target_is_directory=True)
+        os.symlink(outside, source / "link.jpg")
+    except OSError as e:
+        pytest.skip(f"无法创建符号链接: {e}")
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    stats = ingest([str(source), str(source / "link.jpg")], str(dest))
+    assert stats["copied"] == 2 and not stats["errors"]
+    assert (dest / "photos" / "2024" / "a.jpg").read_bytes() == b"a"
+    # 直接指定的链接按指向的文件导入
+    assert (dest / "link.jpg").read_bytes() == b"outside"
+    assert sorted(stats["skipped"]) == [str(source / "2024" / "loop"), str(source / "link.jpg")]
+
+
+def test_missing_source_is_an_error_and_the_rest_continues(tmp_path):
+    source = tmp_path / "photo.jpg"
+    source.write_bytes(b"photo")
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    stats = ingest([str(tmp_path / "missing.jpg"), str(source)], str(dest))
+    assert stats["copied"] == 1 and stats["files"] == 1
+    assert len(stats["errors"]) == 1 and "missing.jpg" in stats["errors"][0]
+    assert os.listdir(dest) == ["photo.jpg"]
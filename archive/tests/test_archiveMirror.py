@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import archiveMirror
+from archiveMirror import PARTIAL_SUFFIX, mirror_tree
+
+
+def make_source(root, count=10):
+    for i in range(count):
+        folder = root / f"2024-03-{i % 3 + 1:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"file{i}.txt").write_text(f"内容 {i}", encoding="utf-8")
+    return root
+
+
+def mirrored(root):
+    return {os.path.relpath(os.path.join(directory, name), root): open(os.path.join(directory, name), "rb").read()
+            for directory, _, names in os.walk(root) for name in names
+            if name != archiveMirror.MANIFEST_NAME}
+
+
+def test_mirror_copies_only_changes(tmp_path):
+    source = make_source(tmp_path / "source")
+    dest = tmp_path / "dest"
+    assert mirror_tree(str(source), str(dest))["copied"] == 10
+    assert mirrored(dest) == mirrored(source)
+
+    (source / "2024-03-01" / "file0.txt").write_text("改过", encoding="utf-8")
+    stats = mirror_tree(str(source), str(dest))
+    assert (stats["copied"], stats["unchanged"]) == (1, 9)
+    assert mirrored(dest) == mirrored(source)
+
+
+def test_interrupted_mirror_resumes(tmp_path, monkeypatch):
+    source = make_source(tmp_path / "source")
+    dest = tmp_path / "dest"
+    monkeypatch.setattr(archiveMirror, "COMMIT_EVERY", 2)
+    real_mirror_file = archiveMirror.mirror_file
+    calls = []
+
+    def interrupted(source, target, use_hash=False):
+        calls.append(target)
+        if len(calls) == 6:
+            raise KeyboardInterrupt
+        return real_mirror_file(source, target, use_hash)
+
+    monkeypatch.setattr(archiveMirror, "mirror_file", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        mirror_tree(str(source), str(dest), workers=1)
+    monkeypatch.undo()
+    # 中断时正在复制、之后又从源目录删除的文件留下的临时文件
+    (dest / "2024-03-01" / ("gone.txt" + PARTIAL_SUFFIX)).write_bytes(b"partial")
+
+    stats = mirror_tree(str(source), str(dest), delete=True)
+    # 中断前至少提交过一批，这些文件不再复制
+    assert stats["unchanged"] >= 2 and stats["unchanged"] + stats["copied"] == 10
+    assert stats["partials"] == 1
+    assert mirrored(dest) == mirrored(source)
+
+
+def test_hash_mode_recopies_missing_target(tmp_path):
+    source = make_source(tmp_path / "source", count=1)
+    dest = tmp_path / "dest"
+    mirror_tree(str(source), str(dest), use_hash=True)
+    os.utime(source / "2024-03-01" / "file0.txt", (1_000_000_000, 1_000_000_000))
+    stats = mirror_tree(str(source), str(dest), use_hash=True)
+    assert stats["touched"] == 1
+
+    (dest / "2024-03-01" / "file0.txt").unlink()
+    os.utime(source / "2024-03-01" / "file0.txt", (1_100_000_000, 1_100_000_000))
+    stats = mirror_tree(str(source), str(dest), use_hash=True)
+    assert (stats["copied"], stats["errors"]) == (1, [])
+    assert mirrored(dest) == mirrored(source)
+
+
+def test_failed_copy_leaves_no_partial(tmp_path, monkeypatch):
+    source = make_source(tmp_path / "source", count=3)
+    dest = tmp_path / "dest"
+
+    def broken_copy(source_fd, target_fd, size):
+        os.write(target_fd, b"half")
+        raise OSError("设备已拔出")
+
+    monkeypatch.setattr(archiveMirror, "copy_data", broken_copy)
+    stats = mirror_tree(str(source), str(dest))
+    assert stats["copied"] == 0 and len(stats["errors"]) == 3
+    assert mirrored(dest) == {}
+
+
+def test_recopies_missing_or_changed_target(tmp_path):
+    source = make_source(tmp_path / "source", count=3)
+    dest = tmp_path / "dest"
+    mirror_tree(str(source), str(dest))
+    (dest / "2024-03-01" / "file0.txt").unlink()
+    (dest / "2024-03-02" / "file1.txt").write_text("被改动", encoding="utf-8")
+
+    stats = mirror_tree(str(source), str(dest))
+    assert (stats["copied"], stats["unchanged"], stats["errors"]) == (2, 1, [])
+    assert mirrored(dest) == mirrored(source)
@@ -0,0 +1,46 @@
+import pytest
+
+from archiveReport import storage_report
+
+
+def make_archive(root):
+    for name, sizes in (("2024-03-05", [100, 200]), ("2024-03-20", [50]), ("2024-04-01", [400])):
+        (root / name).mkdir(parents=True)
+        for i, size in enumerate(sizes):
+            (root / name / f"f{i}.bin").write_bytes(b"x" * size)
+    (root / "其他" / "子文件夹").mkdir(parents=True)
+    (root / "其他" / "子文件夹" / "big.bin").write_bytes(b"x" * 1000)
+    (root / "readme.txt").write_bytes(b"x" * 10)
+    return root
+
+
+def test_report_groups_by_day_month_year(tmp_path):
+    archive = make_archive(tmp_path / "archive")
+    config = {"display_name": "测试", "archive_dir": str(archive)}
+    report = storage_report([config], str(tmp_path / "report.db"), top=2)
+
+    summary = report["configs"][0]
+    assert summary["days"]["2024-03-05"] == {"size": 300, "files": 2}
+    assert summary["months"] == {"2024-03": {"size": 350, "files": 3}, "2024-04": {"size": 400, "files": 1}}
+    assert summary["years"] == {"2024": {"size": 750, "files": 4}}
+    assert summary["other"] == {"size": 1010, "files": 2}
+    assert report["size"] == 1760
+
+    # 只列出顶层文件夹，子文件夹不单独出现
+    assert [item["path"] for item in report["largest"]] == [str(archive / "其他"), str(archive / "2024-04-01")]
+
+
+def test_report_uses_directory_cache(tmp_path):
+    archive = make_archive(tmp_path / "archive")
+    config = {"display_name": "测试", "archive_dir": str(archive)}
+    first = storage_report([config], str(tmp_path / "report.db"))
+    second = storage_report([config], str(tmp_path / "report.db"))
+    assert first["listed_dirs"] > 0 and second["listed_dirs"] == 0
+    assert second["size"] == first["size"]
+
+
+@pytest.mark.parametrize("top", [0, -1])
+def test_report_rejects_invalid_top(tmp_path, top):
+    config = {"display_name": "测试", "archive_dir": str(tmp_path)}
+    with pytest.raises(ValueError):
+        storage_report([config], str(tmp_path / "report.db"), top=top)
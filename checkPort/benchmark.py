@@ -0,0 +1,342 @@
+"""端口扫描性能测试：用合成的连接表分别测量各阶段的耗时、吞吐量和内存峰值
+
+连接表与 psutil.net_connections 的返回值结构相同，同时生成对应的 /proc/net/tcp 文件
+和 /proc/<pid>/fd 链接，用于测量内核连接表解析和套接字所属进程查找。结果以 JSON 输出：
+
+    python benchmark.py
+    python benchmark.py --sizes 1000,10000 --repeat 5 --output result.json
+    python benchmark.py --baseline result.json --threshold 1.2
+
+界面相关的阶段在隐藏的 Tk 窗口中执行，没有图形环境时使用模拟的 Treeview。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import psutil
+
+from portScan import (Address, Connection, ConnectionSnapshot, PortSet, ProcessCache, SocketOwnerIndex,
+                      find_socket_owners, read_proc_net, resolve_process_name)
+from portQuery import compile_query
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+# 常用端口查询（与界面初始化时的查询相同）加一段端口范围
+COMMON_PORTS = [80, 443, 8080, 8000, 3306, 5432, 6379, 27017, 22, 21, 25, 110, 143, 993, 995]
+BENCH_QUERY = "port:8000-9000,5432 state:ESTABLISHED,CLOSE_WAIT raddr:10.1.0.0/16"
+
+# 合成连接的状态分布
+STATE_WEIGHTS = {"LISTEN": 2, "ESTABLISHED": 80, "TIME_WAIT": 12, "CLOSE_WAIT": 6}
+PROC_STATE_CODES = {"ESTABLISHED": "01", "TIME_WAIT": "06", "CLOSE_WAIT": "08", "LISTEN": "0A"}
+
+
+def synthetic_connections(size, pids, seed=0):
+    """生成 size 条连接，本地端口集中在少数服务端口上，所属进程取自 pids"""
+    rng = random.Random(seed)
+    service_ports = rng.sample(range(1024, 10000), 200) + COMMON_PORTS
+    states = rng.choices(list(STATE_WEIGHTS), weights=list(STATE_WEIGHTS.values()), k=size)
+    connections = []
+    for fd, state in enumerate(states, 3):
+        if state == "LISTEN":
+            laddr = Address("0.0.0.0", rng.choice(service_ports))
+            raddr = ()
+        else:
+            port = rng.choice(service_ports) if rng.random() < 0.7 else rng.randint(32768, 60999)
+            laddr = Address(f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 254)}", port)
+            raddr = Address(f"10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                            rng.randint(1024, 65535))
+        pid = rng.choice(pids) if state != "TIME_WAIT" else None
+        connections.append(Connection(fd, socket.AF_INET, socket.SOCK_STREAM, laddr, raddr, state, pid))
+    return connections
+
+
+def encode_proc_address(address):
+    """Address 转换为 /proc/net/tcp 中的格式（小端字节序的十六进制）"""
+    if not address:
+        return "00000000:0000"
+    return f"{socket.inet_aton(address.ip)[::-1].hex().upper()}:{address.port:04X}"
+
+
+def write_proc_tree(root, connections, owner_limit):
+    """在 root 下生成 net/tcp 和 <pid>/fd/<fd> 链接，前 owner_limit 条有所属进程的连接创建 fd 链接
+
+    返回所有套接字的 inode 集合。
+    """
+    os.makedirs(f"{root}/net")
+    inodes = set()
+    owned = 0
+    with open(f"{root}/net/tcp", "w") as f:
+        f.write("  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt"
+                "   uid  timeout inode\n")
+        for index, conn in enumerate(connections):
+            inode = 100000 + index
+            inodes.add(inode)
+            f.write(f"{index:4d}: {encode_proc_address(conn.laddr)} {encode_proc_address(conn.raddr)} "
+                    f"{PROC_STATE_CODES[conn.status]} 00000000:00000000 00:00000000 00000000  1000        0 "
+                    f"{inode} 1 0000000000000000 100 0 0 10 0\n")
+            if conn.pid is not None and owned < owner_limit:
+                fd_dir = f"{root}/{conn.pid}/fd"
+                if not os.path.isdir(fd_dir):
+                    os.makedirs(fd_dir)
+                os.symlink(f"socket:[{inode}]", f"{fd_dir}/{conn.fd}")
+                owned += 1
+    return inodes
+
+
+class StubTreeview:
+    """没有图形环境时代替 ttk.Treeview，只实现列表增量更新用到的方法"""
+
+    def __init__(self):
+        self._items = {}
+        self._children = []
+
+    def get_children(self, item=""):
+        return tuple(self._children)
+
+    def insert(self, parent, index, iid, values=(), tags=()):
+        self._items[iid] = (values, tags)
+        if index == "end":
+            self._children.append(iid)
+        else:
+            self._children.insert(index, iid)
+        return iid
+
+    def delete(self, *items):
+        removed = set(items)
+        for iid in removed:
+            del self._items[iid]
+        self._children = [iid for iid in self._children if iid not in removed]
+
+    def item(self, iid, values=(), tags=()):
+        self._items[iid] = (values, tags)
+
+    def index(self, iid):
+        return self._children.index(iid)
+
+    def yview(self):
+        return (0.0, 1.0)
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+def create_list_view():
+    """返回 (列表界面对象, 说明)；优先使用隐藏的 Tk 窗口，失败时使用模拟的 Treeview
+
+    列表界面对象只初始化列表更新用到的属性，不创建其他控件。
+    """
+    try:
+        from checkPort import PortCheckerGUI
+    except ImportError:
+        return None, "unavailable"
+
+    view = PortCheckerGUI.__new__(PortCheckerGUI)
+    view.displayed = {}
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+
+        root = tk.Tk()
+        root.withdraw()
+        view.port_tree = ttk.Treeview(root, columns=("port", "pid", "name", "status"), show="headings")
+        return view, "tk"
+    except Exception:
+        view.port_tree = StubTreeview()
+        return view, "stub"
+
+
+def measure(func, repeat, trace_memory=True):
+    """执行 func repeat 次，返回 (最短耗时, 内存峰值字节数, 最后一次的返回值)
+
+    内存峰值在单独的一次执行中用 tracemalloc 测量，不影响计时。
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return best, peak, result
+
+
+def run_size(size, pids, repeat, owner_limit, view, trace_memory=True):
+    """对一种连接表大小执行全部阶段，返回结果记录列表"""
+    records = []
+
+    def record(stage, seconds, peak, items):
+        records.append({
+            "size": size,
+            "stage": stage,
+            "seconds": round(seconds, 6),
+            "items": items,
+            "items_per_sec": round(items / seconds) if seconds > 0 else None,
+            "peak_kb": round(peak / 1024, 1) if peak is not None else None,
+        })
+
+    connections = synthetic_connections(size, pids)
+
+    # 枚举：解析 /proc/net/tcp（含套接字所属进程查找）和建立快照索引
+    root = tempfile.mkdtemp(prefix="checkport-bench-")
+    try:
+        inodes = write_proc_tree(root, connections, owner_limit)
+        seconds, peak, parsed = measure(lambda: read_proc_net("tcp", proc_root=root), repeat, trace_memory)
+        record("parse_proc", seconds, peak, len(parsed))
+
+        seconds, peak, owners = measure(lambda: find_socket_owners(inodes, root), repeat, trace_memory)
+        record("owners_cold", seconds, peak, len(owners))
+
+        owner_index = SocketOwnerIndex(root)
+        owner_index.resolve(inodes)
+        seconds, peak, owners = measure(lambda: owner_index.resolve(inodes), repeat, trace_memory)
+        record("owners_indexed", seconds, peak, len(owners))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    seconds, peak, snapshot = measure(lambda: ConnectionSnapshot(connections), repeat, trace_memory)
+    record("snapshot", seconds, peak, len(snapshot))
+
+    # 筛选：search_all_ports、search_ports_by_list 和查询语言对应的查询
+    seconds, peak, all_rows = measure(lambda: snapshot.query(None, "ALL"), repeat, trace_memory)
+    record("query_all", seconds, peak, len(all_rows))
+
+    port_set = PortSet([(port, port) for port in COMMON_PORTS] + [(8000, 9000)])
+    seconds, peak, rows = measure(lambda: snapshot.query(port_set, "ALL"), repeat, trace_memory)
+    record("query_ports", seconds, peak, len(rows))
+
+    query = compile_query(BENCH_QUERY)
+    seconds, peak, rows = measure(lambda: query.filter(snapshot.query(query.ports, query.status)),
+                                  repeat, trace_memory)
+    record("query_language", seconds, peak, len(rows))
+
+    # 进程名解析：每次使用新的缓存（冷）和已填充的缓存（热）
+    distinct = list(dict.fromkeys(row.pid for row in all_rows))
+
+    def resolve_cold():
+        cache = ProcessCache()
+        return {pid: resolve_process_name(pid, cache) for pid in distinct}
+
+    seconds, peak, names = measure(resolve_cold, repeat, trace_memory)
+    record("resolve_cold", seconds, peak, len(distinct))
+
+    warm_cache = ProcessCache()
+    names = {pid: resolve_process_name(pid, warm_cache) for pid in distinct}
+    seconds, peak, _ = measure(lambda: {pid: resolve_process_name(pid, warm_cache) for pid in distinct},
+                               repeat, trace_memory)
+    record("resolve_warm", seconds, peak, len(distinct))
+
+    if view is None:
+        return records
+
+    # 列表：生成列表项，并按 show_items 的方式创建首屏（超过阈值时只创建一页）
+    seconds, peak, items = measure(lambda: view.build_items(all_rows, names, None), repeat, trace_memory)
+    record("build_items", seconds, peak, len(items))
+
+    count = len(items) if len(items) <= view.VIRTUAL_THRESHOLD else view.PAGE_SIZE
+    window = items[:count]
+
+    def populate():
+        view.port_tree.delete(*view.port_tree.get_children())
+        view.displayed = {}
+        view.sync_tree(window)
+
+    seconds, peak, _ = measure(populate, repeat, trace_memory)
+    record("tree_insert", seconds, peak, len(window))
+
+    # 内容未变化时的刷新（监视模式下的常见情况）
+    seconds, peak, _ = measure(lambda: view.sync_tree(window), repeat, trace_memory)
+    record("tree_refresh", seconds, peak, len(window))
+    return records
+
+
+def compare_results(results, baseline, threshold):
+    """与基准结果比较，返回耗时超过基准 threshold 倍的 (size, stage, 基准耗时, 当前耗时)"""
+    previous = {(item["size"], item["stage"]): item["seconds"] for item in baseline["results"]}
+    regressions = []
+    for item in results:
+        old = previous.get((item["size"], item["stage"]))
+        if old and item["seconds"] > old * threshold:
+            regressions.append((item["size"], item["stage"], old, item["seconds"]))
+    return regressions
+
+
+def build_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(prog="benchmark", description="端口扫描性能测试（合成连接表）")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="连接表大小，多个用逗号分隔，默认 1000,10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段执行的次数，取最短耗时，默认 3")
+    parser.add_argument("--owner-limit", type=int, default=100000,
+                        help="最多为多少条连接创建 fd 链接（所属进程查找），默认 100000")
+    parser.add_argument("--no-memory", action="store_true", help="不测量内存峰值")
+    parser.add_argument("--output", help="结果写入文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="与之前保存的结果比较，发现变慢的阶段时返回 1")
+    parser.add_argument("--threshold", type=float, default=1.2, help="判定变慢的耗时倍数，默认 1.2")
+    return parser
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        sizes = [int(size) for size in args.sizes.split(",")]
+    except ValueError:
+        parser.error("请输入有效的连接表大小（例如：1000,10000）")
+
+    # 连接的所属进程取自当前系统中的进程，使进程名解析走真实路径
+    pids = psutil.pids()[:50]
+    view, view_kind = create_list_view()
+    results = []
+    for size in sizes:
+        records = run_size(size, pids, max(1, args.repeat), args.owner_limit, view, not args.no_memory)
+        for item in records:
+            print(f"{item['size']:>8} {item['stage']:<15} {item['seconds'] * 1000:10.2f} ms",
+                  file=sys.stderr)
+        results.extend(records)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "psutil": psutil.__version__,
+        "tree": view_kind,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for size, stage, old, new in regressions:
+            print(f"变慢: {size} 条连接 {stage} {old * 1000:.2f} ms -> {new * 1000:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,91 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
 import tkinter as tk
 from tkinter import ttk, messagebox
-import psutil
+
+from portScan import (STATUS_OPTIONS, BackgroundScanner, KillResult, PortSet, ProcessCache, ProcessSampler,
+                      ScanTimings, SocketOwnerIndex, diff_snapshots, format_timings_log, group_rows,
+                      parse_port_input, peak_rss_kb, plan_list_update, proc_net_available, resolve_process_name,
+                      socket_key, sparkline, take_snapshot, terminate_processes, timed)
+from portProbe import PROBE_STATUS_CHINESE, iter_probe, parse_hosts
+from portHistory import HistoryStore, format_time, parse_time
+from portQuery import compile_query, is_query
+
+logger = logging.getLogger("checkPort")
 
 class PortCheckerGUI:
+    POLL_INTERVAL = 50  # 检查后台扫描结果的间隔（毫秒）
+    VIRTUAL_THRESHOLD = 2000  # 结果超过该行数时只创建可见部分的行
+    PAGE_SIZE = 500  # 分页加载时每页的行数
+    WATCH_HISTORY = 60  # 监视模式保留的各状态连接数记录条数
+    HISTORY_FILE = "port_history.db"  # 端口占用历史记录文件（当前目录）
+    GROUP_PAGE_SIZE = 200  # 展开分组时每次加载的行数
+    BASE_COLUMNS = ("port", "pid", "name", "status")
+    RESOURCE_COLUMNS = ("cpu", "rss", "fds", "threads", "io")  # 开启资源占用后显示的列
+    
+    # 分组显示选项：显示文本与分组方式的映射
+    GROUP_OPTIONS = {
+        "不分组": None,
+        "按进程": "process",
+        "按本地端口": "port",
+        "按远程网段": "raddr",
+        "按状态": "status"
+    }
+    
     def __init__(self, root):
         self.root = root
         self.root.title("端口检测工具")
-        self.root.geometry("800x500")
+        self.root.geometry("800x540")
         
         self.processes = {}  # 存储进程信息
+        self.items = []  # 当前查询结果的全部列表项
+        self.displayed = {}  # 已在列表中创建的行：item_id -> (values, tags)
+        self.snapshot = None  # 最近一次的连接表快照
+        self.snapshot_query = None  # 最近一次快照对应的查询条件 (ports, status, query)
+        self.current_ports = None  # 当前查询的端口集合（None 表示所有端口）
+        self.current_query = None  # 当前的查询条件（输入框中输入查询语言时）
+        self.queried = False  # 是否已经执行过查询
+        self.probe_query = None  # 最近一次远程探测的 (主机列表, 端口集合)，本机查询时为 None
+        self.process_cache = ProcessCache()  # 进程信息缓存，多次刷新之间共用
+        # 套接字所属进程的增量索引（仅 Linux），刷新时只重新读取有变化的进程
+        self.owner_index = SocketOwnerIndex() if proc_net_available() else None
+        
+        # 后台扫描器，结果通过队列传回界面线程
+        self.scanner = BackgroundScanner()
+        self.scan_generation = None
+        self.scan_kind = None  # 当前后台任务："scan" 本机查询，"probe" 远程探测
+        self.kill_results = queue.Queue()  # 后台终止进程的结果
+        
+        # 监视模式：定时刷新并比较前后两次快照
+        self.watch_job = None
+        self.watch_history = deque(maxlen=self.WATCH_HISTORY)  # (时间, 各状态连接数)
+        self.watch_start = None  # 开始监视时的 (时间, 各状态连接数)，不受 watch_history 长度限制
+        
+        # 端口占用历史：开启记录后每次扫描都写入完整快照
+        self.history = None
+        
+        # 分组显示：列表只显示分组行，展开时再加载分组中的连接
+        self.group_by = None
+        self.tree_grouped = False
+        self.groups = {}  # 分组行 id -> 分组中的列表项
+        self.group_ids = {}  # (分组方式, 分组键) -> 分组行 id，多次刷新之间保持不变
+        self.next_group_id = 0  # 分组行 id 的序号，不重复使用已删除分组的 id
+        
+        # 进程资源占用：在后台按进程（而不是按连接）定时采样，结果填入资源列
+        self.sampler = ProcessSampler()
+        self.sample_scanner = BackgroundScanner()
+        self.sample_generation = None
+        self.sample_job = None
+        self.samples = {}  # pid -> ProcessSample
+        self.item_values = {}  # item_id -> 基本列的值，用于和资源列一起更新
+        self.shown_resources = {}  # item_id -> 列表中已显示的资源列，未变化时不更新
         
         self.create_widgets()
+        self.root.after(self.POLL_INTERVAL, self.poll_scan_queue)
         
     def create_widgets(self):        # 主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -42,13 +117,7 @@ class PortCheckerGUI:
         ttk.Label(input_frame, text="状态:").grid(row=0, column=2, sticky=tk.W, padx=(10, 5))
         
         # 状态选项：显示文本与实际值的映射
-        self.status_options = {
-            "全部状态": "ALL",
-            "监听": "LISTEN",
-            "已建立": "ESTABLISHED",
-            "等待关闭": "CLOSE_WAIT",
-            "时间等待": "TIME_WAIT"
-        }
+        self.status_options = dict(STATUS_OPTIONS)
         
         self.status_var = tk.StringVar(value="监听")  # 默认选中"监听"
         self.status_combo = ttk.Combobox(input_frame, textvariable=self.status_var, 
@@ -60,7 +129,38 @@ class PortCheckerGUI:
         self.search_btn.grid(row=0, column=4, padx=(0, 5))
         
         self.refresh_btn = ttk.Button(input_frame, text="刷新列表", command=self.refresh_list)
-        self.refresh_btn.grid(row=0, column=5)
+        self.refresh_btn.grid(row=0, column=5, padx=(0, 5))
+        
+        self.cancel_btn = ttk.Button(input_frame, text="取消", command=self.cancel_scan, state=tk.DISABLED)
+        self.cancel_btn.grid(row=0, column=6)
+        
+        # 监视模式
+        watch_frame = ttk.Frame(input_frame)
+        watch_frame.grid(row=1, column=0, columnspan=7, sticky=tk.W, pady=(5, 0))
+        
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(watch_frame, text="监视模式", variable=self.watch_var,
+                        command=self.toggle_watch).pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Label(watch_frame, text="间隔(秒):").pack(side=tk.LEFT, padx=(0, 5))
+        self.watch_interval_var = tk.StringVar(value="5")
+        ttk.Spinbox(watch_frame, from_=1, to=3600, width=5,
+                    textvariable=self.watch_interval_var).pack(side=tk.LEFT)
+        
+        # 远程探测：主动连接远程主机的端口
+        ttk.Label(watch_frame, text="远程主机:").pack(side=tk.LEFT, padx=(20, 5))
+        self.host_entry = ttk.Entry(watch_frame, width=30)
+        self.host_entry.pack(side=tk.LEFT, padx=(0, 5))
+        self.host_entry.bind("<Return>", lambda event: self.probe_ports())
+        
+        self.probe_btn = ttk.Button(watch_frame, text="探测端口", command=self.probe_ports)
+        self.probe_btn.pack(side=tk.LEFT)
+        
+        # 历史记录
+        self.record_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(watch_frame, text="记录历史", variable=self.record_var,
+                        command=self.toggle_record).pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Button(watch_frame, text="历史查询", command=self.show_history_window).pack(side=tk.LEFT)
         
         # 端口列表
         list_frame = ttk.LabelFrame(main_frame, text="端口占用情况", padding="5")
@@ -69,8 +169,9 @@ class PortCheckerGUI:
         list_frame.rowconfigure(0, weight=1)
         
         # 创建Treeview来显示端口信息
-        columns = ("port", "pid", "name", "status")
-        self.port_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        columns = self.BASE_COLUMNS + self.RESOURCE_COLUMNS
+        self.port_tree = ttk.Treeview(list_frame, columns=columns, displaycolumns=self.BASE_COLUMNS,
+                                      show="headings", height=15)
         self.port_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # 设置列标题
@@ -78,17 +179,32 @@ class PortCheckerGUI:
         self.port_tree.heading("pid", text="进程ID")
         self.port_tree.heading("name", text="应用程序")
         self.port_tree.heading("status", text="状态")
+        self.port_tree.heading("cpu", text="CPU")
+        self.port_tree.heading("rss", text="内存")
+        self.port_tree.heading("fds", text="句柄数")
+        self.port_tree.heading("threads", text="线程数")
+        self.port_tree.heading("io", text="读/写速率")
         
         # 设置列宽
         self.port_tree.column("port", width=100, anchor=tk.CENTER)
         self.port_tree.column("pid", width=100, anchor=tk.CENTER)
         self.port_tree.column("name", width=300, anchor=tk.W)
         self.port_tree.column("status", width=100, anchor=tk.CENTER)
+        self.port_tree.column("#0", width=200, anchor=tk.W)  # 分组显示时的分组名称
+        self.port_tree.column("cpu", width=60, anchor=tk.E)
+        self.port_tree.column("rss", width=80, anchor=tk.E)
+        self.port_tree.column("fds", width=60, anchor=tk.E)
+        self.port_tree.column("threads", width=60, anchor=tk.E)
+        self.port_tree.column("io", width=150, anchor=tk.E)
+        
+        # 监视模式下新出现和已消失的连接
+        self.port_tree.tag_configure("added", background="#d9f2d9")
+        self.port_tree.tag_configure("removed", foreground="#888888", background="#f2d9d9")
         
         # 添加滚动条
-        tree_scroll_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.port_tree.yview)
-        tree_scroll_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.port_tree.configure(yscrollcommand=tree_scroll_y.set)
+        self.tree_scroll_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.port_tree.yview)
+        self.tree_scroll_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.port_tree.configure(yscrollcommand=self.on_tree_scroll)
         
         tree_scroll_x = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.port_tree.xview)
         tree_scroll_x.grid(row=1, column=0, sticky=(tk.W, tk.E))
@@ -104,8 +220,48 @@ class PortCheckerGUI:
         self.kill_all_btn = ttk.Button(button_frame, text="终止所有选中", command=self.kill_all_processes, state=tk.DISABLED)
         self.kill_all_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        ttk.Label(button_frame, text="分组显示:").pack(side=tk.LEFT, padx=(20, 5))
+        self.group_var = tk.StringVar(value="不分组")
+        group_combo = ttk.Combobox(button_frame, textvariable=self.group_var,
+                                   values=list(self.GROUP_OPTIONS.keys()), state="readonly", width=10)
+        group_combo.pack(side=tk.LEFT)
+        group_combo.bind("<<ComboboxSelected>>", lambda event: self.change_grouping())
+        
+        # 进程资源占用采样
+        self.sample_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="资源占用", variable=self.sample_var,
+                        command=self.toggle_sampling).pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Label(button_frame, text="采样间隔(秒):").pack(side=tk.LEFT, padx=(0, 5))
+        self.sample_interval_var = tk.StringVar(value="2")
+        ttk.Spinbox(button_frame, from_=1, to=60, width=4,
+                    textvariable=self.sample_interval_var).pack(side=tk.LEFT)
+        
+        # 扫描进度
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_frame.columnconfigure(1, weight=1)
+        
+        self.progress = ttk.Progressbar(status_frame, mode="determinate", length=200)
+        self.progress.grid(row=0, column=0, padx=(0, 10))
+        
+        self.scan_status_var = tk.StringVar(value="就绪")
+        ttk.Label(status_frame, textvariable=self.scan_status_var).grid(row=0, column=1, sticky=tk.W)
+        
+        self.watch_status_var = tk.StringVar(value="")
+        ttk.Label(status_frame, textvariable=self.watch_status_var).grid(row=1, column=0, columnspan=2,
+                                                                         sticky=tk.W, pady=(5, 0))
+        
+        # 性能诊断：显示最近一次扫描各阶段的耗时
+        self.timings_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(status_frame, text="性能诊断", variable=self.timings_var,
+                        command=self.toggle_timings).grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        self.timings_text_var = tk.StringVar(value="")
+        ttk.Label(status_frame, textvariable=self.timings_text_var).grid(row=2, column=1, sticky=tk.W,
+                                                                         pady=(5, 0))
+        
         # 绑定选择事件
         self.port_tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.port_tree.bind("<<TreeviewOpen>>", self.on_group_open)
         
         # 初始化时搜索常用端口
         self.search_common_ports()
@@ -162,212 +318,841 @@ class PortCheckerGUI:
             self.search_all_ports()
             return
         
-        # 解析输入（支持单个端口或端口范围）
-        ports = []
-        try:
-            if '-' in port_input:
-                # 端口范围
-                start, end = map(int, port_input.split('-'))
-                if start > end:
-                    start, end = end, start
-                ports = list(range(start, end + 1))
-            elif ',' in port_input:
-                # 多个端口
-                ports = [int(p.strip()) for p in port_input.split(',')]
-            else:
-                # 单个端口
-                ports = [int(port_input)]
-            
-            # 验证端口范围
-            for port in ports:
-                if not (1 <= port <= 65535):
-                    messagebox.showwarning("输入错误", f"端口号 {port} 超出有效范围 (1-65535)")
-                    return
-            
+        # 查询语言，例如 port:8000-8100 state:LISTEN proc:~java
+        if is_query(port_input):
+            query = self.parse_query_entry(port_input)
+            if query is not None:
+                self.run_query(query.ports, query)
+            return
+        
+        ports = self.parse_port_entry(port_input)
+        if ports is not None:
             self.search_ports_by_list(ports)
+    
+    def parse_query_entry(self, query_input):
+        """编译输入的查询条件，输入有误时提示并返回 None"""
+        try:
+            query = compile_query(query_input)
+        except ValueError as e:
+            messagebox.showwarning("输入错误", f"查询条件有误: {e}\n\n"
+                                   "例如：port:8000-8100,9200 state:LISTEN,CLOSE_WAIT proc:~java raddr:10.0.0.0/8")
+            return None
+        
+        if query.ports is not None:
+            invalid_port = query.ports.first_outside(1, 65535)
+            if invalid_port is not None:
+                messagebox.showwarning("输入错误", f"端口号 {invalid_port} 超出有效范围 (1-65535)")
+                return None
+        return query
+    
+    def parse_port_entry(self, port_input):
+        """解析并验证端口输入，输入有误时提示并返回 None"""
+        # 解析输入（支持单个端口、端口范围或多个端口）
+        try:
+            ports = parse_port_input(port_input)
         except ValueError:
             messagebox.showwarning("输入错误", "请输入有效的端口号（例如：8080 或 8000-8010 或 8080,8000,3306）")
+            return None
+        
+        # 验证端口范围
+        invalid_port = ports.first_outside(1, 65535)
+        if invalid_port is not None:
+            messagebox.showwarning("输入错误", f"端口号 {invalid_port} 超出有效范围 (1-65535)")
+            return None
+        
+        return ports
     
     def search_all_ports(self):
         """搜索所有端口"""
-        # 清空现有列表
-        for item in self.port_tree.get_children():
-            self.port_tree.delete(item)
+        self.run_query(None)
+    
+    def search_ports_by_list(self, ports):
+        """根据端口列表搜索"""
+        if not isinstance(ports, PortSet):
+            ports = PortSet.from_ports(ports)
+        self.run_query(ports)
+    
+    def run_query(self, ports, query=None):
+        """在后台线程中获取连接表快照并查询，ports 为 None 时查询所有端口
+
+        query 为编译后的查询条件，其中包含状态条件（包括取反的条件）时不使用状态下拉框。
+        """
+        self.current_ports = ports
+        self.current_query = query
+        self.probe_query = None
+        self.queried = True
         
-        self.processes = {}
+        # 获取筛选状态
+        if query is not None and "state" in query.fields:
+            selected_status = query.status
+        else:
+            selected_status_text = self.status_var.get()
+            selected_status = self.status_options.get(selected_status_text, "ALL")
         
-        # 获取所有网络连接
-        try:
-            connections = psutil.net_connections(kind='inet')
-        except Exception as e:
-            messagebox.showerror("错误", f"无法获取网络连接信息: {e}")
+        # 监视模式下与同一查询条件的上一次快照比较
+        previous = None
+        if self.watch_var.get() and self.snapshot_query == (ports, selected_status, query):
+            previous = self.snapshot
+        
+        # 开启性能诊断时记录本次扫描各阶段的耗时
+        timings = ScanTimings() if self.timings_var.get() else None
+        
+        # 提交新的扫描会取消尚未完成的旧扫描
+        self.scan_kind = "scan"
+        self.scan_generation = self.scanner.submit(self.scan_job, ports, selected_status, previous, query, timings)
+        self.start_progress("正在获取网络连接...")
+    
+    def start_progress(self, message):
+        """后台任务开始后显示进度和取消按钮"""
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progress.config(mode="indeterminate", value=0)
+        self.progress.start(10)
+        self.scan_status_var.set(message)
+    
+    def probe_ports(self):
+        """按输入的主机和端口进行远程探测"""
+        hosts = parse_hosts(self.host_entry.get())
+        if not hosts:
+            messagebox.showwarning("输入错误", "请输入要探测的主机（多个主机用逗号分隔）")
             return
         
-        # 获取筛选状态
-        selected_status_text = self.status_var.get()
-        selected_status = self.status_options.get(selected_status_text, "ALL")
-        
-        # 查找所有端口的占用情况
-        found_ports = {}
-        for conn in connections:
-            if conn.laddr:
-                # 根据状态筛选
-                if selected_status != "ALL" and conn.status.upper() != selected_status:
-                    continue
-                    
-                port = conn.laddr.port
-                if port not in found_ports:
-                    found_ports[port] = []
-                
-                pid = conn.pid
-                status = conn.status
-                
-                # 获取进程信息
-                try:
-                    if pid:
-                        process = psutil.Process(pid)
-                        name = process.name()
-                    else:
-                        name = "系统进程"
-                        pid = "N/A"
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    name = "未知进程"
-                    pid = "N/A"
-                
-                found_ports[port].append({
-                    'pid': pid,
-                    'name': name,
-                    'status': status
-                })
-        
-        # 显示结果
-        for port in sorted(found_ports.keys()):
-            port_info_list = found_ports[port]
-            for i, info in enumerate(port_info_list):
-                pid = info['pid']
-                name = info['name']
-                status = self.get_status_chinese(info['status'])
-                
-                # 为每个进程创建唯一ID
-                item_id = f"{port}_{pid}_{i}"
-                self.processes[item_id] = {
-                    'port': port,
+        port_input = self.port_entry.get().strip()
+        if not port_input:
+            messagebox.showwarning("输入错误", "请输入要探测的端口（例如：8080 或 8000-8010 或 8080,8000,3306）")
+            return
+        
+        if is_query(port_input):
+            # 远程探测只使用查询中的端口条件
+            query = self.parse_query_entry(port_input)
+            if query is None:
+                return
+            if query.ports is None:
+                messagebox.showwarning("输入错误", "请在查询中指定要探测的端口（例如：port:8000-8010）")
+                return
+            self.start_probe(hosts, query.ports)
+            return
+        
+        ports = self.parse_port_entry(port_input)
+        if ports is not None:
+            self.start_probe(hosts, ports)
+    
+    def start_probe(self, hosts, ports):
+        """在后台探测远程主机的端口，结果陆续显示在列表中"""
+        self.probe_query = (hosts, ports)
+        self.queried = True
+        
+        # 选择"全部状态"时显示所有结果，否则只显示开放的端口
+        open_only = self.status_options.get(self.status_var.get(), "ALL") != "ALL"
+        
+        self.items = []
+        self.processes = {}
+        self.set_grouped_tree(False)
+        self.sync_tree([])
+        
+        self.scan_kind = "probe"
+        self.scan_generation = self.scanner.submit(self.probe_job, hosts, ports, open_only)
+        self.start_progress(f"正在探测 {len(hosts)} 台主机的 {len(ports)} 个端口...")
+    
+    def probe_job(self, context, hosts, ports, open_only):
+        """后台线程执行的探测任务，每隔一小段时间把新结果送回界面线程"""
+        total = len(hosts) * len(ports)
+        counts = Counter()
+        batch = []
+        last_post = time.monotonic()
+        for done, result in enumerate(iter_probe(hosts, ports, cancel_event=context.cancel_event), 1):
+            counts[result.status] += 1
+            if not open_only or result.status == "OPEN":
+                status = PROBE_STATUS_CHINESE[result.status]
+                if result.latency is not None:
+                    status += f" {result.latency * 1000:.1f}ms"
+                item_id = f"probe_{result.host}_{result.port}"
+                batch.append((item_id, (result.port, "-", result.host, status), None, ()))
+            
+            if time.monotonic() - last_post >= 0.1:
+                context.post(batch)
+                context.report(done, total)
+                batch = []
+                last_post = time.monotonic()
+        
+        context.check()
+        context.post(batch)
+        return counts
+    
+    def scan_job(self, context, ports, status, previous=None, query=None, timings=None):
+        """后台线程执行的扫描任务（不能访问任何界面控件）
+
+        提供上一次快照 previous 时同时计算两次快照的差异；query 为附加的查询条件。
+        timings 为 ScanTimings 时记录各阶段耗时和扫描后的进程内存峰值。
+        不使用 tracemalloc：它会拖慢被计时的每个阶段，并且对整个进程生效；
+        需要分配峰值时用 benchmark.py 单独测量。
+        """
+        result = self.run_scan(context, ports, status, previous, query, timings)
+        if timings is not None:
+            timings.count("peak_rss_kb", peak_rss_kb())
+        return result
+    
+    def run_scan(self, context, ports, status, previous, query, timings):
+        """scan_job 的扫描步骤"""
+        hits, misses = self.process_cache.hits, self.process_cache.misses
+        
+        # 获取所有网络连接（只遍历一次连接表）；记录历史时需要完整的连接表
+        history = self.history
+        if history is not None:
+            snapshot = take_snapshot(owner_index=self.owner_index, timings=timings)
+        else:
+            snapshot = take_snapshot(ports=ports, status=status, owner_index=self.owner_index, timings=timings)
+        context.check()
+        
+        # 同一进程只查询一次名称
+        names = {}
+        
+        def name_of(pid):
+            if pid not in names:
+                names[pid] = resolve_process_name(pid, self.process_cache)
+            return names[pid][1]
+        
+        def resolve_names(pids):
+            pids = [pid for pid in dict.fromkeys(pids) if pid not in names]
+            with timed(timings, "names"):
+                for done, pid in enumerate(pids, 1):
+                    context.check()
+                    name_of(pid)
+                    if done % 20 == 0 or done == len(pids):
+                        context.report(done, len(pids))
+        
+        if query is not None and query.needs_names:
+            # 按进程名筛选前先查询进程名，使筛选阶段的耗时不包含进程名查询
+            resolve_names(row.pid for row in snapshot.query(ports, status))
+        
+        with timed(timings, "filter"):
+            rows = snapshot.query(ports, status)
+            match = None
+            if query is not None:
+                rows = query.filter(rows, name_of)
+                match = lambda row: query.matches(row, name_of)
+            diff = diff_snapshots(previous, snapshot, ports, status, match) if previous is not None else None
+            removed = diff.removed if diff else []
+        
+        recorded = snapshot.rows if history is not None else []
+        resolve_names(row.pid for row in rows + removed + recorded)
+        
+        context.check()
+        if history is not None:
+            with timed(timings, "history"):
+                history.record(snapshot.rows, {pid: name for pid, (_, name) in names.items()})
+        with timed(timings, "build"):
+            added = {socket_key(row) for row in diff.added} if diff else set()
+            # 查询还包含端口以外的条件时，没有结果不代表端口未被占用
+            items = self.build_items(rows, names, ports if query is None else None, added, removed)
+        
+        if timings is not None:
+            timings.count("rows", len(rows))
+            timings.count("cache_hits", self.process_cache.hits - hits)
+            timings.count("cache_misses", self.process_cache.misses - misses)
+        return snapshot, (ports, status, query), items, diff, timings
+    
+    def build_items(self, rows, names, ports, added=(), removed=()):
+        """生成要显示的列表项 (item_id, values, process_info, tags)
+
+        item_id 由连接本身（端口、进程、协议和两端地址）决定，同一连接在
+        多次刷新之间保持不变，用于增量更新列表。监视模式下 added 为新出现
+        连接的 socket_key 集合，removed 为已消失的连接，后者以灰色显示且不能终止。
+        """
+        keyed = []
+        used_ids = set()
+        for row, gone in [(row, False) for row in rows] + [(row, True) for row in removed]:
+            pid, name = names[row.pid]
+            status = self.get_status_chinese(row.status)
+            
+            # 为每个连接创建稳定的唯一ID
+            laddr = f"{row.laddr.ip}_{row.laddr.port}"
+            raddr = f"{row.raddr.ip}_{row.raddr.port}" if row.raddr else "-"
+            prefix = "gone_" if gone else ""
+            item_id = base_id = f"{prefix}{row.port}_{pid}_{int(row.type)}_{laddr}_{raddr}"
+            n = 1
+            while item_id in used_ids:
+                n += 1
+                item_id = f"{base_id}_{n}"
+            used_ids.add(item_id)
+            
+            if gone:
+                process_info = None
+                tags = ("removed",)
+            else:
+                process_info = {
+                    'port': row.port,
                     'pid': pid,
                     'name': name,
-                    'status': info['status']  # 保存原始状态用于内部处理
+                    'status': row.status,  # 保存原始状态用于内部处理
+                    'row': row
                 }
+                tags = ("added",) if socket_key(row) in added else ()
+            # 排序键不包含状态等可变字段，保证保留下来的行相对顺序不变
+            sort_key = (row.port, str(pid), laddr, raddr, item_id)
+            keyed.append((sort_key, (item_id, (row.port, pid, name, status), process_info, tags)))
+        
+        if keyed:
+            keyed.sort(key=lambda pair: pair[0])
+            return [item for _, item in keyed]
+        
+        if ports is None:
+            # 如果没有找到任何结果
+            return [("no_results", ("-", "-", "未找到任何端口", "-"), None, ())]
+        # 如果没有找到任何结果，显示未占用的端口
+        return [(f"empty_{port}", (port, "-", "未占用", "-"), None, ()) for port in ports]
+    
+    def poll_scan_queue(self):
+        """定时取出后台扫描和终止进程的结果（在界面线程中执行）"""
+        try:
+            while True:
+                generation, kind, payload = self.scanner.results.get_nowait()
+                # 忽略已被取代的扫描发来的消息
+                if not self.scanner.is_current(generation) or generation != self.scan_generation:
+                    continue
                 
-                # 添加到Treeview
-                self.port_tree.insert("", "end", item_id, values=(port, pid, name, status))
+                if kind == "progress":
+                    done, total = payload
+                    self.progress.stop()
+                    self.progress.config(mode="determinate", maximum=total, value=done)
+                    if self.scan_kind == "probe":
+                        self.scan_status_var.set(f"正在探测 {done}/{total}")
+                    else:
+                        self.scan_status_var.set(f"正在获取进程信息 {done}/{total}")
+                elif kind == "partial":
+                    self.append_items(payload)
+                elif kind == "done" and self.scan_kind == "probe":
+                    self.finish_probe(payload)
+                elif kind == "done":
+                    self.snapshot, self.snapshot_query, items, diff, timings = payload
+                    if diff is not None:
+                        self.show_watch_summary(diff)
+                    self.show_items(items, timings)
+                elif kind == "error":
+                    self.finish_scan("扫描失败")
+                    messagebox.showerror("错误", f"无法获取网络连接信息: {payload}")
+                elif kind == "cancelled":
+                    self.finish_scan("扫描已取消")
+        except queue.Empty:
+            pass
+        
+        try:
+            while True:
+                self.show_kill_results(*self.kill_results.get_nowait())
+        except queue.Empty:
+            pass
+        
+        try:
+            while True:
+                generation, kind, payload = self.sample_scanner.results.get_nowait()
+                if generation != self.sample_generation or not self.sample_var.get():
+                    continue
+                if kind == "done":
+                    self.samples = payload
+                    self.apply_samples()
+                self.schedule_sampling()
+        except queue.Empty:
+            pass
         
-        # 如果没有找到任何结果
-        if not found_ports:
-            self.port_tree.insert("", "end", "no_results", values=("-", "-", "未找到任何端口", "-"))
+        self.root.after(self.POLL_INTERVAL, self.poll_scan_queue)
     
-    def search_ports_by_list(self, ports):
-        """根据端口列表搜索"""
-        # 清空现有列表
-        for item in self.port_tree.get_children():
-            self.port_tree.delete(item)
+    def show_items(self, items, timings=None):
+        """显示扫描结果：与当前列表比较，只插入新行、删除消失的行、更新变化的单元格
+
+        结果超过 VIRTUAL_THRESHOLD 行时只创建前面一部分行，滚动到底部时再分页加载。
+        """
+        self.items = items
+        self.processes = {item_id: info for item_id, _, info, _ in items if info is not None}
+        self.item_values = {item_id: values for item_id, values, info, _ in items if info is not None}
+        with timed(timings, "ui"):
+            self.render_items()
+            self.apply_samples()
+        if timings is not None:
+            self.show_timings(timings)
+        self.finish_scan(self.display_summary())
+    
+    def render_items(self):
+        """按当前的分组方式显示 self.items"""
+        if self.group_by is not None and self.processes:
+            self.show_groups()
+            return
         
-        self.processes = {}
+        self.set_grouped_tree(False)
+        items = self.items
+        if len(items) <= self.VIRTUAL_THRESHOLD:
+            count = len(items)
+        else:
+            # 保留用户已经滚动加载的行数
+            count = min(len(items), max(self.PAGE_SIZE, len(self.displayed)))
+        self.sync_tree(items[:count])
+    
+    def set_grouped_tree(self, grouped):
+        """切换列表的分组显示模式，切换时清空列表"""
+        if self.tree_grouped == grouped:
+            return
+        self.tree_grouped = grouped
+        self.port_tree.delete(*self.port_tree.get_children())
+        self.displayed = {}
+        self.groups = {}
+        self.port_tree.configure(show="tree headings" if grouped else "headings")
+    
+    def group_items(self, items):
+        """按 self.group_by 分组，返回按连接数从多到少排列的 [(分组键, 连接数, 各状态连接数, 列表项)]"""
+        items = [item for item in items if item[2] is not None]
+        rows = [info['row'] for _, _, info, _ in items]
+        names = {info['row'].pid: info['name'] for _, _, info, _ in items}
+        return group_rows(rows, self.group_by, names, items)
+    
+    def group_label(self, key):
+        """分组行显示的文本"""
+        if self.group_by == "process":
+            pid, name = key
+            return f"{name} ({pid if pid is not None else 'N/A'})"
+        if self.group_by == "status":
+            return self.get_status_chinese(key)
+        if key is None:
+            return "无远程地址"
+        return str(key)
+    
+    def show_groups(self):
+        """显示分组行，已展开的分组重新加载其中的连接"""
+        self.set_grouped_tree(True)
+        tree = self.port_tree
+        groups = {}
+        group_ids = {}
+        for position, (key, count, statuses, members) in enumerate(self.group_items(self.items)):
+            group_id = self.group_ids.get((self.group_by, key))
+            if group_id is None:
+                group_id = f"group_{self.next_group_id}"
+                self.next_group_id += 1
+            group_ids[(self.group_by, key)] = group_id
+            groups[group_id] = members
+            summary = "，".join(f"{self.get_status_chinese(status)} {status_count}"
+                               for status, status_count in statuses.most_common())
+            values = ("", "", summary, f"{count} 条连接")
+            
+            if tree.exists(group_id):
+                tree.item(group_id, text=self.group_label(key), values=values)
+                tree.move(group_id, "", position)
+            else:
+                tree.insert("", position, group_id, text=self.group_label(key), values=values)
+            
+            if tree.item(group_id, "open"):
+                self.load_group(group_id, reset=True)
+            else:
+                # 占位行使分组可以展开，展开时才创建实际的行
+                tree.delete(*tree.get_children(group_id))
+                tree.insert(group_id, "end", f"{group_id}_more", values=("", "", "加载中...", ""))
+        
+        stale = [item_id for item_id in tree.get_children() if item_id not in groups]
+        if stale:
+            tree.delete(*stale)
+        self.groups = groups
+        # 只保留当前显示的分组，消失的分组不再占用内存
+        self.group_ids = group_ids
+    
+    def load_group(self, group_id, reset=False):
+        """加载分组中的下一页连接，reset 为 True 时从头加载"""
+        tree = self.port_tree
+        more_id = f"{group_id}_more"
+        if reset:
+            tree.delete(*tree.get_children(group_id))
+        elif tree.exists(more_id):
+            tree.delete(more_id)
+        
+        members = self.groups.get(group_id, [])
+        start = len(tree.get_children(group_id))
+        for item_id, values, _, tags in members[start:start + self.GROUP_PAGE_SIZE]:
+            tree.insert(group_id, "end", item_id, values=values, tags=tags)
+        
+        remaining = len(members) - start - self.GROUP_PAGE_SIZE
+        if remaining > 0:
+            tree.insert(group_id, "end", more_id, values=("", "", f"还有 {remaining} 条（选中此行加载更多）", ""))
+    
+    def on_group_open(self, event):
+        """展开分组时加载其中的连接"""
+        group_id = self.port_tree.focus()
+        if group_id in self.groups and self.port_tree.exists(f"{group_id}_more") \
+                and len(self.port_tree.get_children(group_id)) == 1:
+            self.load_group(group_id, reset=True)
+    
+    def change_grouping(self):
+        """切换分组方式后重新显示当前结果"""
+        self.group_by = self.GROUP_OPTIONS.get(self.group_var.get())
+        if self.probe_query is not None:
+            # 远程探测结果不分组
+            return
+        self.render_items()
+        self.scan_status_var.set(self.display_summary())
+    
+    def sync_tree(self, window):
+        """将列表内容增量更新为 window 中的行，保持选中项和滚动位置"""
+        tree = self.port_tree
+        children = tree.get_children()
+        wanted, removed, inserts, updates = plan_list_update(children, self.displayed, window)
+        
+        # 记录当前顶部可见的、更新后仍然存在的行，用于恢复滚动位置
+        anchor = None
+        if children:
+            top = min(int(tree.yview()[0] * len(children)), len(children) - 1)
+            for item_id in children[top:]:
+                if item_id in wanted:
+                    anchor = item_id
+                    break
+        
+        # 删除消失的行，再按顺序插入新行、更新变化的行（保留的行相对顺序不变）
+        if removed:
+            tree.delete(*removed)
+        for position, item_id, values, tags in inserts:
+            tree.insert("", position, item_id, values=values, tags=tags)
+        for item_id, values, tags in updates:
+            tree.item(item_id, values=values, tags=tags)
+        self.displayed = wanted
+        
+        if anchor is not None and (removed or inserts):
+            tree.yview_moveto(tree.index(anchor) / len(window))
+    
+    def append_items(self, items):
+        """在列表末尾追加结果（用于陆续到达的探测结果），超过 VIRTUAL_THRESHOLD 行后留给分页加载"""
+        fully_shown = len(self.displayed) == len(self.items)
+        self.items.extend(items)
+        if not fully_shown:
+            return
+        
+        for item_id, values, _, tags in items:
+            if len(self.displayed) >= self.VIRTUAL_THRESHOLD:
+                break
+            self.port_tree.insert("", "end", item_id, values=values, tags=tags)
+            self.displayed[item_id] = (values, tags)
+    
+    def finish_probe(self, counts):
+        """探测完成后显示各结果的数量"""
+        if not self.items:
+            self.append_items([("no_results", ("-", "-", "未发现开放端口", "-"), None, ())])
+        summary = "，".join(f"{PROBE_STATUS_CHINESE[status]} {counts.get(status, 0)}"
+                           for status in PROBE_STATUS_CHINESE)
+        self.finish_scan(f"探测完成：{summary}")
+    
+    def on_tree_scroll(self, first, last):
+        """列表滚动时更新滚动条，接近底部时加载下一页"""
+        self.tree_scroll_y.set(first, last)
+        if self.groups or float(last) < 0.95 or len(self.displayed) >= len(self.items):
+            return
+        
+        start = len(self.displayed)
+        for item_id, values, _, tags in self.items[start:start + self.PAGE_SIZE]:
+            self.port_tree.insert("", "end", item_id, values=values, tags=tags)
+            self.displayed[item_id] = (values, tags)
+        self.scan_status_var.set(self.display_summary())
+    
+    def display_summary(self):
+        """状态栏中显示的结果数量"""
+        if self.groups:
+            return f"共 {len(self.processes)} 条连接，{len(self.groups)} 个分组（展开分组查看连接）"
+        if len(self.displayed) < len(self.items):
+            return f"共 {len(self.processes)} 条连接，已显示 {len(self.displayed)} 条（滚动加载更多）"
+        return f"共 {len(self.processes)} 条连接"
+    
+    def toggle_watch(self):
+        """开启或关闭监视模式"""
+        if self.watch_job is not None:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        self.watch_history.clear()
+        self.watch_start = None
+        
+        if self.watch_var.get():
+            self.watch_status_var.set("监视中...")
+            self.refresh_list()
+        else:
+            self.watch_status_var.set("")
+            # 去掉新增/消失的标记
+            self.refresh_list()
+    
+    def schedule_watch(self):
+        """监视模式下，在上一次扫描完成后安排下一次刷新"""
+        if self.watch_job is not None:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        if not self.watch_var.get():
+            return
         
-        # 获取所有网络连接
         try:
-            connections = psutil.net_connections(kind='inet')
-        except Exception as e:
-            messagebox.showerror("错误", f"无法获取网络连接信息: {e}")
+            interval = max(1, int(float(self.watch_interval_var.get())))
+        except ValueError:
+            interval = 5
+        self.watch_job = self.root.after(interval * 1000, self.watch_tick)
+    
+    def watch_tick(self):
+        """监视模式的定时刷新"""
+        self.watch_job = None
+        if self.watch_var.get():
+            self.refresh_list()
+    
+    def show_watch_summary(self, diff):
+        """显示新增/消失的连接数、各状态连接数相对上次和开始监视时的变化，以及最近的连接数走势"""
+        now = time.time()
+        if self.watch_start is None:
+            self.watch_start = (now, diff.old_counts)
+            self.watch_history.append(self.watch_start)
+        self.watch_history.append((now, diff.new_counts))
+        started, first_counts = self.watch_start
+        
+        parts = [f"新增 {len(diff.added)}", f"消失 {len(diff.removed)}"]
+        for status in sorted(set(diff.new_counts) | set(diff.old_counts)):
+            count = diff.new_counts.get(status, 0)
+            change = count - diff.old_counts.get(status, 0)
+            total_change = count - first_counts.get(status, 0)
+            parts.append(f"{self.get_status_chinese(status)} {count} ({change:+d}, 累计 {total_change:+d})")
+        # 最近 WATCH_HISTORY 次刷新的连接总数走势
+        totals = [sum(counts.values()) for _, counts in self.watch_history]
+        parts.append(f"走势 {sparkline(totals)}")
+        
+        elapsed = int(now - started)
+        self.watch_status_var.set(f"监视 {elapsed} 秒 | " + " | ".join(parts))
+    
+    def toggle_record(self):
+        """开启或关闭历史记录"""
+        if self.record_var.get():
+            try:
+                self.history = HistoryStore(self.HISTORY_FILE)
+            except Exception as e:
+                self.record_var.set(False)
+                messagebox.showerror("错误", f"无法打开历史记录文件: {str(e)}")
+                return
+            self.scan_status_var.set(f"历史记录已开启，保存到 {self.HISTORY_FILE}")
+        elif self.history is not None:
+            history, self.history = self.history, None
+            history.close()
+            self.scan_status_var.set("历史记录已关闭")
+    
+    def show_history_window(self):
+        """历史查询窗口：某段时间内哪些进程占用过指定端口"""
+        window = tk.Toplevel(self.root)
+        window.title("端口占用历史")
+        window.geometry("760x400")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(1, weight=1)
+        
+        query_frame = ttk.Frame(window, padding="10")
+        query_frame.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        ttk.Label(query_frame, text="端口号:").pack(side=tk.LEFT, padx=(0, 5))
+        port_entry = ttk.Entry(query_frame, width=15)
+        port_entry.pack(side=tk.LEFT, padx=(0, 10))
+        port_entry.insert(0, self.port_entry.get().strip())
+        
+        ttk.Label(query_frame, text="开始:").pack(side=tk.LEFT, padx=(0, 5))
+        since_entry = ttk.Entry(query_frame, width=18)
+        since_entry.pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Label(query_frame, text="结束:").pack(side=tk.LEFT, padx=(0, 5))
+        until_entry = ttk.Entry(query_frame, width=18)
+        until_entry.pack(side=tk.LEFT, padx=(0, 10))
+        
+        columns = ("port", "pid", "name", "status", "laddr", "first_seen", "closed")
+        headings = ("端口号", "进程ID", "进程名称", "状态", "本地地址", "出现时间", "结束时间")
+        widths = (60, 70, 120, 80, 140, 130, 130)
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=10)
+        for column, heading, width in zip(columns, headings, widths):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.CENTER)
+        
+        status_var = tk.StringVar(value="时间格式：02:00 表示今天，也可以输入 2024-05-01 02:00")
+        ttk.Label(window, textvariable=status_var).grid(row=2, column=0, sticky=tk.W, padx=10, pady=5)
+        
+        def run_history_query():
+            port_input = port_entry.get().strip()
+            ports = None
+            if port_input:
+                ports = self.parse_port_entry(port_input)
+                if ports is None:
+                    return
+            try:
+                since = parse_time(since_entry.get()) if since_entry.get().strip() else None
+                until = parse_time(until_entry.get()) if until_entry.get().strip() else None
+            except ValueError:
+                messagebox.showwarning("输入错误", "请输入有效的时间（例如：02:00 或 2024-05-01 02:00）")
+                return
+            
+            if self.history is None and not os.path.exists(self.HISTORY_FILE):
+                tree.delete(*tree.get_children())
+                status_var.set("还没有历史记录，请先勾选“记录历史”")
+                return
+            # 没有在记录时以只读方式打开，不影响其他正在记录的实例
+            store = self.history or HistoryStore(self.HISTORY_FILE, readonly=True)
+            try:
+                records = store.query(ports, since, until)
+            finally:
+                if store is not self.history:
+                    store.close()
+            
+            tree.delete(*tree.get_children())
+            for record in records:
+                tree.insert("", tk.END, values=(
+                    record["port"], record["pid"] if record["pid"] is not None else "N/A",
+                    record["name"] or "", self.get_status_chinese(record["status"]), record["laddr"],
+                    format_time(record["first_seen"]), format_time(record["closed"]) or "仍存在"))
+            status_var.set(f"共 {len(records)} 条记录")
+        
+        ttk.Button(query_frame, text="查询", command=run_history_query).pack(side=tk.LEFT)
+        port_entry.bind("<Return>", lambda event: run_history_query())
+    
+    def toggle_sampling(self):
+        """开启或关闭进程资源占用采样"""
+        if self.sample_job is not None:
+            self.root.after_cancel(self.sample_job)
+            self.sample_job = None
+        
+        if self.sample_var.get():
+            self.port_tree.configure(displaycolumns=self.BASE_COLUMNS + self.RESOURCE_COLUMNS)
+            self.sample_tick()
+        else:
+            self.sample_scanner.cancel()
+            self.sample_generation = None
+            self.samples = {}
+            self.port_tree.configure(displaycolumns=self.BASE_COLUMNS)
+    
+    def schedule_sampling(self):
+        """上一次采样完成后安排下一次采样"""
+        if self.sample_job is not None:
+            self.root.after_cancel(self.sample_job)
+            self.sample_job = None
+        if not self.sample_var.get():
             return
         
-        # 获取筛选状态
-        selected_status_text = self.status_var.get()
-        selected_status = self.status_options.get(selected_status_text, "ALL")
-        
-        # 查找指定端口的占用情况
-        found_ports = {}
-        for conn in connections:
-            if conn.laddr and conn.laddr.port in ports:
-                # 根据状态筛选
-                if selected_status != "ALL" and conn.status.upper() != selected_status:
-                    continue
-                    
-                port = conn.laddr.port
-                if port not in found_ports:
-                    found_ports[port] = []
-                
-                pid = conn.pid
-                status = conn.status
-                
-                # 获取进程信息
-                try:
-                    if pid:
-                        process = psutil.Process(pid)
-                        name = process.name()
-                    else:
-                        name = "系统进程"
-                        pid = "N/A"
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    name = "未知进程"
-                    pid = "N/A"
-                
-                found_ports[port].append({
-                    'pid': pid,
-                    'name': name,
-                    'status': status
-                })
-        
-        # 显示结果
-        for port in sorted(found_ports.keys()):
-            port_info_list = found_ports[port]
-            for i, info in enumerate(port_info_list):
-                pid = info['pid']
-                name = info['name']
-                status = self.get_status_chinese(info['status'])
-                
-                # 为每个进程创建唯一ID
-                item_id = f"{port}_{pid}_{i}"
-                self.processes[item_id] = {
-                    'port': port,
-                    'pid': pid,
-                    'name': name,
-                    'status': info['status']  # 保存原始状态用于内部处理
-                }
-                
-                # 添加到Treeview
-                self.port_tree.insert("", "end", item_id, values=(port, pid, name, status))
+        try:
+            interval = max(1, float(self.sample_interval_var.get()))
+        except ValueError:
+            interval = 2
+        self.sample_job = self.root.after(int(interval * 1000), self.sample_tick)
+    
+    def sample_tick(self):
+        """对当前结果中的所有进程采样一次（每个进程只采样一次，与连接数无关）"""
+        self.sample_job = None
+        pids = {info['pid'] for info in self.processes.values() if info['pid'] != "N/A"}
+        self.sample_generation = self.sample_scanner.submit(self.sample_worker, pids)
+    
+    def sample_worker(self, context, pids):
+        """后台线程执行的采样任务（不能访问任何界面控件）"""
+        return self.sampler.sample(pids, context.cancel_event)
+    
+    def apply_samples(self):
+        """把最近一次采样结果填入列表中已创建的行"""
+        if not self.samples:
+            return
+        tree = self.port_tree
+        if self.groups:
+            shown = [item_id for group_id in self.groups for item_id in tree.get_children(group_id)]
+        else:
+            shown = list(self.displayed)
         
-        # 如果没有找到任何结果，显示未占用的端口
-        if not found_ports:
-            for port in ports:
-                item_id = f"empty_{port}"
-                self.port_tree.insert("", "end", item_id, values=(port, "-", "未占用", "-"))
+        formatted = {}
+        shown_resources = {}
+        for item_id in shown:
+            info = self.processes.get(item_id)
+            if info is None:
+                continue
+            pid = info['pid']
+            if pid not in formatted:
+                sample = self.samples.get(pid)
+                formatted[pid] = (self.format_sample(sample) if sample is not None
+                                  else ("-",) * len(self.RESOURCE_COLUMNS))
+            resources = shown_resources[item_id] = formatted[pid]
+            # 行的基本列在刷新后可能已经变化，此时也需要重新填入资源列
+            if self.shown_resources.get(item_id) != resources or tree.set(item_id, "cpu") == "":
+                tree.item(item_id, values=self.item_values[item_id] + resources)
+        self.shown_resources = shown_resources
+    
+    def format_sample(self, sample):
+        """资源列显示的文本"""
+        def rate(value):
+            return "-" if value is None else f"{self.format_bytes(value)}/s"
+        
+        cpu = "-" if sample.cpu_percent is None else f"{sample.cpu_percent:.1f}%"
+        fds = "-" if sample.num_fds is None else sample.num_fds
+        return (cpu, self.format_bytes(sample.rss), fds, sample.num_threads,
+                f"{rate(sample.read_rate)} / {rate(sample.write_rate)}")
+    
+    @staticmethod
+    def format_bytes(value):
+        """字节数转换为便于阅读的单位"""
+        for unit in ("B", "KB", "MB", "GB"):
+            if value < 1024:
+                return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+            value /= 1024
+        return f"{value:.1f} TB"
+    
+    def toggle_timings(self):
+        """开启性能诊断后立即刷新一次，关闭时清除显示"""
+        if self.timings_var.get():
+            self.timings_text_var.set("等待下一次扫描...")
+            if self.probe_query is None:
+                self.refresh_list()
+        else:
+            self.timings_text_var.set("")
+    
+    def show_timings(self, timings):
+        """在诊断面板中显示各阶段耗时，并写入一行结构化日志"""
+        labels = (("dump", "读取连接表"), ("owners", "所属进程"), ("index", "索引"), ("names", "进程名"),
+                  ("filter", "筛选"), ("history", "历史记录"), ("build", "生成列表项"), ("ui", "界面更新"))
+        hits = timings.counters.get("cache_hits", 0)
+        lookups = hits + timings.counters.get("cache_misses", 0)
+        parts = []
+        for name, label in labels:
+            if name not in timings.stages:
+                continue
+            text = f"{label} {timings.stages[name] * 1000:.1f}ms"
+            if name == "names" and lookups:
+                text += f"（缓存命中 {hits / lookups:.0%}）"
+            parts.append(text)
+        parts.append(f"{timings.counters.get('rows', 0)} 行")
+        if timings.counters.get("peak_rss_kb") is not None:
+            parts.append(f"内存峰值 {timings.counters['peak_rss_kb'] / 1024:.1f}MB")
+        self.timings_text_var.set(f"共 {timings.total * 1000:.1f}ms | " + " | ".join(parts))
+        logger.info(format_timings_log(timings))
+    
+    def cancel_scan(self):
+        """取消正在进行的扫描"""
+        self.scanner.cancel()
+        self.scan_generation = None
+        self.finish_scan("扫描已取消")
+    
+    def finish_scan(self, message):
+        """扫描结束后恢复进度条和取消按钮"""
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.scan_status_var.set(message)
+        self.schedule_watch()
     
     def refresh_list(self):
-        """刷新端口列表"""
-        # 获取当前搜索的端口
-        current_ports = set()
-        for item_id in self.port_tree.get_children():
-            values = self.port_tree.item(item_id, "values")
-            if values and values[0] not in ["-", "端口号"]:
-                try:
-                    port = int(values[0])
-                    current_ports.add(port)
-                except (ValueError, IndexError):
-                    pass
-        
-        if current_ports:
-            self.search_ports_by_list(list(current_ports))
+        """刷新端口列表：重新获取快照并执行上一次的查询"""
+        if self.probe_query is not None:
+            self.start_probe(*self.probe_query)
+            return
+        
+        if self.queried:
+            self.run_query(self.current_ports, self.current_query)
+            return
+        
+        # 如果还没有查询过，则根据当前输入决定行为
+        port_input = self.port_entry.get().strip()
+        if port_input:
+            self.search_ports()
         else:
-            # 如果没有特定端口，则根据当前输入决定行为
-            port_input = self.port_entry.get().strip()
-            if port_input:
-                self.search_ports()
-            else:
-                self.search_all_ports()
+            self.search_all_ports()
     
     def on_select(self, event):
         """选择项改变时的处理"""
         selection = self.port_tree.selection()
+        # 选中分组中的"加载更多"行时加载下一页
+        for item_id in selection:
+            if item_id.endswith("_more") and self.port_tree.exists(item_id):
+                group_id = self.port_tree.parent(item_id)
+                if group_id in self.groups:
+                    self.load_group(group_id)
+        
         if selection:
             self.kill_btn.config(state=tk.NORMAL)
             self.kill_all_btn.config(state=tk.NORMAL)
@@ -404,30 +1189,7 @@ class PortCheckerGUI:
         )
         
         if result:
-            try:
-                process = psutil.Process(int(pid))
-                process.terminate()
-                # 等待进程结束
-                process.wait(timeout=3)
-                messagebox.showinfo("成功", f"进程 {name} (PID: {pid}) 已成功终止")
-                
-                # 刷新列表
-                self.refresh_list()
-            except psutil.NoSuchProcess:
-                messagebox.showinfo("提示", "进程已经结束")
-                self.refresh_list()
-            except psutil.AccessDenied:
-                messagebox.showerror("错误", "权限不足，无法终止该进程")
-            except psutil.TimeoutExpired:
-                # 如果进程没有及时终止，强制杀死
-                try:
-                    process.kill()
-                    messagebox.showinfo("成功", f"进程 {name} (PID: {pid}) 已强制终止")
-                    self.refresh_list()
-                except Exception as e:
-                    messagebox.showerror("错误", f"强制终止进程失败: {e}")
-            except Exception as e:
-                messagebox.showerror("错误", f"终止进程时发生错误: {e}")
+            self.start_kill([process_info])
     
     def kill_all_processes(self):
         """终止所有选中的进程"""
@@ -436,13 +1198,21 @@ class PortCheckerGUI:
             messagebox.showwarning("警告", "请先选择要终止的进程")
             return
         
-        # 收集要终止的进程信息
-        processes_to_kill = []
+        # 收集要终止的进程信息（同一进程只终止一次）
+        processes_to_kill = {}
+        # 选中分组行时终止分组中的所有进程
+        selected = []
         for item_id in selection:
+            if item_id in self.groups:
+                selected.extend(member[0] for member in self.groups[item_id])
+            else:
+                selected.append(item_id)
+        for item_id in selected:
             if item_id in self.processes:
                 process_info = self.processes[item_id]
                 if process_info['pid'] != "N/A":
-                    processes_to_kill.append(process_info)
+                    processes_to_kill.setdefault(process_info['pid'], process_info)
+        processes_to_kill = list(processes_to_kill.values())
         
         if not processes_to_kill:
             messagebox.showwarning("警告", "没有可终止的进程")
@@ -458,40 +1228,80 @@ class PortCheckerGUI:
         )
         
         if result:
+            self.start_kill(processes_to_kill)
+    
+    def start_kill(self, targets):
+        """在后台线程中同时终止 targets 中的进程，完成后由 poll_scan_queue 显示结果"""
+        self.kill_btn.config(state=tk.DISABLED)
+        self.kill_all_btn.config(state=tk.DISABLED)
+        self.scan_status_var.set(f"正在终止 {len(targets)} 个进程...")
+        thread = threading.Thread(target=self.kill_job, args=(targets,), daemon=True)
+        thread.start()
+    
+    def kill_job(self, targets):
+        """后台线程执行的终止任务（不能访问任何界面控件）"""
+        try:
+            results = terminate_processes([int(p['pid']) for p in targets],
+                                          process_cache=self.process_cache)
+        except Exception as e:
+            results = [KillResult(int(p['pid']), "failed", str(e)) for p in targets]
+        self.kill_results.put((targets, results))
+    
+    def show_kill_results(self, targets, results):
+        """显示终止结果：单个进程沿用原有提示，多个进程汇总并列出每个进程的结果"""
+        self.on_select(None)
+        self.scan_status_var.set(self.display_summary())
+        
+        if len(targets) == 1:
+            info, result = targets[0], results[0]
+            name, pid = info['name'], info['pid']
+            if result.outcome == "terminated":
+                messagebox.showinfo("成功", f"进程 {name} (PID: {pid}) 已成功终止")
+            elif result.outcome == "killed":
+                messagebox.showinfo("成功", f"进程 {name} (PID: {pid}) 已强制终止")
+            elif result.outcome == "gone":
+                messagebox.showinfo("提示", "进程已经结束")
+            elif result.outcome == "denied":
+                messagebox.showerror("错误", "权限不足，无法终止该进程")
+                return
+            else:
+                messagebox.showerror("错误", f"终止进程时发生错误: {result.error}")
+                return
+        else:
+            outcome_text = {
+                "terminated": "已终止",
+                "killed": "已强制终止",
+                "gone": "已经结束",
+                "denied": "权限不足",
+                "failed": "终止失败",
+            }
             success_count = 0
             fail_count = 0
-            
-            for process_info in processes_to_kill:
-                try:
-                    pid = int(process_info['pid'])
-                    process = psutil.Process(pid)
-                    process.terminate()
-                    process.wait(timeout=3)
-                    success_count += 1
-                except psutil.NoSuchProcess:
+            lines = []
+            for info, result in zip(targets, results):
+                if result.outcome in ("terminated", "killed", "gone"):
                     success_count += 1  # 进程已经结束也算成功
-                except psutil.AccessDenied:
-                    fail_count += 1
-                except psutil.TimeoutExpired:
-                    try:
-                        process.kill()
-                        success_count += 1
-                    except:
-                        fail_count += 1
-                except Exception:
+                else:
                     fail_count += 1
+                text = outcome_text[result.outcome]
+                if result.error:
+                    text += f": {result.error}"
+                lines.append(f"{info['name']} (PID: {info['pid']}): {text}")
+            details = "\n".join(lines)
             
             # 显示结果
             if fail_count == 0:
-                messagebox.showinfo("成功", f"成功终止了 {success_count} 个进程")
+                messagebox.showinfo("成功", f"成功终止了 {success_count} 个进程\n\n{details}")
             else:
-                messagebox.showinfo("完成", f"成功终止了 {success_count} 个进程，{fail_count} 个进程终止失败")
-            
-            # 刷新列表
-            self.refresh_list()
+                messagebox.showinfo("完成", f"成功终止了 {success_count} 个进程，{fail_count} 个进程终止失败\n\n{details}")
+        
+        # 刷新列表
+        self.refresh_list()
 
 def main():
     """主函数"""
+    # 性能诊断的结构化日志输出到标准错误
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
     root = tk.Tk()
     app = PortCheckerGUI(root)
     root.mainloop()
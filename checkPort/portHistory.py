@@ -0,0 +1,223 @@
+"""端口占用历史：把每次快照以区间形式增量写入 SQLite，支持按端口和时间段查询
+
+同一个连接（协议、两端地址、进程和状态都相同）在连续的快照中只保存一行，
+出现时写入 first_seen，消失时写入 closed，因此每次记录只写入两次快照之间的变化。
+"""
+import datetime
+import os
+import pathlib
+import socket
+import sqlite3
+import threading
+import time
+
+import psutil
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticks (
+    ts REAL PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    pid_started REAL NOT NULL,
+    last_tick REAL,
+    ended REAL
+);
+CREATE TABLE IF NOT EXISTS sockets (
+    id INTEGER PRIMARY KEY,
+    port INTEGER NOT NULL,
+    pid INTEGER,
+    name TEXT,
+    status TEXT NOT NULL,
+    proto TEXT NOT NULL,
+    laddr TEXT NOT NULL,
+    raddr TEXT,
+    first_seen REAL NOT NULL,
+    closed REAL,
+    session INTEGER
+);
+CREATE INDEX IF NOT EXISTS sockets_port ON sockets (port, first_seen);
+CREATE INDEX IF NOT EXISTS sockets_pid ON sockets (pid, first_seen);
+CREATE INDEX IF NOT EXISTS sockets_open ON sockets (closed) WHERE closed IS NULL;
+"""
+
+# 查询结果的字段
+HISTORY_FIELDS = ["port", "pid", "name", "status", "proto", "laddr", "raddr", "first_seen", "closed"]
+
+
+def format_address(address):
+    """将地址格式化为 ip:port（IPv6 加方括号），空地址返回 None"""
+    if not address:
+        return None
+    if ":" in address.ip:
+        return f"[{address.ip}]:{address.port}"
+    return f"{address.ip}:{address.port}"
+
+
+def parse_time(value, now=None):
+    """解析时间：HH:MM[:SS] 表示今天，也接受 YYYY-MM-DD HH:MM[:SS] 或时间戳，返回时间戳"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    now = now or datetime.datetime.now()
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return now.replace(hour=parsed.hour, minute=parsed.minute, second=parsed.second,
+                           microsecond=0).timestamp()
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def format_time(ts):
+    """时间戳格式化为本地时间"""
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def recorder_alive(pid, started):
+    """写入历史的进程是否仍在运行（PID 相同且启动时间一致，PID 被复用时视为已退出）"""
+    try:
+        return abs(psutil.Process(pid).create_time() - started) < 1
+    except psutil.NoSuchProcess:
+        return False
+    except psutil.AccessDenied:
+        return True
+
+
+class HistoryStore:
+    """端口占用历史记录（可以在多个线程中使用）
+
+    retention 为保留时长（秒），更早结束的记录会在写入时被清理。
+    readonly 为真时只用于查询：以只读方式打开，不创建也不修改数据库（可以与正在记录的实例同时使用），
+    数据库不存在时抛出 FileNotFoundError。
+    每个可写的实例是一个记录会话，只结束自己打开的记录：close 时按本会话最后一次快照的时间结束它们；
+    打开时只结束已经退出、没有正常关闭的会话留下的记录，不影响其他仍在记录的实例。
+    """
+
+    PRUNE_EVERY = 100  # 每写入多少次快照清理一次过期记录
+
+    def __init__(self, path, retention=7 * 24 * 3600, readonly=False):
+        self.path = path
+        self.retention = retention
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._records = 0
+        self._open = {}  # 连接身份 -> 记录 id
+        if readonly:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"历史数据库不存在: {path}")
+            uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sockets)")}
+        with self._db:
+            if "session" not in columns:
+                # 旧版本的数据库：记录没有所属会话，仍打开的记录按最后一次快照的时间结束
+                self._db.execute("ALTER TABLE sockets ADD COLUMN session INTEGER")
+                self._db.execute("UPDATE sockets SET closed = (SELECT MAX(ts) FROM ticks) WHERE closed IS NULL")
+            # 已退出的会话仍打开的记录：之后的情况未知，按该会话最后一次快照的时间结束
+            for session, pid, started, last_tick in self._db.execute(
+                    "SELECT id, pid, pid_started, last_tick FROM sessions WHERE ended IS NULL").fetchall():
+                if not recorder_alive(pid, started):
+                    self._end_session(session, last_tick)
+            process = psutil.Process()
+            self._session = self._db.execute("INSERT INTO sessions (pid, pid_started) VALUES (?, ?)",
+                                             (process.pid, process.create_time())).lastrowid
+
+    def record(self, rows, names, ts=None):
+        """写入一次快照，names 为 {pid: 进程名}，返回 (新增记录数, 结束记录数)"""
+        ts = time.time() if ts is None else ts
+        current = {}
+        for row in rows:
+            proto = "tcp" if row.type == socket.SOCK_STREAM else "udp"
+            key = (proto, format_address(row.laddr), format_address(row.raddr), row.pid, row.status)
+            current.setdefault(key, row)
+
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO ticks (ts) VALUES (?)", (ts,))
+            self._db.execute("UPDATE sessions SET last_tick = ? WHERE id = ?", (ts, self._session))
+            gone = [record_id for key, record_id in self._open.items() if key not in current]
+            self._db.executemany("UPDATE sockets SET closed = ? WHERE id = ?",
+                                 [(ts, record_id) for record_id in gone])
+            for key in self._open.keys() - current.keys():
+                del self._open[key]
+
+            added = 0
+            for key, row in current.items():
+                if key in self._open:
+                    continue
+                proto, laddr, raddr, pid, status = key
+                cursor = self._db.execute(
+                    "INSERT INTO sockets (port, pid, name, status, proto, laddr, raddr, first_seen, session) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (row.port, pid, names.get(pid), status, proto, laddr, raddr, ts, self._session))
+                self._open[key] = cursor.lastrowid
+                added += 1
+
+            self._records += 1
+            if self._records % self.PRUNE_EVERY == 0:
+                self._prune(ts)
+        return added, len(gone)
+
+    def query(self, ports=None, start=None, end=None, pid=None):
+        """查询在 [start, end] 期间存在过的连接，ports 为 PortSet，返回字典列表"""
+        conditions = []
+        params = []
+        if end is not None:
+            conditions.append("first_seen <= ?")
+            params.append(end)
+        if start is not None:
+            conditions.append("(closed IS NULL OR closed >= ?)")
+            params.append(start)
+        if pid is not None:
+            conditions.append("pid = ?")
+            params.append(pid)
+        if ports is not None:
+            ranges = []
+            for low, high in ports.intervals:
+                ranges.append("port BETWEEN ? AND ?")
+                params.extend((low, high))
+            conditions.append("(" + " OR ".join(ranges or ["0"]) + ")")
+
+        sql = f"SELECT {', '.join(HISTORY_FIELDS)} FROM sockets"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY port, first_seen"
+        with self._lock:
+            return [dict(zip(HISTORY_FIELDS, values)) for values in self._db.execute(sql, params)]
+
+    def prune(self, now=None):
+        """删除超过保留时长的记录"""
+        with self._lock, self._db:
+            self._prune(time.time() if now is None else now)
+
+    def _prune(self, now):
+        cutoff = now - self.retention
+        self._db.execute("DELETE FROM sockets WHERE closed IS NOT NULL AND closed < ?", (cutoff,))
+        self._db.execute("DELETE FROM ticks WHERE ts < ?", (cutoff,))
+        self._db.execute("DELETE FROM sessions WHERE ended < ?", (cutoff,))
+
+    def _end_session(self, session, last_tick):
+        """按会话最后一次快照的时间结束它仍打开的记录（没有写入过快照的会话按当前时间结束）"""
+        self._db.execute("UPDATE sockets SET closed = ? WHERE session = ? AND closed IS NULL", (last_tick, session))
+        self._db.execute("UPDATE sessions SET ended = ? WHERE id = ?",
+                         (time.time() if last_tick is None else last_tick, session))
+
+    def close(self):
+        """关闭数据库；可写的实例同时结束本会话仍打开的记录"""
+        with self._lock:
+            if not self.readonly:
+                with self._db:
+                    last_tick = self._db.execute("SELECT last_tick FROM sessions WHERE id = ?",
+                                                 (self._session,)).fetchone()[0]
+                    self._end_session(self._session, last_tick)
+                self._open.clear()
+            self._db.close()
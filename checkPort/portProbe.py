@@ -0,0 +1,134 @@
+"""远程端口探测：基于 asyncio 的并发非阻塞连接，检查主机端口是否接受连接"""
+import asyncio
+import queue
+import socket
+import threading
+import time
+from collections import namedtuple
+
+# 一次探测的结果，status 为 OPEN、CLOSED、TIMEOUT 或 ERROR，latency 单位为秒
+ProbeResult = namedtuple("ProbeResult", ["host", "port", "status", "latency", "error"])
+
+# 探测结果的中文显示
+PROBE_STATUS_CHINESE = {
+    "OPEN": "开放",
+    "CLOSED": "关闭",
+    "TIMEOUT": "超时",
+    "ERROR": "错误",
+}
+
+
+def limit_concurrency(requested):
+    """并发连接数不超过进程可打开文件数的软限制（留出余量）"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        # Windows 没有 resource 模块
+        return requested
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - 64))
+
+
+class RateLimiter:
+    """令牌桶限速器：每秒最多发起 rate 次连接"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def probe_port(host, address, port, timeout):
+    """尝试连接一个端口，返回 ProbeResult"""
+    started = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+    except asyncio.TimeoutError:
+        return ProbeResult(host, port, "TIMEOUT", None, None)
+    except ConnectionRefusedError:
+        return ProbeResult(host, port, "CLOSED", time.monotonic() - started, None)
+    except OSError as e:
+        return ProbeResult(host, port, "ERROR", None, e.strerror or str(e))
+
+    latency = time.monotonic() - started
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return ProbeResult(host, port, "OPEN", latency, None)
+
+
+async def probe_hosts(hosts, ports, on_result, concurrency=1000, rate=None, timeout=1.0,
+                      cancel_event=None):
+    """并发探测 hosts × ports，每得到一个结果就调用 on_result(result)
+
+    同时进行的连接不超过 concurrency 个（也不超过可打开文件数的限制）；
+    rate 为每台主机每秒最多发起的连接数，None 表示不限速。
+    cancel_event（threading.Event）被设置后停止发起新的连接。
+    主机名只解析一次，解析失败的主机所有端口都记为 ERROR。
+    """
+    loop = asyncio.get_running_loop()
+    addresses = {}
+    for host in dict.fromkeys(hosts):
+        try:
+            info = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            addresses[host] = info[0][4][0]
+        except OSError as e:
+            addresses[host] = None
+            for port in ports:
+                on_result(ProbeResult(host, port, "ERROR", None, e.strerror or str(e)))
+
+    limiters = {host: RateLimiter(rate) for host in addresses} if rate else {}
+    # 按端口交错排列，使同一时刻的连接分散到各台主机
+    targets = ((host, port) for port in ports for host in addresses if addresses[host])
+
+    async def worker():
+        for host, port in targets:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if limiters:
+                await limiters[host].acquire()
+            on_result(await probe_port(host, addresses[host], port, timeout))
+
+    await asyncio.gather(*(worker() for _ in range(limit_concurrency(max(1, concurrency)))))
+
+
+def iter_probe(hosts, ports, concurrency=1000, rate=None, timeout=1.0, cancel_event=None):
+    """同步接口：在后台线程中运行事件循环，按完成顺序逐个返回 ProbeResult"""
+    results = queue.Queue()
+    finished = object()
+
+    def run():
+        try:
+            asyncio.run(probe_hosts(hosts, ports, results.put, concurrency, rate, timeout, cancel_event))
+        finally:
+            results.put(finished)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        result = results.get()
+        if result is finished:
+            break
+        yield result
+    thread.join()
+
+
+def parse_hosts(host_input):
+    """解析主机列表（逗号或空白分隔）"""
+    return [host for host in host_input.replace(",", " ").split() if host]
@@ -0,0 +1,273 @@
+"""连接查询语言：把查询文本编译为一个判断函数，在遍历快照时一次完成全部筛选
+
+查询由空格分隔的条件组成，条件之间为"并且"，同一条件中逗号分隔的值之间为"或者"，
+条件前加 ! 表示取反：
+
+    port:8000-8100,9200 state:LISTEN,CLOSE_WAIT proc:~java raddr:10.0.0.0/8
+    8080 !proc:nginx proto:tcp
+
+支持的条件：port（本地端口，不写字段名时默认为端口）、state（连接状态）、
+proc（进程名，~ 开头表示按正则表达式搜索）、pid、laddr 和 raddr（IP 或网段）、proto（tcp/udp）。
+"""
+import re
+import socket
+
+from portScan import PROC_TCP_STATES, STATUS_OPTIONS, PortSet, parse_port_input
+
+# 字段别名
+QUERY_FIELDS = {
+    "port": "port",
+    "state": "state",
+    "status": "state",
+    "proc": "proc",
+    "name": "proc",
+    "pid": "pid",
+    "laddr": "laddr",
+    "raddr": "raddr",
+    "proto": "proto",
+}
+
+PROTOCOLS = {"tcp": socket.SOCK_STREAM, "udp": socket.SOCK_DGRAM}
+
+
+class CidrSet:
+    """IP 网段集合：按前缀长度分组保存网络号，判断时每种前缀长度只查一次哈希表"""
+
+    def __init__(self, networks=()):
+        # 地址族 -> [(前缀长度, 地址位数 - 前缀长度, 网络号集合)]
+        self._prefixes = {}
+        self._addresses = {}  # 已解析的地址缓存
+        for network in networks:
+            self.add(network)
+
+    def add(self, network):
+        """加入一个网段（10.0.0.0/8）或单个地址，格式错误时抛出 ValueError"""
+        address, _, prefix = network.strip().partition("/")
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        bits = 128 if family == socket.AF_INET6 else 32
+        try:
+            value = int.from_bytes(socket.inet_pton(family, address), "big")
+            length = int(prefix) if prefix else bits
+        except (OSError, ValueError):
+            raise ValueError(f"无效的地址或网段: {network}")
+        if not 0 <= length <= bits:
+            raise ValueError(f"无效的网段前缀: {network}")
+
+        shift = bits - length
+        entries = self._prefixes.setdefault(family, [])
+        for entry in entries:
+            if entry[0] == length:
+                entry[2].add(value >> shift)
+                break
+        else:
+            entries.append((length, shift, {value >> shift}))
+            entries.sort(key=lambda entry: entry[0])
+
+    def _parse(self, ip):
+        """地址转换为 (地址族, 整数)，结果缓存"""
+        parsed = self._addresses.get(ip)
+        if parsed is None:
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            try:
+                value = int.from_bytes(socket.inet_pton(family, ip.split("%")[0]), "big")
+            except OSError:
+                value = None
+            # IPv4 映射的 IPv6 地址（::ffff:a.b.c.d）按 IPv4 地址匹配
+            if family == socket.AF_INET6 and value is not None and value >> 32 == 0xffff:
+                family, value = socket.AF_INET, value & 0xffffffff
+            parsed = self._addresses[ip] = (family, value)
+        return parsed
+
+    def __contains__(self, ip):
+        family, value = self._parse(ip)
+        if value is None:
+            return False
+        for _, shift, networks in self._prefixes.get(family, ()):
+            if value >> shift in networks:
+                return True
+        return False
+
+
+def parse_states(value):
+    """解析状态列表，接受英文状态名或界面中的中文选项"""
+    states = set()
+    for part in value.split(","):
+        state = STATUS_OPTIONS.get(part.strip(), part.strip()).upper()
+        if state not in PROC_TCP_STATES.values() and state != "NONE":
+            raise ValueError(f"未知的状态: {part}")
+        states.add(state)
+    return frozenset(states)
+
+
+class ConnectionQuery:
+    """编译后的连接查询
+
+    ports 和 states 是所有条件共同要求的端口集合和状态集合（没有限制时为 None），
+    可以交给 take_snapshot 预先过滤；matches(row, name_of) 判断一条连接是否满足全部条件，
+    只有查询包含 proc 条件时才会调用 name_of(pid) 获取进程名。
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.ports = None
+        self.states = None
+        self.needs_names = False
+        self.fields = set()  # 查询中出现过的字段（包括取反的条件）
+        conditions = []
+
+        for token in self.text.split():
+            negate = token.startswith("!")
+            if negate:
+                token = token[1:]
+            field, sep, value = token.partition(":")
+            if not sep:
+                field, value = "port", token
+            field = QUERY_FIELDS.get(field.lower())
+            if field is None or not value:
+                raise ValueError(f"无法识别的查询条件: {token}")
+            conditions.append((field, negate, value))
+            self.fields.add(field)
+
+        # 每个字段的条件合并为一个集合（同一字段出现多次时取交集）
+        port_sets = []
+        states = None
+        proc_names = []
+        proc_regexes = []
+        pids = None
+        laddrs = []
+        raddrs = []
+        protocols = None
+        negated = []
+        for field, negate, value in conditions:
+            if negate:
+                negated.append(self._compile_single(field, value))
+                continue
+            if field == "port":
+                try:
+                    port_sets.append(parse_port_input(value))
+                except ValueError:
+                    raise ValueError(f"无效的端口: {value}")
+            elif field == "state":
+                parsed = parse_states(value)
+                states = parsed if states is None else states & parsed
+            elif field == "proc":
+                name_set, regex = self._parse_names(value)
+                proc_names.append(name_set)
+                proc_regexes.append(regex)
+            elif field == "pid":
+                parsed = self._parse_pids(value)
+                pids = parsed if pids is None else pids & parsed
+            elif field == "laddr":
+                laddrs.append(CidrSet(value.split(",")))
+            elif field == "raddr":
+                raddrs.append(CidrSet(value.split(",")))
+            else:
+                parsed = self._parse_protocols(value)
+                protocols = parsed if protocols is None else protocols & parsed
+
+        if len(port_sets) == 1:
+            self.ports = port_sets[0]
+        elif port_sets:
+            # 多个端口条件取交集，交集之外的端口不会匹配
+            common = set(port_sets[0])
+            for port_set in port_sets[1:]:
+                common &= set(port_set)
+            self.ports = PortSet.from_ports(common)
+        self.states = states
+        self.needs_names = bool(proc_names) or any(needs for needs, _ in negated)
+        procs = list(zip(proc_names, proc_regexes))
+        ports = self.ports
+        negated = [match for _, match in negated]
+
+        def matches(row, name_of=None):
+            if ports is not None and row.port not in ports:
+                return False
+            if states is not None and row.status not in states:
+                return False
+            if protocols is not None and row.type not in protocols:
+                return False
+            if pids is not None and row.pid not in pids:
+                return False
+            for cidrs in laddrs:
+                if row.laddr.ip not in cidrs:
+                    return False
+            for cidrs in raddrs:
+                if not row.raddr or row.raddr.ip not in cidrs:
+                    return False
+            if procs:
+                name = (name_of(row.pid) or "").lower()
+                for name_set, regex in procs:
+                    if name not in name_set and (regex is None or not regex.search(name)):
+                        return False
+            for match in negated:
+                if match(row, name_of):
+                    return False
+            return True
+
+        self.matches = matches
+
+    def _compile_single(self, field, value):
+        """取反条件：返回 (是否需要进程名, 判断函数)"""
+        query = ConnectionQuery(f"{field}:{value}")
+        return query.needs_names, query.matches
+
+    @staticmethod
+    def _parse_names(value):
+        """进程名条件：精确名称集合和正则表达式（~ 开头的值），不区分大小写"""
+        names = set()
+        patterns = []
+        for part in value.split(","):
+            if part.startswith("~"):
+                patterns.append(f"(?:{part[1:]})")
+            elif part:
+                names.add(part.lower())
+        try:
+            regex = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+        except re.error:
+            raise ValueError(f"无效的正则表达式: {value}")
+        return names, regex
+
+    @staticmethod
+    def _parse_pids(value):
+        try:
+            return frozenset(int(part) for part in value.split(","))
+        except ValueError:
+            raise ValueError(f"无效的进程ID: {value}")
+
+    @staticmethod
+    def _parse_protocols(value):
+        try:
+            return frozenset(PROTOCOLS[part.lower()] for part in value.split(","))
+        except KeyError:
+            raise ValueError(f"未知的协议: {value}")
+
+    @property
+    def status(self):
+        """可以交给 take_snapshot 预先过滤的单个状态，否则为 ALL"""
+        if self.states is not None and len(self.states) == 1:
+            return next(iter(self.states))
+        return "ALL"
+
+    def filter(self, rows, name_of=None):
+        """遍历一次 rows，返回满足条件的连接"""
+        matches = self.matches
+        return [row for row in rows if matches(row, name_of)]
+
+    def __eq__(self, other):
+        return isinstance(other, ConnectionQuery) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return f"ConnectionQuery({self.text!r})"
+
+
+def compile_query(text):
+    """编译查询文本，格式错误时抛出 ValueError"""
+    return ConnectionQuery(text)
+
+
+def is_query(text):
+    """输入是否为查询语言（包含 字段:值 形式的条件）"""
+    return ":" in text
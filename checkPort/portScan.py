@@ -0,0 +1,1445 @@
+"""端口扫描核心：连接表快照、索引查询、进程信息缓存和后台扫描
+
+不依赖 tkinter，也可以在命令行中直接使用，结果逐行输出为 NDJSON 或 CSV：
+
+    python portScan.py 8080
+    python portScan.py 8000-8010 --status LISTEN --format csv
+    python portScan.py 80,443 --backend proc
+    python portScan.py --status ESTABLISHED --group-by raddr
+    python portScan.py --query "port:8000-8100,9200 state:LISTEN,CLOSE_WAIT proc:~java raddr:10.0.0.0/8"
+    python portScan.py 8000-9000 --probe 10.0.0.5,10.0.0.6 --timeout 1
+    python portScan.py --record history.db --interval 5
+    python portScan.py 5432 --history history.db --since 02:00 --until 02:15
+"""
+import argparse
+import bisect
+import contextlib
+import csv
+import ipaddress
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+import psutil
+
+# 快照中的一条连接记录
+SocketRow = namedtuple("SocketRow", ["port", "pid", "status", "laddr", "raddr", "family", "type"])
+
+# 状态筛选选项：显示文本与实际值的映射（界面下拉框和命令行共用）
+STATUS_OPTIONS = {
+    "全部状态": "ALL",
+    "监听": "LISTEN",
+    "已建立": "ESTABLISHED",
+    "等待关闭": "CLOSE_WAIT",
+    "时间等待": "TIME_WAIT"
+}
+
+# 与 psutil.net_connections 返回值结构相同的连接记录和地址
+Connection = namedtuple("Connection", ["fd", "family", "type", "laddr", "raddr", "status", "pid"])
+Address = namedtuple("Address", ["ip", "port"])
+
+# 两次快照之间的差异：新出现的连接、消失的连接，以及前后各状态的连接数
+SnapshotDiff = namedtuple("SnapshotDiff", ["added", "removed", "old_counts", "new_counts"])
+
+# 终止进程的结果，outcome 取值见 terminate_processes
+KillResult = namedtuple("KillResult", ["pid", "outcome", "error"])
+
+# 缓存的进程信息
+ProcessInfo = namedtuple("ProcessInfo", ["pid", "create_time", "name", "cmdline", "username", "exe"])
+
+# 进程资源占用的一次采样，无法读取的字段为 None；CPU 使用率和读写速率（字节/秒）由前后两次采样计算
+ProcessSample = namedtuple("ProcessSample", ["pid", "cpu_percent", "rss", "num_fds", "num_threads",
+                                             "read_rate", "write_rate"])
+
+
+class PortSet:
+    """端口集合，以合并后的闭区间保存，支持 O(log n) 的成员判断"""
+
+    def __init__(self, intervals=()):
+        merged = []
+        for start, end in sorted((min(a, b), max(a, b)) for a, b in intervals):
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        self.intervals = [tuple(item) for item in merged]
+        self._starts = [start for start, _ in self.intervals]
+
+    @classmethod
+    def from_ports(cls, ports):
+        """由端口列表构造"""
+        return cls((port, port) for port in ports)
+
+    def __contains__(self, port):
+        index = bisect.bisect_right(self._starts, port) - 1
+        return index >= 0 and port <= self.intervals[index][1]
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def first_outside(self, low, high):
+        """返回第一个不在 [low, high] 内的端口，全部合法时返回 None"""
+        if not self.intervals:
+            return None
+        if self.intervals[0][0] < low:
+            return self.intervals[0][0]
+        if self.intervals[-1][1] > high:
+            return self.intervals[-1][1]
+        return None
+
+
+def parse_port_input(port_input):
+    """解析端口输入（8080、8000-8010、8080,8000,3306 或 8000-8100,9200），格式错误时抛出 ValueError"""
+    intervals = []
+    for part in port_input.split(','):
+        if '-' in part:
+            # 端口范围
+            start, end = map(int, part.split('-'))
+        else:
+            # 单个端口
+            start = end = int(part)
+        intervals.append((start, end))
+    return PortSet(intervals)
+
+
+class ConnectionSnapshot:
+    """连接表快照：遍历一次连接表，按端口、进程、状态和远端地址建立索引"""
+
+    def __init__(self, connections):
+        self.rows = []
+        self.by_port = {}
+        self.by_pid = {}
+        self.by_status = {}
+        self.by_raddr = {}
+
+        for conn in connections:
+            if not conn.laddr:
+                continue
+            status = conn.status.upper()
+            row = SocketRow(conn.laddr.port, conn.pid, status, conn.laddr,
+                            conn.raddr or None, conn.family, conn.type)
+            index = len(self.rows)
+            self.rows.append(row)
+            self.by_port.setdefault(row.port, []).append(index)
+            self.by_pid.setdefault(row.pid, []).append(index)
+            self.by_status.setdefault(status, []).append(index)
+            if row.raddr:
+                self.by_raddr.setdefault(row.raddr.ip, []).append(index)
+
+        # 已占用端口的有序列表，用于区间查找
+        self.ports = sorted(self.by_port)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ports_in(self, port_set):
+        """返回落在端口集合内的已占用端口（有序）"""
+        found = []
+        for start, end in port_set.intervals:
+            lo = bisect.bisect_left(self.ports, start)
+            hi = bisect.bisect_right(self.ports, end)
+            found.extend(self.ports[lo:hi])
+        return found
+
+    def query(self, ports=None, status="ALL"):
+        """按端口集合和状态查询，结果按端口排序，同一端口内保持原始顺序"""
+        status = status.upper()
+        if ports is None:
+            if status == "ALL":
+                indexes = range(len(self.rows))
+            else:
+                indexes = self.by_status.get(status, [])
+            return sorted((self.rows[i] for i in indexes), key=lambda row: row.port)
+
+        result = []
+        for port in self.ports_in(ports):
+            for index in self.by_port[port]:
+                row = self.rows[index]
+                if status == "ALL" or row.status == status:
+                    result.append(row)
+        return result
+
+
+class ScanTimings:
+    """一次扫描各阶段的耗时（秒）和计数，同一阶段多次计时时累加
+
+    阶段名称：dump（读取连接表）、owners（查找套接字所属进程）、index（建立快照索引）、
+    names（查询进程名）、filter（筛选和比较快照）、ui（更新界面列表）。
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """计时上下文"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    @property
+    def total(self):
+        """从创建到现在的总耗时"""
+        return time.perf_counter() - self._started
+
+    def to_record(self):
+        """结构化的日志记录（毫秒）"""
+        record = {"total_ms": round(self.total * 1000, 2)}
+        record.update((f"{name}_ms", round(seconds * 1000, 2)) for name, seconds in self.stages.items())
+        record.update(self.counters)
+        return record
+
+
+def format_timings_log(timings):
+    """一次扫描的结构化日志行"""
+    return "scan_timings " + json.dumps(timings.to_record(), ensure_ascii=False)
+
+
+def peak_rss_kb():
+    """进程启动以来常驻内存的峰值（KB），无法读取时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource 模块，使用 psutil 提供的工作集峰值（字节）
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return None if peak is None else round(peak / 1024, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss 在 Linux 上以 KB 为单位，在 macOS 上以字节为单位
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak, 1)
+
+
+def timed(timings, name):
+    """timings 为 ScanTimings 时计时阶段 name，为 None 时不计时"""
+    if timings is None:
+        return contextlib.nullcontext()
+    return timings.stage(name)
+
+
+# /proc/net 中的 TCP 状态码
+PROC_TCP_STATES = {
+    "01": "ESTABLISHED",
+    "02": "SYN_SENT",
+    "03": "SYN_RECV",
+    "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2",
+    "06": "TIME_WAIT",
+    "07": "CLOSE",
+    "08": "CLOSE_WAIT",
+    "09": "LAST_ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+}
+
+# 连接类型对应的 /proc/net 文件（与 psutil 的 kind 参数一致）
+_TCP4 = ("tcp", socket.AF_INET, socket.SOCK_STREAM)
+_TCP6 = ("tcp6", socket.AF_INET6, socket.SOCK_STREAM)
+_UDP4 = ("udp", socket.AF_INET, socket.SOCK_DGRAM)
+_UDP6 = ("udp6", socket.AF_INET6, socket.SOCK_DGRAM)
+PROC_NET_FILES = {
+    "inet": (_TCP4, _TCP6, _UDP4, _UDP6),
+    "inet4": (_TCP4, _UDP4),
+    "inet6": (_TCP6, _UDP6),
+    "tcp": (_TCP4, _TCP6),
+    "tcp4": (_TCP4,),
+    "tcp6": (_TCP6,),
+    "udp": (_UDP4, _UDP6),
+    "udp4": (_UDP4,),
+    "udp6": (_UDP6,),
+}
+
+
+def decode_proc_address(address, family):
+    """将 /proc/net 中的 "0100007F:1F90" 转换为 Address，端口为 0 时返回空元组"""
+    ip, port = address.split(':')
+    port = int(port, 16)
+    if not port:
+        return ()
+    raw = bytes.fromhex(ip)
+    if family == socket.AF_INET:
+        raw = raw[::-1] if sys.byteorder == "little" else raw
+    elif sys.byteorder == "little":
+        # IPv6 地址按 4 个 32 位字分别以主机字节序存放
+        raw = b"".join(raw[i:i + 4][::-1] for i in range(0, 16, 4))
+    return Address(socket.inet_ntop(family, raw), port)
+
+
+def find_socket_owners(inodes, proc_root="/proc"):
+    """遍历 /proc/<pid>/fd，返回 {inode: (pid, fd)}，找齐所有 inode 后提前结束"""
+    owners = {}
+    if not inodes:
+        return owners
+    for entry in os.listdir(proc_root):
+        if not entry.isdigit():
+            continue
+        fd_dir = f"{proc_root}/{entry}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            # 进程已退出或无权访问
+            continue
+        for fd in fds:
+            try:
+                link = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if not link.startswith("socket:["):
+                continue
+            inode = int(link[8:-1])
+            if inode in inodes and inode not in owners:
+                owners[inode] = (int(entry), int(fd))
+                if len(owners) == len(inodes):
+                    return owners
+    return owners
+
+
+class SocketOwnerIndex:
+    """在多次扫描之间保留的套接字 inode → (pid, fd) 索引（仅 Linux）
+
+    每次查询前只重新读取新出现的进程和 fd 数量发生变化的进程，
+    并移除已退出的进程。fd 数量不变但更换了套接字的进程由查询时的
+    补充扫描处理：仍有 inode 找不到所属进程时，再逐个读取其余进程，
+    找齐后提前结束。补充扫描后仍找不到的 inode（例如属于无权访问的
+    进程）会被记住，下次不再为它们补充扫描。可以在多个线程中使用。
+    """
+
+    def __init__(self, proc_root="/proc"):
+        self.proc_root = proc_root
+        self.rescanned = 0  # 最近一次查询重新读取的进程数
+        self._processes = {}  # pid -> (fd 数量, {inode: fd})
+        self._owners = {}  # inode -> (pid, fd)
+        self._unowned = set()  # 补充扫描后仍找不到所属进程的 inode
+        self._lock = threading.Lock()
+
+    def resolve(self, inodes):
+        """返回 {inode: (pid, fd)}，找不到所属进程的 inode 不在结果中"""
+        with self._lock:
+            rescanned = self._refresh()
+            owners = {inode: self._owners[inode] for inode in inodes if inode in self._owners}
+            missing = set(inodes) - owners.keys() - self._unowned
+            if missing:
+                for pid in list(self._processes):
+                    if pid in rescanned:
+                        continue
+                    rescanned.add(pid)
+                    self._scan_process(pid, self._fd_count(pid))
+                    for inode in missing & self._processes.get(pid, (0, {}))[1].keys():
+                        owners[inode] = self._owners[inode]
+                    missing -= owners.keys()
+                    if not missing:
+                        break
+            # 保留本次仍在查询的、之前找不到所属进程的 inode，丢弃已经不再出现的
+            self._unowned = (self._unowned | missing) & (set(inodes) - owners.keys())
+            self.rescanned = len(rescanned)
+            return owners
+
+    def _refresh(self):
+        """移除已退出的进程，重新读取新进程和 fd 数量变化的进程，返回读取过的 pid 集合"""
+        alive = {int(entry) for entry in os.listdir(self.proc_root) if entry.isdigit()}
+        for pid in self._processes.keys() - alive:
+            self._forget(pid)
+
+        rescanned = set()
+        for pid in alive:
+            count = self._fd_count(pid)
+            if count is None:
+                self._forget(pid)
+                continue
+            known = self._processes.get(pid)
+            if known is None or known[0] != count:
+                rescanned.add(pid)
+                self._scan_process(pid, count)
+        return rescanned
+
+    def _fd_count(self, pid):
+        """返回进程打开的 fd 数量，进程已退出或无权访问时返回 None"""
+        fd_dir = f"{self.proc_root}/{pid}/fd"
+        try:
+            # Linux 6.2 起 /proc/<pid>/fd 的 st_size 即为 fd 数量，旧内核为 0
+            count = os.stat(fd_dir).st_size
+            return count if count else len(os.listdir(fd_dir))
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            return None
+
+    def _scan_process(self, pid, count):
+        """重新读取一个进程的全部套接字 fd，count 为读取前的 fd 数量"""
+        fd_dir = f"{self.proc_root}/{pid}/fd"
+        self._forget(pid)
+        if count is None:
+            return
+        try:
+            fds = os.listdir(fd_dir)
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            return
+        sockets = {}
+        for fd in fds:
+            try:
+                link = os.readlink(f"{fd_dir}/{fd}")
+            except OSError:
+                continue
+            if link.startswith("socket:["):
+                inode = int(link[8:-1])
+                sockets[inode] = int(fd)
+                self._owners.setdefault(inode, (pid, int(fd)))
+        self._processes[pid] = (count, sockets)
+
+    def _forget(self, pid):
+        """移除一个进程及其套接字"""
+        known = self._processes.pop(pid, None)
+        if known is None:
+            return
+        for inode in known[1]:
+            if self._owners.get(inode, (None,))[0] == pid:
+                del self._owners[inode]
+
+
+def resolve_socket_owners(inodes, owner_index=None, proc_root="/proc"):
+    """查找 inode 所属进程，提供 owner_index 时使用增量索引"""
+    if owner_index is not None:
+        return owner_index.resolve(inodes)
+    return find_socket_owners(inodes, proc_root)
+
+
+def read_proc_net(kind='inet', ports=None, status="ALL", proc_root="/proc", owner_index=None, timings=None):
+    """直接解析 /proc/net 下的套接字表（仅 Linux）
+
+    解析时先按本地端口和状态过滤，只为匹配的行解码地址，
+    也只为匹配行的 inode 查找所属进程。返回 Connection 列表。
+    """
+    with timed(timings, "dump"):
+        matched = _parse_proc_net(kind, ports, status.upper(), proc_root)
+    with timed(timings, "owners"):
+        owners = resolve_socket_owners({item[5] for item in matched if item[5]}, owner_index, proc_root)
+    with timed(timings, "dump"):
+        connections = []
+        for family, sock_type, local, remote, state, inode in matched:
+            pid, fd = owners.get(inode, (None, -1))
+            if sock_type == socket.SOCK_STREAM:
+                state = PROC_TCP_STATES.get(state, "NONE")
+            else:
+                state = "NONE"
+            connections.append(Connection(fd, family, sock_type, decode_proc_address(local, family),
+                                          decode_proc_address(remote, family), state, pid))
+    return connections
+
+
+def _parse_proc_net(kind, ports, status, proc_root):
+    """读取 /proc/net 中满足条件的行，返回 [(family, type, 本地地址, 远端地址, 状态码, inode)]"""
+    matched = []
+    for name, family, sock_type in PROC_NET_FILES[kind]:
+        if sock_type == socket.SOCK_STREAM:
+            wanted_states = None if status == "ALL" else {
+                code for code, state in PROC_TCP_STATES.items() if state == status}
+            if wanted_states is not None and not wanted_states:
+                continue
+        elif status not in ("ALL", "NONE"):
+            # UDP 套接字没有连接状态
+            continue
+        else:
+            wanted_states = None
+
+        try:
+            f = open(os.path.join(proc_root, "net", name))
+        except FileNotFoundError:
+            # 系统未启用 IPv6
+            continue
+        with f:
+            f.readline()  # 跳过表头
+            for line in f:
+                # 只拆出前几列，其余列仅在匹配时再拆
+                _, local, remote, state, rest = line.split(None, 4)
+                port = int(local[-4:], 16)
+                if not port or (ports is not None and port not in ports):
+                    continue
+                if wanted_states is not None and state not in wanted_states:
+                    continue
+                matched.append((family, sock_type, local, remote, state, int(rest.split()[5])))
+    return matched
+
+
+# netlink sock_diag 相关常量（linux/netlink.h、linux/sock_diag.h、linux/inet_diag.h）
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_REQ_BYTECODE = 1
+INET_DIAG_BC_JMP = 1
+INET_DIAG_BC_S_GE = 2
+INET_DIAG_BC_S_LE = 3
+
+# 内核中的 TCP 状态编号（TCP_NEW_SYN_RECV 按 SYN_RECV 显示，与 /proc/net 一致）
+SOCK_DIAG_TCP_STATES = {
+    1: "ESTABLISHED",
+    2: "SYN_SENT",
+    3: "SYN_RECV",
+    4: "FIN_WAIT1",
+    5: "FIN_WAIT2",
+    6: "TIME_WAIT",
+    7: "CLOSE",
+    8: "CLOSE_WAIT",
+    9: "LAST_ACK",
+    10: "LISTEN",
+    11: "CLOSING",
+    12: "SYN_RECV",
+}
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_NLATTR = struct.Struct("=HH")
+_BC_OP = struct.Struct("=BBH")
+# inet_diag_req_v2：family, protocol, ext, pad, states, 以及全零的 inet_diag_sockid
+_INET_DIAG_REQ = struct.Struct("=BBBxI48x")
+# inet_diag_msg：family, state, timer, retrans, sockid(sport, dport, src, dst, if, cookie),
+# expires, rqueue, wqueue, uid, inode
+_INET_DIAG_MSG = struct.Struct("=BBBB2s2s16s16sI8sIIIII")
+
+# 套接字类型对应的 IP 协议号
+_SOCK_DIAG_PROTOCOLS = {
+    socket.SOCK_STREAM: socket.IPPROTO_TCP,
+    socket.SOCK_DGRAM: socket.IPPROTO_UDP,
+}
+
+
+def build_port_bytecode(ports):
+    """将端口集合编译为 inet_diag 过滤字节码（本地端口落在任一区间内即匹配）
+
+    每个区间编译为 S_GE、S_LE 两个比较，区间之间用 JMP 连接：
+    比较成功则顺序执行，区间匹配后由 JMP 跳到末尾表示接受；
+    比较失败则跳到下一个区间，最后一个区间失败时跳过末尾 4 字节表示拒绝。
+    """
+    intervals = ports.intervals
+    block = 16  # S_GE 和 S_LE 各占 8 字节
+    total = (block + 4) * (len(intervals) - 1) + block
+    code = bytearray()
+    for i, (start, end) in enumerate(intervals):
+        last = i == len(intervals) - 1
+        # 两个比较失败时都跳到下一个区间（或越过末尾表示拒绝）
+        code += _BC_OP.pack(INET_DIAG_BC_S_GE, 8, block + 4) + _BC_OP.pack(0, 0, start)
+        code += _BC_OP.pack(INET_DIAG_BC_S_LE, 8, block + 4 - 8) + _BC_OP.pack(0, 0, end)
+        if not last:
+            offset = len(code)
+            code += _BC_OP.pack(INET_DIAG_BC_JMP, 4, total - offset)
+    return bytes(code)
+
+
+def _sock_diag_dump(family, protocol, states, bytecode=None):
+    """发送一次 SOCK_DIAG_BY_FAMILY 转储请求，逐条返回 inet_diag_msg 的字段"""
+    payload = _INET_DIAG_REQ.pack(family, protocol, 0, states)
+    if bytecode:
+        payload += _NLATTR.pack(_NLATTR.size + len(bytecode), INET_DIAG_REQ_BYTECODE) + bytecode
+    request = _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), SOCK_DIAG_BY_FAMILY,
+                             NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + payload
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG) as sock:
+        sock.bind((0, 0))
+        sock.sendall(request)
+        while True:
+            data = sock.recv(1 << 16)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return
+                if msg_type == NLMSG_ERROR:
+                    error = -struct.unpack_from("=i", data, offset + _NLMSGHDR.size)[0]
+                    raise OSError(error, os.strerror(error))
+                if msg_type == SOCK_DIAG_BY_FAMILY:
+                    yield _INET_DIAG_MSG.unpack_from(data, offset + _NLMSGHDR.size)
+                offset += (length + 3) & ~3
+                if not length:
+                    return
+
+
+def read_sock_diag(kind='inet', ports=None, status="ALL", owner_index=None, timings=None):
+    """通过 netlink sock_diag 枚举套接字（仅 Linux）
+
+    状态位图和端口区间在内核中过滤，只有匹配的套接字会传到用户态。
+    UDP 的 udp_diag 模块未加载时，该部分退回 /proc/net 解析。
+    """
+    status = status.upper()
+    if ports is not None and not ports:
+        return []
+    bytecode = build_port_bytecode(ports) if ports is not None else None
+    matched = []  # (family, type, 本地地址, 远端地址, 状态, inode)
+    for name, family, sock_type in PROC_NET_FILES[kind]:
+        if sock_type == socket.SOCK_STREAM:
+            states = 0
+            for number, state in SOCK_DIAG_TCP_STATES.items():
+                if status == "ALL" or state == status:
+                    states |= 1 << number
+            if not states:
+                continue
+        elif status not in ("ALL", "NONE"):
+            # UDP 套接字没有连接状态
+            continue
+        else:
+            states = 0xFFFFFFFF
+
+        try:
+            with timed(timings, "dump"):
+                messages = list(_sock_diag_dump(family, _SOCK_DIAG_PROTOCOLS[sock_type], states, bytecode))
+        except OSError:
+            if sock_type != socket.SOCK_DGRAM:
+                raise
+            fallback_kind = name + "4" if name == "udp" else name
+            matched.extend(("proc", row) for row in read_proc_net(fallback_kind, ports, status,
+                                                                  owner_index=owner_index, timings=timings))
+            continue
+
+        with timed(timings, "dump"):
+            address_size = 4 if family == socket.AF_INET else 16
+            for (_, state, _, _, sport, dport, src, dst, _, _, _, _, _, _, inode) in messages:
+                sport = int.from_bytes(sport, "big")
+                if not sport:
+                    continue
+                dport = int.from_bytes(dport, "big")
+                laddr = Address(socket.inet_ntop(family, src[:address_size]), sport)
+                raddr = Address(socket.inet_ntop(family, dst[:address_size]), dport) if dport else ()
+                if sock_type == socket.SOCK_STREAM:
+                    state = SOCK_DIAG_TCP_STATES.get(state, "NONE")
+                else:
+                    state = "NONE"
+                matched.append((family, sock_type, laddr, raddr, state, inode))
+
+    with timed(timings, "owners"):
+        owners = resolve_socket_owners({item[5] for item in matched if item[0] != "proc" and item[5]},
+                                       owner_index)
+    connections = []
+    for item in matched:
+        if item[0] == "proc":
+            connections.append(item[1])
+            continue
+        family, sock_type, laddr, raddr, state, inode = item
+        pid, fd = owners.get(inode, (None, -1))
+        connections.append(Connection(fd, family, sock_type, laddr, raddr, state, pid))
+    return connections
+
+
+def sock_diag_available():
+    """当前系统是否支持 netlink sock_diag"""
+    return sys.platform.startswith("linux") and hasattr(socket, "AF_NETLINK")
+
+
+def proc_net_available():
+    """当前系统是否可以直接读取 /proc/net"""
+    return sys.platform.startswith("linux") and os.path.exists("/proc/net/tcp")
+
+
+# 可选的连接枚举方式
+BACKENDS = ("auto", "netlink", "proc", "psutil")
+
+
+def list_connections(kind='inet', ports=None, status="ALL", backend="auto", owner_index=None, timings=None):
+    """获取连接列表
+
+    backend 为 "netlink" 时通过 sock_diag 在内核中按端口和状态过滤，
+    为 "proc" 时直接解析 /proc/net（在解析时过滤），为 "psutil" 时使用
+    psutil.net_connections。"auto" 在 Linux 上依次尝试 netlink、/proc/net，
+    失败则退回 psutil。psutil 的结果不做预过滤，由 ConnectionSnapshot.query
+    完成筛选。owner_index 为 SocketOwnerIndex 时，netlink 和 /proc/net
+    方式用它增量查找套接字所属进程。timings 为 ScanTimings 时记录各阶段耗时。
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的连接枚举方式: {backend}")
+    if backend in ("auto", "netlink") and sock_diag_available():
+        try:
+            return read_sock_diag(kind, ports, status, owner_index, timings)
+        except (OSError, ValueError, struct.error):
+            pass
+    if backend in ("auto", "netlink", "proc") and proc_net_available():
+        try:
+            return read_proc_net(kind, ports, status, owner_index=owner_index, timings=timings)
+        except (OSError, ValueError, IndexError):
+            pass
+    with timed(timings, "dump"):
+        return psutil.net_connections(kind=kind)
+
+
+def iter_connections(kind='inet', ports=None, status="ALL", backend="auto", owner_index=None, timings=None):
+    """逐个套接字表获取连接，每读完一个表（例如 IPv4 的 TCP）就返回其中的连接
+
+    结果与 list_connections 相同，但第一批连接不必等所有表读完，适合流式输出。
+    所属进程按表分批查找，提供 owner_index 时后面的表只重新读取有变化的进程。
+    psutil 方式一次返回全部连接。
+    """
+    if backend == "psutil" or not (sock_diag_available() or proc_net_available()):
+        yield from list_connections(kind, ports, status, backend, owner_index, timings)
+        return
+    for name, _, _ in PROC_NET_FILES[kind]:
+        table = name if name.endswith("6") else name + "4"
+        yield from list_connections(table, ports, status, backend, owner_index, timings)
+
+
+def take_snapshot(kind='inet', ports=None, status="ALL", backend="auto", owner_index=None, timings=None):
+    """获取当前连接表快照，ports 和 status 会尽量下推到枚举阶段"""
+    connections = list_connections(kind, ports, status, backend, owner_index, timings)
+    with timed(timings, "index"):
+        return ConnectionSnapshot(connections)
+
+
+def compare_backends(kind='inet', ports=None, status="ALL", backend="proc"):
+    """在本机上对比指定枚举方式与 psutil 的结果
+
+    返回 (仅在 backend 中出现的连接, 仅在 psutil 中出现的连接)，
+    两次读取之间新建或关闭的连接也会出现在差异中。
+    """
+    def key(row):
+        return (row.family, row.type, row.laddr, row.raddr or (), row.status, row.pid)
+
+    backend_rows = take_snapshot(kind, ports, status, backend=backend).query(ports, status)
+    psutil_rows = take_snapshot(kind, backend="psutil").query(ports, status)
+    backend_keys = {key(row) for row in backend_rows}
+    psutil_keys = {key(row) for row in psutil_rows}
+    return backend_keys - psutil_keys, psutil_keys - backend_keys
+
+
+def socket_key(row):
+    """连接的身份：协议、两端地址和所属进程（不含状态）"""
+    return (row.family, row.type, row.laddr, row.raddr or (), row.pid)
+
+
+def diff_snapshots(old, new, ports=None, status="ALL", match=None):
+    """比较两次快照中满足同一查询条件的连接，返回 SnapshotDiff
+
+    match(row) 为附加的筛选条件（例如编译后的查询）。
+    """
+    old_rows = {socket_key(row): row for row in old.query(ports, status) if match is None or match(row)}
+    new_rows = {socket_key(row): row for row in new.query(ports, status) if match is None or match(row)}
+    added = [row for key, row in new_rows.items() if key not in old_rows]
+    removed = [row for key, row in old_rows.items() if key not in new_rows]
+    return SnapshotDiff(added, removed,
+                        Counter(row.status for row in old_rows.values()),
+                        Counter(row.status for row in new_rows.values()))
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values):
+    """把一组数值画成一行走势图，最小值为 ▁，最大值为 █"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[(value - low) * (len(SPARK_CHARS) - 1) // (high - low)] for value in values)
+
+
+# 分组方式：按进程、本地端口、远程网段或连接状态
+GROUP_BY = ("process", "port", "raddr", "status")
+REMOTE_PREFIXES = {socket.AF_INET: 24, socket.AF_INET6: 64}
+
+_remote_networks = {}
+
+
+def remote_network(ip):
+    """远程地址所在的网段（IPv4 为 /24，IPv6 为 /64），结果按地址缓存"""
+    network = _remote_networks.get(ip)
+    if network is None:
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        network = str(ipaddress.ip_network(f"{ip}/{REMOTE_PREFIXES[family]}", strict=False))
+        if len(_remote_networks) >= 65536:
+            _remote_networks.clear()
+        _remote_networks[ip] = network
+    return network
+
+
+def group_key(by, row, name=None):
+    """连接在分组方式 by 下的分组键，没有远程地址的连接按 raddr 分组时为 None"""
+    if by == "process":
+        return (row.pid, name)
+    if by == "port":
+        return row.port
+    if by == "raddr":
+        return remote_network(row.raddr.ip) if row.raddr else None
+    return row.status
+
+
+def group_rows(rows, by, names=None, items=None):
+    """遍历一次连接，按 by 分组计数，返回按连接数从多到少排列的 [(分组键, 连接数, 各状态连接数)]
+
+    names 为 {pid: 进程名}，按进程分组时用于区分进程。提供与 rows 一一对应的 items 时，
+    每个分组再附带属于它的 items：[(分组键, 连接数, 各状态连接数, 分组中的 items)]。
+    """
+    names = names or {}
+    counts = Counter()
+    statuses = {}
+    members = {}
+    for position, row in enumerate(rows):
+        key = group_key(by, row, names.get(row.pid))
+        counts[key] += 1
+        status_counts = statuses.get(key)
+        if status_counts is None:
+            status_counts = statuses[key] = Counter()
+            members[key] = []
+        status_counts[row.status] += 1
+        if items is not None:
+            members[key].append(items[position])
+    if items is not None:
+        return [(key, count, statuses[key], members[key]) for key, count in counts.most_common()]
+    return [(key, count, statuses[key]) for key, count in counts.most_common()]
+
+
+def plan_list_update(children, displayed, window):
+    """比较列表中已有的行和新的行 window（[(item_id, values, process_info, tags)]），计算增量更新
+
+    children 为列表中现有行的 item_id，displayed 为 {item_id: (values, tags)}。
+    返回 (wanted, removed, inserts, updates)：wanted 为更新后的 displayed；removed 为要删除的 item_id；
+    inserts 为按位置从小到大排列的 (位置, item_id, values, tags)；updates 为内容变化的 (item_id, values, tags)。
+    内容没有变化的行不出现在 removed、inserts 和 updates 中。
+    """
+    wanted = {item_id: (values, tags) for item_id, values, _, tags in window}
+    removed = [item_id for item_id in children if item_id not in wanted]
+    inserts = []
+    updates = []
+    for position, (item_id, values, _, tags) in enumerate(window):
+        old = displayed.get(item_id)
+        if old is None:
+            inserts.append((position, item_id, values, tags))
+        elif old != (values, tags):
+            updates.append((item_id, values, tags))
+    return wanted, removed, inserts, updates
+
+
+def optional_value(getter, default):
+    """读取非必需的进程属性，无权限时返回默认值"""
+    try:
+        return getter()
+    except (psutil.AccessDenied, psutil.ZombieProcess):
+        return default
+
+
+class ProcessCache:
+    """进程信息缓存
+
+    以 (pid, create_time) 为键，PID 被新进程复用时不会拿到旧进程的信息。
+    每个进程的名称、命令行、用户和可执行文件路径在一次 oneshot() 中读取，
+    条目超过 ttl 秒后重新读取，总数超过 max_size 时淘汰最久未使用的条目。
+    可以在多个线程中同时使用。
+    """
+
+    def __init__(self, ttl=60.0, max_size=4096):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (pid, create_time) -> (ProcessInfo, 读取时间)
+        self._create_times = {}  # pid -> create_time
+        self._lock = threading.Lock()
+
+    def get(self, pid):
+        """返回进程信息，进程不存在或无权访问时抛出对应的 psutil 异常"""
+        # 构造 Process 时 psutil 会读取 create_time，用于识别 PID 复用
+        process = psutil.Process(pid)
+        key = (pid, process.create_time())
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        with process.oneshot():
+            info = ProcessInfo(
+                pid=pid,
+                create_time=key[1],
+                name=process.name(),
+                cmdline=optional_value(process.cmdline, []),
+                username=optional_value(process.username, ""),
+                exe=optional_value(process.exe, ""),
+            )
+
+        with self._lock:
+            self.misses += 1
+            # 同一 PID 的旧进程条目已经无效
+            old_time = self._create_times.get(pid)
+            if old_time is not None and old_time != key[1]:
+                self._entries.pop((pid, old_time), None)
+            self._create_times[pid] = key[1]
+            self._entries[key] = (info, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                (old_pid, old_time), _ = self._entries.popitem(last=False)
+                if self._create_times.get(old_pid) == old_time:
+                    del self._create_times[old_pid]
+        return info
+
+    def invalidate(self, pid):
+        """删除指定 PID 的缓存（例如进程被终止后）"""
+        with self._lock:
+            create_time = self._create_times.pop(pid, None)
+            if create_time is not None:
+                self._entries.pop((pid, create_time), None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._create_times.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def resolve_process_name(pid, process_cache):
+    """获取进程名称，返回 (pid, name)，无法获取时 pid 记为 N/A"""
+    try:
+        if pid:
+            return pid, process_cache.get(pid).name
+        return "N/A", "系统进程"
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return "N/A", "未知进程"
+
+
+class ProcessSampler:
+    """进程资源占用采样器
+
+    每个进程每次采样只进入一次 oneshot()，读取 CPU 时间、常驻内存、打开的文件描述符
+    （Windows 上为句柄）数、线程数和 I/O 计数；CPU 使用率和读写速率由与上一次采样的差值计算，
+    第一次采样时为 None。PID 被新进程复用时重新开始计算。可以在多个线程中使用：
+    同时调用 sample 时后调用的等待前一次完成（例如关闭再打开采样时，被取消的上一次采样还没有退出）。
+    """
+
+    def __init__(self):
+        self._processes = {}  # pid -> psutil.Process
+        self._previous = {}  # pid -> (采样时间, CPU 时间, 读取字节数, 写入字节数)
+        self._lock = threading.Lock()
+
+    def sample(self, pids, cancel_event=None):
+        """对 pids 中的每个进程采样一次，返回 {pid: ProcessSample}，已退出或无权访问的进程不在结果中"""
+        with self._lock:
+            return self._sample(pids, cancel_event)
+
+    def _sample(self, pids, cancel_event):
+        samples = {}
+        for pid in pids:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            try:
+                samples[pid] = self._sample_one(pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._processes.pop(pid, None)
+                self._previous.pop(pid, None)
+
+        # 不再需要采样的进程
+        for pid in list(self._processes):
+            if pid not in samples:
+                del self._processes[pid]
+                self._previous.pop(pid, None)
+        return samples
+
+    def _sample_one(self, pid):
+        process = self._processes.get(pid)
+        if process is None or not process.is_running():
+            # is_running 比较 create_time，PID 被复用时丢弃旧进程的累计值
+            process = self._processes[pid] = psutil.Process(pid)
+            self._previous.pop(pid, None)
+
+        with process.oneshot():
+            cpu_times = process.cpu_times()
+            cpu = cpu_times.user + cpu_times.system
+            rss = process.memory_info().rss
+            num_threads = process.num_threads()
+            num_fds = optional_value(
+                process.num_fds if hasattr(process, "num_fds") else process.num_handles, None)
+            io = optional_value(process.io_counters, None) if hasattr(process, "io_counters") else None
+        now = time.monotonic()
+
+        read_bytes = io.read_bytes if io is not None else None
+        write_bytes = io.write_bytes if io is not None else None
+        cpu_percent = read_rate = write_rate = None
+        previous = self._previous.get(pid)
+        if previous is not None and now > previous[0]:
+            elapsed = now - previous[0]
+            cpu_percent = max(0.0, (cpu - previous[1]) / elapsed * 100)
+            if read_bytes is not None and previous[2] is not None:
+                read_rate = max(0.0, (read_bytes - previous[2]) / elapsed)
+                write_rate = max(0.0, (write_bytes - previous[3]) / elapsed)
+        self._previous[pid] = (now, cpu, read_bytes, write_bytes)
+        return ProcessSample(pid, cpu_percent, rss, num_fds, num_threads, read_rate, write_rate)
+
+
+def terminate_processes(pids, timeout=3, kill_timeout=1, process_cache=None):
+    """同时终止多个进程，返回与 pids 顺序一致的 KillResult 列表
+
+    先向所有进程发送 SIGTERM（Windows 上为 TerminateProcess），在同一个
+    截止时间内一起等待，超时仍未退出的进程再强制结束。outcome 取值：
+    "terminated" 正常终止，"killed" 强制结束，"gone" 进程已经不存在，
+    "denied" 权限不足，"failed" 其他错误（error 为错误信息）。
+    成功结束的进程会从 process_cache 中删除。重复的 pid 只终止一次，每个位置都返回它的结果。
+    """
+    pids = list(pids)
+    results = {}
+    processes = []
+    for pid in dict.fromkeys(pids):
+        try:
+            process = psutil.Process(pid)
+            process.terminate()
+            processes.append(process)
+        except psutil.NoSuchProcess:
+            results[pid] = KillResult(pid, "gone", None)
+        except psutil.AccessDenied:
+            results[pid] = KillResult(pid, "denied", None)
+        except Exception as e:
+            results[pid] = KillResult(pid, "failed", str(e))
+
+    gone, alive = psutil.wait_procs(processes, timeout=timeout)
+    for process in gone:
+        results[process.pid] = KillResult(process.pid, "terminated", None)
+
+    # 超时仍未退出的进程强制结束
+    killed = []
+    for process in alive:
+        try:
+            process.kill()
+            killed.append(process)
+        except psutil.NoSuchProcess:
+            results[process.pid] = KillResult(process.pid, "terminated", None)
+        except psutil.AccessDenied:
+            results[process.pid] = KillResult(process.pid, "denied", None)
+        except Exception as e:
+            results[process.pid] = KillResult(process.pid, "failed", str(e))
+
+    gone, alive = psutil.wait_procs(killed, timeout=kill_timeout)
+    for process in gone:
+        results[process.pid] = KillResult(process.pid, "killed", None)
+    for process in alive:
+        results[process.pid] = KillResult(process.pid, "failed", "强制终止后进程仍未退出")
+
+    if process_cache is not None:
+        for result in results.values():
+            if result.outcome in ("terminated", "killed", "gone"):
+                process_cache.invalidate(result.pid)
+    return [results[pid] for pid in pids]
+
+
+class ScanCancelled(Exception):
+    """扫描被取消，或被更新的查询取代"""
+
+
+class ScanContext:
+    """传给后台任务的上下文，用于检查取消和汇报进度"""
+
+    def __init__(self, scanner, generation, cancel_event):
+        self._scanner = scanner
+        self.generation = generation
+        self.cancel_event = cancel_event
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        """如果扫描已被取消则抛出 ScanCancelled"""
+        if self.cancel_event.is_set():
+            raise ScanCancelled()
+
+    def report(self, done, total):
+        """汇报进度，任务已被取消时丢弃"""
+        if not self.cancel_event.is_set():
+            self._scanner.results.put((self.generation, "progress", (done, total)))
+
+    def post(self, payload):
+        """在任务完成前先送回一部分结果，任务已被取消时丢弃"""
+        if not self.cancel_event.is_set():
+            self._scanner.results.put((self.generation, "partial", payload))
+
+
+class BackgroundScanner:
+    """在后台线程中执行扫描任务，结果放入队列，由界面线程取出
+
+    队列中的消息为 (generation, kind, payload)，kind 取值为
+    "progress"、"partial"、"done"、"error" 或 "cancelled"。提交新任务或调用 cancel 时，
+    尚未完成的旧任务会被取消：之后不再送出它的进度和部分结果，任务即使完成也只送出 "cancelled"。
+    已经在队列中的旧消息可以通过 is_current 过滤。
+    """
+
+    def __init__(self):
+        self.results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cancel_event = None
+
+    def submit(self, job, *args):
+        """提交任务 job(context, *args)，返回本次任务的编号"""
+        with self._lock:
+            if self._cancel_event is not None:
+                self._cancel_event.set()
+            self._generation += 1
+            self._cancel_event = threading.Event()
+            context = ScanContext(self, self._generation, self._cancel_event)
+        thread = threading.Thread(target=self._run, args=(context, job, args), daemon=True)
+        thread.start()
+        return context.generation
+
+    def cancel(self):
+        """取消当前任务"""
+        with self._lock:
+            if self._cancel_event is not None:
+                self._cancel_event.set()
+
+    def is_current(self, generation):
+        """判断消息是否来自最新提交的任务"""
+        return generation == self._generation
+
+    def _run(self, context, job, args):
+        try:
+            result = job(context, *args)
+        except ScanCancelled:
+            self.results.put((context.generation, "cancelled", None))
+        except Exception as e:
+            self.results.put((context.generation, "error", e))
+        else:
+            if context.cancelled:
+                self.results.put((context.generation, "cancelled", None))
+            else:
+                self.results.put((context.generation, "done", result))
+
+
+# 命令行输出的字段
+OUTPUT_FIELDS = ["port", "pid", "name", "status", "type", "local_ip", "local_port", "remote_ip", "remote_port"]
+PROBE_FIELDS = ["host", "port", "status", "latency_ms", "error"]
+GROUP_FIELDS = ["group", "count", "statuses"]
+
+
+def iter_records(ports=None, status="ALL", kind='inet', backend="auto", process_cache=None, owner_index=None,
+                 query=None, timings=None):
+    """逐条生成连接记录（字典），每条记录解析完进程名后立即返回
+
+    不建立快照索引，也不排序，每读完一个套接字表就开始输出，适合命令行流式输出。query 为编译后的 ConnectionQuery，
+    timings 为 ScanTimings 时记录读取连接表、查找所属进程和查询进程名的耗时。
+    """
+    if process_cache is None:
+        process_cache = ProcessCache()
+    status = status.upper()
+    names = {}
+
+    def name_of(pid):
+        if pid not in names:
+            with timed(timings, "names"):
+                names[pid] = resolve_process_name(pid, process_cache)
+        return names[pid][1]
+
+    for conn in iter_connections(kind, ports, status, backend, owner_index, timings):
+        if not conn.laddr:
+            continue
+        # psutil 的结果没有预过滤
+        port = conn.laddr.port
+        if ports is not None and port not in ports:
+            continue
+        if status != "ALL" and conn.status.upper() != status:
+            continue
+        if query is not None:
+            row = SocketRow(port, conn.pid, conn.status.upper(), conn.laddr, conn.raddr or None,
+                            conn.family, conn.type)
+            if not query.matches(row, name_of):
+                continue
+
+        name_of(conn.pid)
+        pid, name = names[conn.pid]
+        yield {
+            "port": port,
+            "pid": None if pid == "N/A" else pid,
+            "name": name,
+            "status": conn.status.upper(),
+            "type": "tcp" if conn.type == socket.SOCK_STREAM else "udp",
+            "local_ip": conn.laddr.ip,
+            "local_port": port,
+            "remote_ip": conn.raddr.ip if conn.raddr else None,
+            "remote_port": conn.raddr.port if conn.raddr else None,
+        }
+
+
+def iter_group_records(by, ports=None, status="ALL", kind='inet', backend="auto", owner_index=None,
+                       query=None, process_cache=None, timings=None):
+    """生成分组统计记录，按连接数从多到少排列"""
+    if process_cache is None:
+        process_cache = ProcessCache()
+    status = status.upper()
+    snapshot = take_snapshot(kind, ports, status, backend, owner_index, timings)
+    names = {}
+
+    def name_of(pid):
+        if pid not in names:
+            with timed(timings, "names"):
+                names[pid] = resolve_process_name(pid, process_cache)[1]
+        return names[pid]
+
+    if query is not None and query.needs_names:
+        # 先查询进程名，使筛选阶段的耗时不包含进程名查询
+        for pid in snapshot.by_pid:
+            name_of(pid)
+    with timed(timings, "filter"):
+        rows = snapshot.query(ports, status)
+        if query is not None:
+            rows = query.filter(rows, name_of)
+    if by == "process":
+        for row in rows:
+            name_of(row.pid)
+    with timed(timings, "filter"):
+        groups = group_rows(rows, by, names)
+    for key, count, statuses in groups:
+        if by == "process":
+            pid, name = key
+            group = f"{name} ({pid if pid is not None else 'N/A'})"
+        else:
+            group = key if key is not None else "-"
+        yield {
+            "group": group,
+            "count": count,
+            "statuses": ";".join(f"{name}={n}" for name, n in statuses.most_common()),
+        }
+
+
+def iter_probe_records(hosts, ports, status="ALL", **options):
+    """逐条生成远程端口探测记录，status 不为 ALL 时只输出开放的端口"""
+    from portProbe import iter_probe
+
+    for result in iter_probe(hosts, ports, **options):
+        if status != "ALL" and result.status != "OPEN":
+            continue
+        yield {
+            "host": result.host,
+            "port": result.port,
+            "status": result.status,
+            "latency_ms": round(result.latency * 1000, 2) if result.latency is not None else None,
+            "error": result.error,
+        }
+
+
+def write_records(records, output_format, out, fields=OUTPUT_FIELDS):
+    """按 NDJSON 或 CSV 格式逐行写出记录，每行写完立即刷新，返回记录数"""
+    count = 0
+    if output_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=fields, lineterminator="\n")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            out.flush()
+            count += 1
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+    return count
+
+
+def parse_status(value):
+    """命令行状态参数：接受英文状态名或界面中的中文选项"""
+    status = STATUS_OPTIONS.get(value, value).upper()
+    if status != "ALL" and status not in PROC_TCP_STATES.values() and status != "NONE":
+        raise argparse.ArgumentTypeError(f"未知的状态: {value}")
+    return status
+
+
+def build_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(
+        prog="portScan",
+        description="查看端口占用情况（无界面模式），结果逐行输出")
+    parser.add_argument("ports", nargs="?", default="",
+                        help="端口号，例如 8080、8000-8010 或 8080,8000,3306，不填表示所有端口")
+    parser.add_argument("-s", "--status", type=parse_status, default="ALL",
+                        help="连接状态，例如 LISTEN、ESTABLISHED 或 监听，默认 ALL")
+    parser.add_argument("-q", "--query",
+                        help="查询条件，例如 \"port:8000-8100,9200 state:LISTEN,CLOSE_WAIT proc:~java raddr:10.0.0.0/8\"")
+    parser.add_argument("-f", "--format", choices=("ndjson", "csv"), default="ndjson",
+                        help="输出格式，默认 ndjson")
+    parser.add_argument("-k", "--kind", choices=sorted(PROC_NET_FILES), default="inet",
+                        help="连接类型，默认 inet")
+    parser.add_argument("-b", "--backend", choices=BACKENDS, default="auto",
+                        help="连接枚举方式，默认 auto")
+    parser.add_argument("-g", "--group-by", choices=GROUP_BY,
+                        help="按进程、本地端口、远程网段或状态分组，只输出每组的连接数")
+    parser.add_argument("--timings", action="store_true",
+                        help="输出结束后向标准错误输出一行各阶段耗时（JSON）")
+    parser.add_argument("--verify", action="store_true",
+                        help="与 psutil 的结果对比，用于检查 --backend 指定的枚举方式")
+
+    probe = parser.add_argument_group("远程探测", "指定 --probe 时主动连接远程主机的端口")
+    probe.add_argument("--probe", metavar="HOSTS",
+                       help="要探测的主机，多个主机用逗号分隔；--status 不为 ALL 时只输出开放的端口")
+    probe.add_argument("--timeout", type=float, default=1.0, help="连接超时（秒），默认 1")
+    probe.add_argument("--concurrency", type=int, default=1000, help="最大并发连接数，默认 1000")
+    probe.add_argument("--rate", type=float, default=None, help="每台主机每秒最多发起的连接数，默认不限")
+
+    history = parser.add_argument_group("历史记录", "持续记录端口占用情况，或查询某段时间内占用端口的进程")
+    history.add_argument("--record", metavar="DB", help="每隔 --interval 秒记录一次快照到 DB，按 Ctrl+C 结束")
+    history.add_argument("--interval", type=float, default=5.0, help="记录间隔（秒），默认 5")
+    history.add_argument("--retention", type=float, default=7.0, help="历史记录保留天数，默认 7")
+    history.add_argument("--history", metavar="DB", help="查询 DB 中的历史记录")
+    history.add_argument("--since", help="查询起始时间，例如 02:00 或 2024-05-01 02:00")
+    history.add_argument("--until", help="查询结束时间，格式同 --since")
+    return parser
+
+
+def parse_ports_argument(parser, port_input):
+    """解析并验证命令行中的端口参数"""
+    if not port_input.strip():
+        return None
+    try:
+        ports = parse_port_input(port_input)
+    except ValueError:
+        parser.error("请输入有效的端口号（例如：8080 或 8000-8010 或 8080,8000,3306）")
+    invalid_port = ports.first_outside(1, 65535)
+    if invalid_port is not None:
+        parser.error(f"端口号 {invalid_port} 超出有效范围 (1-65535)")
+    return ports
+
+
+def record_history(path, ports, status, kind, backend, interval, retention):
+    """持续记录快照到历史数据库，每次记录输出一行统计，直到被中断"""
+    from portHistory import HistoryStore
+
+    store = HistoryStore(path, retention=retention * 24 * 3600)
+    owner_index = SocketOwnerIndex() if proc_net_available() else None
+    process_cache = ProcessCache()
+    try:
+        while True:
+            started = time.monotonic()
+            snapshot = take_snapshot(kind, ports, status, backend, owner_index)
+            rows = snapshot.query(ports, status)
+            names = {pid: resolve_process_name(pid, process_cache)[1] for pid in {row.pid for row in rows}}
+            opened, closed = store.record(rows, names)
+            print(json.dumps({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "sockets": len(rows),
+                              "opened": opened, "closed": closed}, ensure_ascii=False), flush=True)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+
+def iter_history_records(path, ports, status, since, until):
+    """逐条生成历史查询记录，时间格式化为本地时间"""
+    from portHistory import HistoryStore, format_time
+
+    store = HistoryStore(path, readonly=True)
+    try:
+        for record in store.query(ports, since, until):
+            if status != "ALL" and record["status"] != status:
+                continue
+            record["first_seen"] = format_time(record["first_seen"])
+            record["closed"] = format_time(record["closed"])
+            yield record
+    finally:
+        store.close()
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    ports = parse_ports_argument(parser, args.ports)
+
+    if args.verify:
+        backend = "proc" if args.backend in ("auto", "psutil") else args.backend
+        only_backend, only_psutil = compare_backends(args.kind, ports, args.status, backend)
+        for label, rows in ((backend, only_backend), ("psutil", only_psutil)):
+            for row in sorted(rows, key=str):
+                print(f"仅在 {label} 中: {row}")
+        print(f"{backend} 与 psutil 的差异: {len(only_backend) + len(only_psutil)} 条")
+        return 1 if only_backend or only_psutil else 0
+
+    timings = None
+    if args.record:
+        return record_history(args.record, ports, args.status, args.kind, args.backend,
+                              args.interval, args.retention)
+
+    if args.history:
+        from portHistory import HISTORY_FIELDS, parse_time
+
+        try:
+            since = parse_time(args.since) if args.since else None
+            until = parse_time(args.until) if args.until else None
+        except ValueError:
+            parser.error("请输入有效的时间（例如：02:00 或 2024-05-01 02:00）")
+        if not os.path.exists(args.history):
+            parser.error(f"历史数据库不存在: {args.history}")
+        records = iter_history_records(args.history, ports, args.status, since, until)
+        fields = HISTORY_FIELDS
+    elif args.probe:
+        from portProbe import parse_hosts
+
+        if ports is None:
+            parser.error("远程探测需要指定端口")
+        records = iter_probe_records(parse_hosts(args.probe), ports, args.status,
+                                     concurrency=args.concurrency, rate=args.rate, timeout=args.timeout)
+        fields = PROBE_FIELDS
+    else:
+        query = None
+        status = args.status
+        if args.query:
+            from portQuery import compile_query
+
+            try:
+                query = compile_query(args.query)
+            except ValueError as e:
+                parser.error(str(e))
+            # 查询中的端口和单个状态交给连接枚举预先过滤
+            if ports is None:
+                ports = query.ports
+            if status == "ALL":
+                status = query.status
+        owner_index = SocketOwnerIndex() if proc_net_available() else None
+        if args.timings:
+            timings = ScanTimings()
+        process_cache = ProcessCache()
+        if args.group_by:
+            records = iter_group_records(args.group_by, ports, status, args.kind, args.backend, owner_index,
+                                         query, process_cache, timings)
+            fields = GROUP_FIELDS
+        else:
+            records = iter_records(ports, status, args.kind, args.backend, process_cache, owner_index,
+                                   query, timings)
+            fields = OUTPUT_FIELDS
+    try:
+        count = write_records(records, args.format, sys.stdout, fields)
+    except BrokenPipeError:
+        # 输出被管道提前关闭（例如 | head）：把标准输出重定向到 devnull，
+        # 避免退出时刷新缓冲区再次报错，标准错误保持可用
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+        return 0
+    if timings is not None:
+        timings.count("rows", count)
+        timings.count("cache_hits", process_cache.hits)
+        timings.count("cache_misses", process_cache.misses)
+        timings.count("peak_rss_kb", peak_rss_kb())
+        print(format_timings_log(timings), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
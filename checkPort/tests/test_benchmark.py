@@ -0,0 +1,38 @@
+import json
+import sys
+
+import pytest
+
+import benchmark
+from portScan import read_proc_net
+
+
+@pytest.mark.skipif(sys.byteorder != "little", reason="合成的 /proc/net 按小端序编码")
+def test_synthetic_proc_tree_round_trips(tmp_path):
+    connections = benchmark.synthetic_connections(300, [100, 200])
+    benchmark.write_proc_tree(str(tmp_path / "proc"), connections, owner_limit=50)
+
+    parsed = read_proc_net("tcp4", proc_root=str(tmp_path / "proc"))
+    assert [(conn.laddr, conn.raddr, conn.status) for conn in parsed] == \
+        [(conn.laddr, conn.raddr, conn.status) for conn in connections]
+    assert sum(1 for conn in parsed if conn.pid is not None) == 50
+
+
+def test_compare_results_flags_slower_stages():
+    baseline = {"results": [{"size": 1000, "stage": "snapshot", "seconds": 0.010},
+                            {"size": 1000, "stage": "query", "seconds": 0.002}]}
+    results = [{"size": 1000, "stage": "snapshot", "seconds": 0.011},
+               {"size": 1000, "stage": "query", "seconds": 0.004},
+               {"size": 5000, "stage": "query", "seconds": 1.0}]
+    assert benchmark.compare_results(results, baseline, 1.2) == [(1000, "query", 0.002, 0.004)]
+
+
+def test_main_writes_report_and_compares_baseline(tmp_path):
+    output = tmp_path / "result.json"
+    assert benchmark.main(["--sizes", "200", "--repeat", "1", "--no-memory", "--output", str(output)]) == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert {item["size"] for item in report["results"]} == {200}
+
+    # 与自身比较，阈值足够大时没有变慢的阶段
+    assert benchmark.main(["--sizes", "200", "--repeat", "1", "--no-memory", "--output", str(tmp_path / "again.json"),
+                           "--baseline", str(output), "--threshold", "1000"]) == 0
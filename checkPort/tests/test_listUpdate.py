@@ -0,0 +1,110 @@
+import pytest
+
+from benchmark import StubTreeview
+from portScan import plan_list_update
+
+
+def make_item(item_id, status="已建立", tags=()):
+    return (item_id, (item_id, 100, "nginx", status), {"pid": 100}, tags)
+
+
+def test_plan_list_update_touches_only_changed_rows():
+    old = [make_item("a"), make_item("b"), make_item("c")]
+    displayed = {item_id: (values, tags) for item_id, values, _, tags in old}
+    new = [make_item("a"), make_item("a2"), make_item("b", "等待关闭"), make_item("d", tags=("added",))]
+
+    wanted, removed, inserts, updates = plan_list_update(["a", "b", "c"], displayed, new)
+    assert removed == ["c"]
+    assert inserts == [(1, "a2", make_item("a2")[1], ()), (3, "d", make_item("d")[1], ("added",))]
+    assert updates == [("b", make_item("b", "等待关闭")[1], ())]
+    assert list(wanted) == ["a", "a2", "b", "d"]
+
+    # 内容没有变化时不需要任何操作
+    assert plan_list_update(list(wanted), wanted, new)[1:] == ([], [], [])
+
+
+class RecordingTree(StubTreeview):
+    """记录插入、删除和修改操作的模拟 Treeview"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def insert(self, parent, index, iid, values=(), tags=()):
+        self.calls.append(("insert", iid))
+        return super().insert(parent, index, iid, values, tags)
+
+    def delete(self, *items):
+        self.calls.append(("delete", items))
+        super().delete(*items)
+
+    def item(self, iid, values=(), tags=()):
+        self.calls.append(("item", iid))
+        super().item(iid, values, tags)
+
+
+class Recorder:
+    """代替 StringVar 和滚动条，记录最后一次 set 的参数"""
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, *value):
+        self.value = value
+
+
+@pytest.fixture
+def view():
+    """只初始化列表更新用到的属性的 PortCheckerGUI"""
+    pytest.importorskip("tkinter")
+    from checkPort import PortCheckerGUI
+
+    view = PortCheckerGUI.__new__(PortCheckerGUI)
+    view.VIRTUAL_THRESHOLD = 10
+    view.PAGE_SIZE = 4
+    view.port_tree = RecordingTree()
+    view.tree_scroll_y = Recorder()
+    view.scan_status_var = Recorder()
+    view.displayed = {}
+    view.groups = {}
+    view.group_by = None
+    view.tree_grouped = False
+    view.items = []
+    view.processes = {}
+    return view
+
+
+def show(view, items):
+    view.items = items
+    view.processes = {item_id: info for item_id, _, info, _ in items}
+    view.render_items()
+
+
+def test_refresh_leaves_unchanged_rows_untouched(view):
+    show(view, [make_item(f"row{i}") for i in range(5)])
+    view.port_tree.calls.clear()
+    items = [make_item(f"row{i}") for i in range(5)]
+    items[2] = make_item("row2", "等待关闭")
+    show(view, items[:4] + [make_item("row5")])
+    assert view.port_tree.calls == [("delete", ("row4",)), ("insert", "row5"), ("item", "row2")]
+    assert view.port_tree.get_children() == ("row0", "row1", "row2", "row3", "row5")
+
+
+def test_large_results_are_paged(view):
+    items = [make_item(f"row{i:02d}") for i in range(11)]
+    show(view, items)
+    # 超过 VIRTUAL_THRESHOLD 行时只创建一页
+    assert len(view.port_tree.get_children()) == 4
+
+    view.on_tree_scroll("0.5", "0.6")
+    assert len(view.port_tree.get_children()) == 4
+    for expected in (8, 11, 11):
+        view.on_tree_scroll("0.9", "1.0")
+        assert len(view.port_tree.get_children()) == expected
+    assert list(view.port_tree.get_children()) == [item[0] for item in items]
+
+    # 刷新时保留已经滚动加载的行数，不超过结果总数
+    show(view, items[:10] + [make_item("row99")] + items[10:])
+    assert len(view.port_tree.get_children()) == 11
+    show(view, items[:3])
+    assert view.port_tree.get_children() == ("row00", "row01", "row02")
@@ -0,0 +1,132 @@
+import socket
+import sqlite3
+from collections import namedtuple
+
+import pytest
+
+from portHistory import HistoryStore
+
+Address = namedtuple("Address", "ip port")
+Row = namedtuple("Row", "port pid status type laddr raddr")
+
+
+def make_row(port, pid=100, status="LISTEN"):
+    return Row(port, pid, status, socket.SOCK_STREAM, Address("127.0.0.1", port), None)
+
+
+def test_record_keeps_one_interval_per_connection(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    assert store.record([make_row(8000), make_row(8001)], {100: "python"}, ts=100) == (2, 0)
+    assert store.record([make_row(8000), make_row(8001)], {100: "python"}, ts=200) == (0, 0)
+    assert store.record([make_row(8000)], {100: "python"}, ts=300) == (0, 1)
+
+    records = {record["port"]: record for record in store.query()}
+    assert records[8000]["first_seen"] == 100 and records[8000]["closed"] is None
+    assert records[8001]["first_seen"] == 100 and records[8001]["closed"] == 300
+    assert records[8001]["name"] == "python"
+    store.close()
+
+
+def test_query_filters_by_time_range(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.record([make_row(8000)], {}, ts=100)
+    store.record([], {}, ts=200)
+    store.record([make_row(9000)], {}, ts=300)
+
+    assert [record["port"] for record in store.query(start=250)] == [9000]
+    assert [record["port"] for record in store.query(end=150)] == [8000]
+    assert [record["port"] for record in store.query(start=150, end=250)] == [8000]
+    store.close()
+
+
+def test_close_ends_open_intervals_at_last_tick(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    store.record([make_row(8000)], {}, ts=100)
+    store.record([make_row(8000)], {}, ts=200)
+    store.close()
+
+    store = HistoryStore(path)
+    assert store.query()[0]["closed"] == 200
+    store.close()
+
+
+def test_reopen_ends_intervals_of_exited_recorders_only(tmp_path):
+    path = str(tmp_path / "history.db")
+    crashed = HistoryStore(path)
+    crashed.record([make_row(8000)], {}, ts=100)
+    crashed.record([make_row(8000)], {}, ts=200)
+    live = HistoryStore(path)
+    live.record([make_row(9000)], {}, ts=250)
+    # 模拟第一个记录进程没有正常关闭就退出了，之后它的 PID 被其他进程复用（启动时间不同）
+    with crashed._db:
+        crashed._db.execute("UPDATE sessions SET pid_started = 0 WHERE id = ?", (crashed._session,))
+    crashed._db.close()
+
+    store = HistoryStore(path)
+    records = {record["port"]: record for record in store.query()}
+    assert records[8000]["closed"] == 200
+    assert records[9000]["closed"] is None
+    store.close()
+    live.close()
+
+
+def test_writers_do_not_close_each_others_intervals(tmp_path):
+    path = str(tmp_path / "history.db")
+    first = HistoryStore(path)
+    first.record([make_row(8000)], {}, ts=100)
+    second = HistoryStore(path)
+    second.record([make_row(9000)], {}, ts=150)
+    first.record([make_row(8000)], {}, ts=200)
+
+    records = {record["port"]: record for record in first.query()}
+    assert records[8000]["closed"] is None and records[9000]["closed"] is None
+
+    second.close()
+    records = {record["port"]: record for record in first.query()}
+    assert records[8000]["closed"] is None and records[9000]["closed"] == 150
+    first.record([], {}, ts=300)
+    assert {record["port"]: record["closed"] for record in first.query()} == {8000: 300, 9000: 150}
+    first.close()
+
+
+def test_upgrades_database_without_sessions(tmp_path):
+    path = str(tmp_path / "history.db")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE ticks (ts REAL PRIMARY KEY);
+        CREATE TABLE sockets (id INTEGER PRIMARY KEY, port INTEGER NOT NULL, pid INTEGER, name TEXT,
+                              status TEXT NOT NULL, proto TEXT NOT NULL, laddr TEXT NOT NULL, raddr TEXT,
+                              first_seen REAL NOT NULL, closed REAL);
+        INSERT INTO ticks VALUES (100), (200);
+        INSERT INTO sockets (port, status, proto, laddr, first_seen)
+            VALUES (8000, 'LISTEN', 'tcp', '127.0.0.1:8000', 100);
+    """)
+    db.close()
+
+    store = HistoryStore(path)
+    assert store.query()[0]["closed"] == 200
+    store.record([make_row(9000)], {}, ts=300)
+    store.close()
+
+
+def test_readonly_open_does_not_touch_live_recording(tmp_path):
+    path = str(tmp_path / "history.db")
+    recorder = HistoryStore(path)
+    recorder.record([make_row(8000)], {}, ts=100)
+    recorder.record([make_row(8000)], {}, ts=200)
+
+    reader = HistoryStore(path, readonly=True)
+    assert reader.query()[0]["closed"] is None
+    reader.close()
+
+    recorder.record([make_row(8000)], {}, ts=400)
+    assert recorder.query()[0]["closed"] is None
+    recorder.close()
+
+
+def test_readonly_open_requires_existing_database(tmp_path):
+    path = tmp_path / "missing.db"
+    with pytest.raises(FileNotFoundError):
+        HistoryStore(str(path), readonly=True)
+    assert not path.exists()
@@ -0,0 +1,50 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from portProbe import iter_probe, parse_hosts
+
+
+@pytest.fixture
+def listener():
+    """127.0.0.1 上接受连接的端口，以及一个没有监听的端口"""
+    with socket.socket() as server, socket.socket() as unused:
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        unused.bind(("127.0.0.1", 0))
+        yield server.getsockname()[1], unused.getsockname()[1]
+
+
+def test_probe_local_listener(listener):
+    open_port, closed_port = listener
+    results = {result.port: result for result in iter_probe(["127.0.0.1"], [open_port, closed_port], timeout=2)}
+    assert results[open_port].status == "OPEN" and results[open_port].latency is not None
+    assert results[closed_port].status == "CLOSED"
+
+
+def test_probe_reports_unresolvable_host(listener):
+    open_port, _ = listener
+    results = list(iter_probe(["127.0.0.1", "no-such-host.invalid"], [open_port], timeout=2))
+    statuses = {result.host: result.status for result in results}
+    assert statuses == {"127.0.0.1": "OPEN", "no-such-host.invalid": "ERROR"}
+
+
+def test_probe_stops_when_cancelled(listener):
+    open_port, _ = listener
+    cancel = threading.Event()
+    cancel.set()
+    assert list(iter_probe(["127.0.0.1"], [open_port] * 50, cancel_event=cancel)) == []
+
+
+def test_rate_limit_spaces_connections(listener):
+    open_port, _ = listener
+    started = time.monotonic()
+    results = list(iter_probe(["127.0.0.1"], [open_port] * 15, concurrency=15, rate=10, timeout=2))
+    # 令牌桶开始时有 10 个令牌，其余 5 个连接按每秒 10 个发起
+    assert len(results) == 15 and time.monotonic() - started >= 0.4
+
+
+def test_parse_hosts():
+    assert parse_hosts("10.0.0.1, example.com  10.0.0.2,,") == ["10.0.0.1", "example.com", "10.0.0.2"]
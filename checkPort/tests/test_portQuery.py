@@ -0,0 +1,59 @@
+import socket
+
+import pytest
+
+from portQuery import CidrSet, compile_query, is_query
+from portScan import Address, SocketRow
+
+
+def make_row(port, pid=100, status="ESTABLISHED", raddr=None, laddr="127.0.0.1", sock_type=socket.SOCK_STREAM):
+    return SocketRow(port, pid, status, Address(laddr, port), Address(raddr, 50000) if raddr else None,
+                     socket.AF_INET, sock_type)
+
+
+def test_cidr_set_matches_networks_and_addresses():
+    cidrs = CidrSet(["10.0.0.0/8", "192.168.1.5", "fd00::/8", "0.0.0.0/32"])
+    assert "10.1.2.3" in cidrs and "192.168.1.5" in cidrs and "0.0.0.0" in cidrs
+    assert "11.0.0.1" not in cidrs and "192.168.1.6" not in cidrs
+    assert "fd12::1" in cidrs and "fe80::1" not in cidrs
+    # IPv4 映射的 IPv6 地址按 IPv4 匹配，带作用域的地址忽略作用域
+    assert "::ffff:10.0.0.1" in cidrs
+    assert "fd00::1%eth0" in cidrs
+    assert "not-an-ip" not in cidrs
+
+
+def test_cidr_set_rejects_bad_networks():
+    for network in ("10.0.0.0/33", "300.0.0.1", "10.0.0.0/x"):
+        with pytest.raises(ValueError):
+            CidrSet([network])
+
+
+def test_query_combines_conditions():
+    names = {100: "java", 200: "nginx"}
+    query = compile_query("port:8000-8100,9200 state:ESTABLISHED,LISTEN proc:~^ja raddr:10.0.0.0/8")
+    assert query.needs_names and query.status == "ALL"
+    assert query.matches(make_row(8080, raddr="10.2.3.4"), names.get)
+    assert not query.matches(make_row(8080, raddr="11.2.3.4"), names.get)
+    assert not query.matches(make_row(8080, pid=200, raddr="10.2.3.4"), names.get)
+    assert not query.matches(make_row(8200, raddr="10.2.3.4"), names.get)
+    assert not query.matches(make_row(8080), names.get)
+
+
+def test_query_negation_and_prefilters():
+    query = compile_query("8080,8081 !proc:nginx proto:tcp state:LISTEN")
+    assert list(query.ports) == [8080, 8081] and query.status == "LISTEN"
+    names = {100: "python", 200: "nginx"}.get
+    assert query.matches(make_row(8080, status="LISTEN"), names)
+    assert not query.matches(make_row(8080, pid=200, status="LISTEN"), names)
+    assert not query.matches(make_row(8080, status="LISTEN", sock_type=socket.SOCK_DGRAM), names)
+    assert compile_query("port:80-90 port:85-100").ports.intervals == [(85, 90)]
+
+
+@pytest.mark.parametrize("text", ["foo:1", "port:abc", "state:NOPE", "proc:~(", "pid:x", "proto:sctp"])
+def test_query_rejects_invalid_conditions(text):
+    with pytest.raises(ValueError):
+        compile_query(text)
+
+
+def test_is_query():
+    assert is_query("port:80") and not is_query("8000-8010")
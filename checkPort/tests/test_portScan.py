@@ -0,0 +1,349 @@
+import contextlib
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+import portScan
+from portScan import Connection, ProcessSampler, SocketOwnerIndex, group_rows, terminate_processes
+
+Address = namedtuple("Address", "ip port")
+Row = namedtuple("Row", "port pid status type laddr raddr")
+
+
+def make_row(port, pid, status="ESTABLISHED", raddr=None):
+    return Row(port, pid, status, socket.SOCK_STREAM, Address("127.0.0.1", port), raddr)
+
+
+def make_proc(root, processes):
+    """在 root 下创建假的 /proc：processes 为 {pid: {fd: inode}}"""
+    for pid, fds in processes.items():
+        fd_dir = root / str(pid) / "fd"
+        fd_dir.mkdir(parents=True)
+        for fd, inode in fds.items():
+            os.symlink(f"socket:[{inode}]", fd_dir / str(fd))
+
+
+def test_owner_index_finds_socket_owners(tmp_path):
+    make_proc(tmp_path, {100: {3: 1001, 4: 1002}, 200: {5: 2001}})
+    index = SocketOwnerIndex(str(tmp_path))
+    assert index.resolve([1001, 2001, 9999]) == {1001: (100, 3), 2001: (200, 5)}
+
+
+def test_owner_index_remembers_all_unowned_inodes(tmp_path):
+    make_proc(tmp_path, {100: {3: 1001}, 200: {5: 2001}})
+    index = SocketOwnerIndex(str(tmp_path))
+    index.resolve([1001, 9001])
+    # 9001 已知找不到所属进程，只有 9002 需要补充扫描
+    index.resolve([1001, 9001, 9002])
+    assert index.rescanned == 2
+
+    # 两个都记住了，不再补充扫描
+    assert index.resolve([1001, 9001, 9002]) == {1001: (100, 3)}
+    assert index.rescanned == 0
+
+
+def test_owner_index_forgets_unowned_inodes_no_longer_queried(tmp_path):
+    make_proc(tmp_path, {100: {3: 1001}})
+    index = SocketOwnerIndex(str(tmp_path))
+    index.resolve([9001])
+    index.resolve([1001])
+    assert index._unowned == set()
+
+
+def test_group_rows_counts_and_members():
+    rows = [make_row(80, 1), make_row(80, 1, "LISTEN"), make_row(443, 2), make_row(80, 3)]
+    names = {1: "nginx", 2: "python", 3: "nginx"}
+
+    groups = group_rows(rows, "port", names)
+    assert [(key, count) for key, count, _ in groups] == [(80, 3), (443, 1)]
+    assert groups[0][2] == {"ESTABLISHED": 2, "LISTEN": 1}
+
+    items = ["a", "b", "c", "d"]
+    groups = group_rows(rows, "process", names, items)
+    assert [(key, members) for key, _, _, members in groups] == [
+        ((1, "nginx"), ["a", "b"]), ((2, "python"), ["c"]), ((3, "nginx"), ["d"])]
+
+
+def test_sampler_computes_rates_from_previous_sample():
+    sampler = ProcessSampler()
+    first = sampler.sample([os.getpid()])[os.getpid()]
+    assert first.cpu_percent is None and first.rss > 0
+    sum(range(200000))
+    second = sampler.sample([os.getpid()])[os.getpid()]
+    assert second.cpu_percent is not None
+
+
+def test_sampler_runs_one_sample_at_a_time(monkeypatch):
+    sampler = ProcessSampler()
+    active = []
+    overlaps = []
+    real_sample_one = sampler._sample_one
+
+    def slow_sample_one(pid):
+        active.append(pid)
+        overlaps.append(len(active))
+        time.sleep(0.01)
+        active.remove(pid)
+        return real_sample_one(pid)
+
+    monkeypatch.setattr(sampler, "_sample_one", slow_sample_one)
+    threads = [threading.Thread(target=sampler.sample, args=([os.getpid()] * 5,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
+
+
+def test_terminate_results_follow_the_given_pids():
+    children = [subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"]) for _ in range(2)]
+    first, second = (child.pid for child in children)
+    missing = 2 ** 22 + 1  # 大于 Linux 的 pid_max 上限，不会是存在的进程
+    try:
+        results = terminate_processes([first, second, first, missing], timeout=5)
+    finally:
+        for child in children:
+            child.kill()
+            child.wait()
+    assert [result.pid for result in results] == [first, second, first, missing]
+    assert [result.outcome for result in results] == ["terminated", "terminated", "terminated", "gone"]
+
+
+def test_iter_records_streams_table_by_table(monkeypatch):
+    tables = []
+
+    def fake_list_connections(kind, ports, status, backend, owner_index, timings):
+        tables.append(kind)
+        return [Connection(3, socket.AF_INET, socket.SOCK_STREAM, Address("127.0.0.1", 8000 + len(tables)), (),
+                           "LISTEN", None)]
+
+    monkeypatch.setattr(portScan, "list_connections", fake_list_connections)
+    monkeypatch.setattr(portScan, "proc_net_available", lambda: True)
+    records = portScan.iter_records(backend="proc")
+    assert next(records)["port"] == 8001
+    assert tables == ["tcp4"]
+    assert [record["port"] for record in records] == [8002, 8003, 8004]
+    assert tables == ["tcp4", "tcp6", "udp4", "udp6"]
+
+
+def test_cli_closed_pipe_keeps_stderr_open(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    with open(write_fd, "w") as out:
+        monkeypatch.setattr(sys, "stdout", out)
+        assert portScan.main(["--backend", "psutil"]) == 0
+        stderr = sys.stderr
+        assert not stderr.closed
+        # 标准输出已重定向到 devnull，再写入不会报错
+        out.write("x\n")
+        out.flush()
+
+
+def test_scan_timings_keep_stage_order_and_format_one_log_line():
+    timings = portScan.ScanTimings()
+    with timings.stage("dump"):
+        pass
+    timings.add("owners", 0.002)
+    # 同一阶段再次计时时累加，位置保持第一次出现的顺序
+    timings.add("dump", 0.001)
+    with portScan.timed(None, "index"):
+        pass
+    timings.count("rows", 3)
+    timings.count("peak_rss_kb", 2048.0)
+    assert list(timings.stages) == ["dump", "owners"]
+    assert timings.stages["dump"] >= 0.001
+
+    line = portScan.format_timings_log(timings)
+    assert "\n" not in line
+    name, payload = line.split(" ", 1)
+    record = json.loads(payload)
+    assert name == "scan_timings"
+    assert list(record) == ["total_ms", "dump_ms", "owners_ms", "rows", "peak_rss_kb"]
+    assert (record["owners_ms"], record["rows"], record["peak_rss_kb"]) == (2.0, 3, 2048.0)
+
+
+def test_cli_timings_line_reports_peak_memory(capsys):
+    assert portScan.main(["1-1024", "--backend", "psutil", "--timings"]) == 0
+    line = capsys.readouterr().err.strip().splitlines()[-1]
+    assert line.startswith("scan_timings ")
+    record = json.loads(line.split(" ", 1)[1])
+    assert record["peak_rss_kb"] > 0 and "dump_ms" in record and "rows" in record
+
+
+class FakeProcess:
+    """代替 psutil.Process：进程表为 {pid: (create_time, name)}，记录读取名称的次数"""
+    table = {}
+    reads = []
+
+    def __init__(self, pid):
+        if pid not in self.table:
+            raise portScan.psutil.NoSuchProcess(pid)
+        self.pid = pid
+
+    def create_time(self):
+        return self.table[self.pid][0]
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def name(self):
+        self.reads.append(self.pid)
+        return self.table[self.pid][1]
+
+    def cmdline(self):
+        return [self.table[self.pid][1]]
+
+    def username(self):
+        raise portScan.psutil.AccessDenied(self.pid)
+
+    def exe(self):
+        return ""
+
+
+@pytest.fixture
+def fake_processes(monkeypatch):
+    """替换 psutil.Process 和单调时钟，返回 (进程表, 读取记录, 时钟)"""
+    clock = [1000.0]
+    monkeypatch.setattr(FakeProcess, "table", {})
+    monkeypatch.setattr(FakeProcess, "reads", [])
+    monkeypatch.setattr(portScan.psutil, "Process", FakeProcess)
+    monkeypatch.setattr(portScan.time, "monotonic", lambda: clock[0])
+    return FakeProcess.table, FakeProcess.reads, clock
+
+
+def test_process_cache_expires_entries_after_ttl(fake_processes):
+    table, reads, clock = fake_processes
+    table[10] = (1.0, "nginx")
+    cache = portScan.ProcessCache(ttl=5)
+    info = cache.get(10)
+    assert (info.name, info.cmdline, info.username) == ("nginx", ["nginx"], "")
+    clock[0] += 4.9
+    assert cache.get(10) is info
+    clock[0] += 0.2
+    assert cache.get(10) is not info
+    assert reads == [10, 10] and (cache.hits, cache.misses) == (1, 2)
+
+
+def test_process_cache_evicts_least_recently_used(fake_processes):
+    table, reads, clock = fake_processes
+    table.update({1: (1.0, "a"), 2: (1.0, "b"), 3: (1.0, "c")})
+    cache = portScan.ProcessCache(max_size=2)
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)  # 1 成为最近使用的条目
+    cache.get(3)  # 淘汰最久未使用的 2
+    assert len(cache) == 2
+    reads.clear()
+    cache.get(1)
+    cache.get(3)
+    assert reads == []
+    cache.get(2)
+    assert reads == [2]
+
+
+def test_process_cache_misses_when_pid_is_reused(fake_processes):
+    table, reads, clock = fake_processes
+    table[42] = (1.0, "old")
+    cache = portScan.ProcessCache()
+    assert cache.get(42).name == "old"
+    # 同一 PID 被新进程复用：create_time 不同，不能返回旧进程的信息
+    table[42] = (2.0, "new")
+    info = cache.get(42)
+    assert (info.name, info.create_time) == ("new", 2.0)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 1)
+
+
+def test_process_cache_invalidate_and_clear(fake_processes):
+    table, reads, clock = fake_processes
+    table.update({1: (1.0, "a"), 2: (1.0, "b")})
+    cache = portScan.ProcessCache()
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate(1)
+    cache.invalidate(99)
+    assert len(cache) == 1
+    reads.clear()
+    cache.get(2)
+    cache.get(1)
+    assert reads == [1]
+    cache.clear()
+    assert len(cache) == 0
+    del table[1]
+    with pytest.raises(portScan.psutil.NoSuchProcess):
+        cache.get(1)
+
+
+def next_message(scanner):
+    return scanner.results.get(timeout=5)
+
+
+def test_background_scanner_delivers_only_the_latest_result():
+    scanner = portScan.BackgroundScanner()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(context, value):
+        started.set()
+        release.wait(5)
+        context.post(["旧的部分结果"])
+        return value
+
+    first = scanner.submit(slow, "old")
+    assert started.wait(5)
+    second = scanner.submit(lambda context, value: value, "new")
+    assert next_message(scanner) == (second, "done", "new")
+    release.set()
+    # 被取代的任务完成后只送出 cancelled，部分结果被丢弃
+    assert next_message(scanner) == (first, "cancelled", None)
+    assert scanner.results.empty()
+    assert scanner.is_current(second) and not scanner.is_current(first)
+
+
+def test_background_scanner_cancel_drops_pending_results():
+    scanner = portScan.BackgroundScanner()
+    started, release = threading.Event(), threading.Event()
+
+    def job(context):
+        context.report(1, 2)
+        started.set()
+        release.wait(5)
+        context.report(2, 2)
+        context.post(["x"])
+        return "result"
+
+    generation = scanner.submit(job)
+    assert started.wait(5)
+    scanner.cancel()
+    release.set()
+    assert next_message(scanner) == (generation, "progress", (1, 2))
+    assert next_message(scanner) == (generation, "cancelled", None)
+    assert scanner.results.empty()
+
+    def checked(context):
+        scanner.cancel()
+        context.check()
+        return "result"
+
+    generation = scanner.submit(checked)
+    assert next_message(scanner) == (generation, "cancelled", None)
+
+
+def test_background_scanner_delivers_worker_exceptions():
+    scanner = portScan.BackgroundScanner()
+
+    def broken(context):
+        raise ValueError("连接表读取失败")
+
+    generation = scanner.submit(broken)
+    received, kind, error = next_message(scanner)
+    assert (received, kind) == (generation, "error")
+    assert isinstance(error, ValueError) and str(error) == "连接表读取失败"
+    with pytest.raises(queue.Empty):
+        scanner.results.get(timeout=0.05)
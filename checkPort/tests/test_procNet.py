@@ -0,0 +1,67 @@
+import os
+import socket
+import sys
+
+import pytest
+
+import portScan
+from portScan import PortSet
+
+
+def make_proc(root, processes):
+    """在 root 下创建假的 /proc：processes 为 {pid: {fd: inode}}"""
+    for pid, fds in processes.items():
+        fd_dir = root / str(pid) / "fd"
+        fd_dir.mkdir(parents=True)
+        for fd, inode in fds.items():
+            os.symlink(f"socket:[{inode}]", fd_dir / str(fd))
+
+
+PROC_NET_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def proc_net_line(number, local, remote, state, inode):
+    return f"  {number}: {local} {remote} {state} 00000000:00000000 00:00000000 00000000  1000        0 {inode} 1 0\n"
+
+
+@pytest.mark.skipif(sys.byteorder != "little", reason="测试数据按小端序编码")
+def test_read_proc_net_parses_and_filters(tmp_path):
+    net = tmp_path / "net"
+    net.mkdir()
+    (net / "tcp").write_text(PROC_NET_HEADER
+                             + proc_net_line(0, "0100007F:1F90", "00000000:0000", "0A", 1001)
+                             + proc_net_line(1, "0100007F:1F90", "0200007F:C350", "01", 1002)
+                             + proc_net_line(2, "00000000:0050", "00000000:0000", "0A", 1003))
+    (net / "tcp6").write_text(PROC_NET_HEADER
+                              + proc_net_line(0, "00000000000000000000000001000000:1F91",
+                                              "00000000000000000000000000000000:0000", "0A", 1004))
+    (net / "udp").write_text(PROC_NET_HEADER + proc_net_line(0, "00000000:0035", "00000000:0000", "07", 1005))
+    make_proc(tmp_path, {100: {3: 1001, 4: 1002}})
+
+    connections = portScan.read_proc_net(proc_root=str(tmp_path))
+    parsed = [(conn.laddr, conn.raddr, conn.status, conn.pid) for conn in connections]
+    assert parsed == [
+        (("127.0.0.1", 8080), (), "LISTEN", 100),
+        (("127.0.0.1", 8080), ("127.0.0.2", 50000), "ESTABLISHED", 100),
+        (("0.0.0.0", 80), (), "LISTEN", None),
+        (("::1", 8081), (), "LISTEN", None),
+        (("0.0.0.0", 53), (), "NONE", None),
+    ]
+
+    listening = portScan.read_proc_net("tcp", PortSet.from_ports([8080, 8081]), "LISTEN", proc_root=str(tmp_path))
+    assert [(conn.family, conn.laddr.port) for conn in listening] == [(socket.AF_INET, 8080),
+                                                                      (socket.AF_INET6, 8081)]
+    assert portScan.read_proc_net("udp", status="LISTEN", proc_root=str(tmp_path)) == []
+
+
+@pytest.mark.skipif(not portScan.proc_net_available(), reason="需要 /proc/net")
+def test_proc_backend_matches_psutil():
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        only_proc, only_psutil = portScan.compare_backends(ports=PortSet.from_ports([port]), backend="proc")
+        assert only_proc == set() and only_psutil == set()
+        rows = portScan.take_snapshot(ports=PortSet.from_ports([port]), backend="proc").query(
+            PortSet.from_ports([port]), "LISTEN")
+        assert [(row.port, row.pid) for row in rows] == [(port, os.getpid())]
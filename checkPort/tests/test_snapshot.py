@@ -0,0 +1,62 @@
+import socket
+
+import pytest
+
+from portScan import Address, Connection, ConnectionSnapshot, PortSet, diff_snapshots, parse_port_input, sparkline
+
+
+def test_port_set_merges_intervals():
+    ports = PortSet([(8010, 8000), (8005, 8020), (8021, 8021), (80, 80)])
+    assert ports.intervals == [(80, 80), (8000, 8021)]
+    assert len(ports) == 23
+    assert 8000 in ports and 8021 in ports and 80 in ports
+    assert 79 not in ports and 8022 not in ports and 1000 not in ports
+    assert list(PortSet.from_ports([3, 1, 2])) == [1, 2, 3]
+    assert not PortSet()
+
+
+def test_parse_port_input():
+    assert parse_port_input("8080").intervals == [(8080, 8080)]
+    assert parse_port_input("8000-8010,9200,8005").intervals == [(8000, 8010), (9200, 9200)]
+    assert parse_port_input("0,70000").first_outside(1, 65535) == 0
+    assert parse_port_input("80,70000").first_outside(1, 65535) == 70000
+    with pytest.raises(ValueError):
+        parse_port_input("80-")
+
+
+def make_conn(port, status, pid=100, raddr=()):
+    return Connection(3, socket.AF_INET, socket.SOCK_STREAM, Address("127.0.0.1", port), raddr, status, pid)
+
+
+def test_diff_snapshots_reports_appeared_disappeared_and_state_changes():
+    peer = Address("10.0.0.2", 50000)
+    old = ConnectionSnapshot([make_conn(80, "LISTEN"), make_conn(8080, "ESTABLISHED", raddr=peer),
+                              make_conn(9000, "LISTEN", pid=200)])
+    new = ConnectionSnapshot([make_conn(80, "LISTEN"), make_conn(8080, "TIME_WAIT", raddr=peer),
+                              make_conn(9001, "LISTEN", pid=200)])
+    diff = diff_snapshots(old, new)
+    assert [row.port for row in diff.added] == [9001]
+    assert [row.port for row in diff.removed] == [9000]
+    # 只改变状态的连接不算新增或消失，只体现在各状态的连接数中
+    assert diff.old_counts == {"LISTEN": 2, "ESTABLISHED": 1}
+    assert diff.new_counts == {"LISTEN": 2, "TIME_WAIT": 1}
+
+    # 按状态筛选时，离开筛选条件的连接算作消失
+    established = diff_snapshots(old, new, status="ESTABLISHED")
+    assert established.added == [] and [row.port for row in established.removed] == [8080]
+
+    filtered = diff_snapshots(old, new, ports=PortSet.from_ports([9000, 9001]), match=lambda row: row.pid == 200)
+    assert ([row.port for row in filtered.added], [row.port for row in filtered.removed]) == ([9001], [9000])
+
+
+def test_diff_snapshots_from_empty_baseline():
+    new = ConnectionSnapshot([make_conn(80, "LISTEN"), make_conn(443, "LISTEN")])
+    diff = diff_snapshots(ConnectionSnapshot([]), new)
+    assert [row.port for row in diff.added] == [80, 443]
+    assert diff.removed == [] and diff.old_counts == {} and diff.new_counts == {"LISTEN": 2}
+
+
+def test_sparkline():
+    assert sparkline([]) == ""
+    assert sparkline([5, 5, 5]) == "▁▁▁"
+    assert sparkline([0, 7, 14]) == "▁▄█"
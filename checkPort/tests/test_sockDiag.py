@@ -0,0 +1,52 @@
+import os
+import socket
+
+import pytest
+
+import portScan
+from portScan import PortSet
+
+
+def run_port_bytecode(code, port):
+    """按内核 inet_diag_bc_run 的规则执行过滤字节码，返回是否接受本地端口 port"""
+    position = 0
+    remaining = len(code)
+    while remaining > 0:
+        op, yes, no = portScan._BC_OP.unpack_from(code, position)
+        if op == portScan.INET_DIAG_BC_JMP:
+            matched = False
+        elif op == portScan.INET_DIAG_BC_S_GE:
+            matched = port >= portScan._BC_OP.unpack_from(code, position + 4)[2]
+        elif op == portScan.INET_DIAG_BC_S_LE:
+            matched = port <= portScan._BC_OP.unpack_from(code, position + 4)[2]
+        else:
+            raise AssertionError(f"未知的操作码 {op}")
+        step = yes if matched else no
+        position += step
+        remaining -= step
+    return remaining == 0
+
+
+@pytest.mark.parametrize("intervals", [[(8080, 8080)], [(80, 80), (443, 443)], [(1, 100), (8000, 8010), (9000, 9000)]])
+def test_port_bytecode_accepts_exactly_the_port_set(intervals):
+    ports = PortSet(intervals)
+    code = portScan.build_port_bytecode(ports)
+    for port in range(0, 10001):
+        assert run_port_bytecode(code, port) == (port in ports), port
+
+
+@pytest.mark.skipif(not portScan.sock_diag_available(), reason="需要 netlink sock_diag")
+def test_sock_diag_backend_matches_psutil():
+    with socket.socket() as first, socket.socket() as second:
+        for listener in (first, second):
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+        ports = PortSet.from_ports([first.getsockname()[1], second.getsockname()[1]])
+        try:
+            connections = portScan.read_sock_diag("tcp4", ports, "LISTEN")
+        except OSError as e:
+            pytest.skip(f"sock_diag 不可用: {e}")
+        assert sorted(conn.laddr.port for conn in connections) == sorted(ports)
+        assert {conn.pid for conn in connections} == {os.getpid()}
+        only_netlink, only_psutil = portScan.compare_backends("tcp4", ports, "LISTEN", backend="netlink")
+        assert only_netlink == set() and only_psutil == set()